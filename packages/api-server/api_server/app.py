@@ -32,8 +32,8 @@ from .models import (
     User,
 )
 from .models import tortoise_models as ttm
-from .repositories import TaskRepository
-from .rmf_io import HealthWatchdog, RmfBookKeeper, rmf_events
+from .repositories import TaskRepository, fleet_state_write_behind
+from .rmf_io import HealthWatchdog, latest_states, rmf_bookkeeper, rmf_events
 from .types import is_coroutine
 
 
@@ -54,6 +54,7 @@ async def on_sio_connect(sid: str, _environ: dict, auth: dict | None = None) ->
 app = FastIO(
     title="RMF API Server",
     socketio_connect=on_sio_connect,
+    outbound_queue_size=app_config.socketio_outbound_queue_size,
     docs_url=None,
     redoc_url=None,
 )
@@ -65,6 +66,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Next-Cursor"],
 )
 
 app.mount(
@@ -85,8 +87,6 @@ app.mount(
 # will be called in reverse order on app shutdown
 shutdown_cbs: list[Union[Coroutine[Any, Any, Any], Callable[[], None]]] = []
 
-rmf_bookkeeper = RmfBookKeeper(rmf_events, logger=logger.getChild("BookKeeper"))
-
 app.include_router(routes.main_router)
 app.include_router(
     routes.alerts_router, prefix="/alerts", dependencies=[Depends(user_dep)]
@@ -143,6 +143,11 @@ async def on_startup():
     await Tortoise.generate_schemas()
     shutdown_cbs.append(Tortoise.close_connections())
 
+    await fleet_state_write_behind.start()
+    shutdown_cbs.append(fleet_state_write_behind.stop())
+    await routes.internal.ingestion_pipeline.start()
+    shutdown_cbs.append(routes.internal.ingestion_pipeline.stop())
+
     ros.startup()
     shutdown_cbs.append(ros.shutdown)
 
@@ -180,9 +185,11 @@ async def on_startup():
     shutdown_cbs.append(rmf_bookkeeper.stop())
     health_watchdog = HealthWatchdog(
         rmf_events,
+        low_battery_threshold=app_config.robot_low_battery_threshold,
         logger=logger.getChild("HealthWatchdog"),
     )
     await health_watchdog.start()
+    shutdown_cbs.append(health_watchdog.stop())
 
     logger.info("starting scheduler")
     asyncio.create_task(_spin_scheduler())
@@ -304,3 +311,5 @@ async def _load_states():
     for health in ingestor_health:
         rmf_events.ingestor_health.on_next(health)
     logger.info(f"loaded {len(ingestor_health)} ingestor health")
+
+    latest_states.loaded = True
@@ -21,6 +21,18 @@ class AppConfig:
     aud: str
     iss: Optional[str]
     ros_args: List[str]
+    fleet_state_write_interval: float = 1.0
+    internal_ingestion_workers: int = 8
+    internal_ingestion_queue_size: int = 100
+    internal_trusted_source: bool = False
+    socketio_outbound_queue_size: int = 100
+    denormalized_task_logs: bool = False
+    bookkeeper_write_interval: float = 1.0
+    bookkeeper_writers: int = 1
+    bookkeeper_queue_size: int = 100
+    bookkeeper_overflow: str = "coalesce"
+    robot_low_battery_threshold: float = 0.1
+    ros_state_resend_interval: float = 10.0
 
     def __post_init__(self):
         self.public_url = urllib.parse.urlparse(cast(str, self.public_url))
@@ -0,0 +1,47 @@
+"""
+Adds the task states saved before the task stats rollups existed to the rollups.
+
+    RMF_API_SERVER_CONFIG=<config> python -m api_server.backfill_task_stats
+
+Task states which are already counted are skipped, so it is safe to run it while the
+server is running and to run it more than once.
+"""
+
+import asyncio
+
+from tortoise import Tortoise
+
+from api_server.app_config import app_config
+from api_server.logger import logger
+from api_server.models import TaskState
+from api_server.models import tortoise_models as ttm
+from api_server.query import iter_values_raw
+from api_server.repositories.task_stats import update_task_stats
+
+
+async def backfill_task_stats() -> int:
+    """
+    :return: The number of task states read.
+    """
+    count = 0
+    async for (data,) in iter_values_raw(ttm.TaskState.all(), "data", pk="id_"):
+        await update_task_stats(TaskState.parse_raw(data))
+        count += 1
+    return count
+
+
+async def main():
+    await Tortoise.init(
+        db_url=app_config.db_url,
+        modules={"models": ["api_server.models.tortoise_models"]},
+    )
+    await Tortoise.generate_schemas()
+    try:
+        count = await backfill_task_stats()
+        logger.info(f"read {count} task states")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
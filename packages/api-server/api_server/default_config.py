@@ -32,4 +32,49 @@ config = {
     # e.g.
     #   Run with sim time: ["-p", "use_sim_time:=true"]
     "ros_args": [],
+    # (optional) interval in seconds between writes of fleet states to the database. Fleet
+    # states received within an interval are coalesced and only the latest state of each
+    # fleet is written. Set to 0 to write every fleet state as it is received.
+    "fleet_state_write_interval": 1.0,
+    # (optional) number of workers processing messages from the internal websocket. Messages
+    # of the same task or fleet are always processed by the same worker, in order. Set to 0
+    # to process each message before reading the next one.
+    "internal_ingestion_workers": 8,
+    # (optional) max number of messages queued per worker before the internal websocket
+    # stops reading from the sender.
+    "internal_ingestion_queue_size": 100,
+    # (optional) skip validation of messages received from the internal websocket, the
+    # json received is stored as is. Only enable this when every client of the internal
+    # websocket is trusted to send valid messages.
+    "internal_trusted_source": False,
+    # (optional) max number of log messages queued per socket.io connection. State rooms
+    # only keep the latest message, log messages are dropped when the queue is full and
+    # a client which does not receive anything while a full queue worth of messages is
+    # dropped is disconnected.
+    "socketio_outbound_queue_size": 100,
+    # (optional) store task logs in a single table instead of one table per level (task,
+    # phase and event), fetching the log of a task is then a single query. Existing logs
+    # must be copied with `python -m api_server.migrate_task_logs` before enabling this.
+    "denormalized_task_logs": False,
+    # (optional) interval in seconds between writes of door, lift, dispenser and ingestor
+    # states to the database. Only the latest state of each device within an interval is
+    # written, and states which did not change since the last write are skipped. Set to 0
+    # to write states as they are received.
+    "bookkeeper_write_interval": 1.0,
+    # (optional) number of workers writing each type of device health and the building
+    # map. Writes of the same device are always done in order by the same worker.
+    "bookkeeper_writers": 1,
+    # (optional) max number of writes waiting for each bookkeeper worker, and what to do
+    # when it is full. "coalesce" replaces the queued write of the same device and only
+    # drops the oldest write if there is none, "drop_oldest" always drops the oldest write.
+    "bookkeeper_queue_size": 100,
+    "bookkeeper_overflow": "coalesce",
+    # (optional) robots with a battery below this fraction (0 to 1) are reported as
+    # unhealthy. Robots are also unhealthy when they are in error, offline or have issues,
+    # and dead when their `unix_millis_time` is not updated.
+    "robot_low_battery_threshold": 0.1,
+    # (optional) seconds after which a door, lift, dispenser or ingestor state which did
+    # not change is processed again. Unchanged states are otherwise only used as
+    # heartbeats, resending them repairs a state that was skipped or failed to be stored.
+    "ros_state_resend_interval": 10.0,
 }
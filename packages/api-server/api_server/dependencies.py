@@ -23,6 +23,22 @@ def pagination_query(
     return Pagination(limit=limit, offset=offset, order_by=order_by)
 
 
+def cursor_pagination_query(
+    pagination: Pagination = Depends(pagination_query),
+    cursor: str
+    | None = Query(
+        None,
+        description="""
+        Opt in to cursor pagination, pass an empty string to get the first page and the
+        `Next-Cursor` response header to get the next page. Results can only be ordered by
+        one indexed field, results without a value for that field are not returned.
+        """,
+    ),
+) -> Pagination:
+    pagination.cursor = cursor
+    return pagination
+
+
 # hacky way to get the sio user
 def sio_user(req: SubscriptionRequest) -> User:
     return req.session["user"]
@@ -6,10 +6,11 @@ from typing import (
     Callable,
     Coroutine,
     Dict,
+    Hashable,
     List,
     Optional,
+    Set,
     Tuple,
-    Type,
     Union,
     cast,
 )
@@ -22,11 +23,14 @@ from fastapi import APIRouter, FastAPI
 from fastapi.exceptions import HTTPException
 from fastapi.routing import APIRoute
 from reactivex import Observable
+from reactivex.abc import DisposableBase
 from starlette.routing import compile_path
 
 from api_server.logger import logger
 
 from .errors import *
+from .outbox import ConnectionStats, Outbox
+from .route_trie import RouteTrie
 
 
 @dataclass
@@ -40,6 +44,38 @@ class SubscriptionRequest:
 @dataclass
 class SubscriptionData:
     room: str
+    max_hz: Optional[float] = None
+
+
+# `True` to conflate all the items of a room, or a function returning the key to conflate
+# an item by, items with a `None` key are not conflated.
+Conflate = Union[bool, Callable[[Any], Optional[Hashable]]]
+
+
+def conflate_single(key_mapper: Callable[[Any], Hashable]) -> Conflate:
+    """
+    Conflation for rooms which send lists of items, e.g. wildcard rooms which send a
+    snapshot of all the items followed by lists with a single updated item. Lists of a
+    single item are conflated by the key of the item, other lists are not conflated.
+    """
+
+    def get_key(data: List[Any]) -> Optional[Hashable]:
+        if len(data) != 1:
+            return None
+        return key_mapper(data[0])
+
+    return get_key
+
+
+@dataclass
+class RoomSubscription:
+    """
+    An upstream subscription shared by all the sids subscribed to a room.
+    """
+
+    conflate: Conflate
+    sids: Set[str]
+    sub: Optional[DisposableBase] = None
 
 
 class SubRoute:
@@ -50,12 +86,14 @@ class SubRoute:
             [SubscriptionRequest], Union[Observable, Coroutine[Any, Any, Observable]]
         ],
         *,
-        response_model: Optional[Type[pydantic.BaseModel]] = None,
+        response_model: Optional[Any] = None,
+        conflate: Conflate = False,
     ):
         self.path = path
         self.endpoint = endpoint
         self.path_regex, self.path_format, self.param_convertors = compile_path(path)
         self.response_model = response_model
+        self.conflate = conflate
 
     def matches(self, path: str) -> Optional[Match]:
         return self.path_regex.match(path)
@@ -111,35 +149,77 @@ class FastIORouter(APIRouter):
                 SubRoute(
                     prefix + router.prefix + r.path,
                     r.endpoint,
+                    response_model=r.response_model,
+                    conflate=r.conflate,
                 )
             )
 
     def sub(
-        self, path: str, *, response_model: Optional[Type[pydantic.BaseModel]] = None
+        self,
+        path: str,
+        *,
+        response_model: Optional[Any] = None,
+        conflate: Conflate = False,
     ):
         """
         Registers a socket.io endpoint which handles subscriptions.
+
+        :param conflate: Set this for rooms where each item is the full state, when a
+            client falls behind, only the latest item of the room is sent to it instead of
+            dropping items. For rooms with the states of more than one object, this can be
+            a function returning the key of the object an item is for.
         """
 
         def decorator(func: OnSubscribe) -> OnSubscribe:
-            self.sub_routes.append(SubRoute(path, func, response_model=response_model))
+            self.sub_routes.append(
+                SubRoute(path, func, response_model=response_model, conflate=conflate)
+            )
             return func
 
         return decorator
 
 
+@dataclass
+class EncodedItem:
+    """
+    An item of a room which is already serialized, along with the event name, as the
+    data of a socket.io packet.
+    """
+
+    data: Any
+    json: str
+
+
 class FastIOPacket(socketio.packet.Packet):
     class PacketData(pydantic.BaseModel):
-        __root__: Tuple[str, pydantic.BaseModel]
+        __root__: Tuple[str, Union[pydantic.BaseModel, List[pydantic.BaseModel]]]
+
+    @staticmethod
+    def _is_model_data(data: Any) -> bool:
+        return isinstance(data, pydantic.BaseModel) or (
+            isinstance(data, list)
+            and len(data) > 0
+            and all(isinstance(x, pydantic.BaseModel) for x in data)
+        )
+
+    @staticmethod
+    def pre_encode(event: str, data: Any) -> Any:
+        """
+        Serializes the models of an event so that it can be sent to many sids without
+        serializing it again for each of them, other data is returned as is.
+        """
+        if not FastIOPacket._is_model_data(data):
+            return data
+        pkt_data = FastIOPacket.PacketData.construct(__root__=(event, data))
+        return EncodedItem(data, pkt_data.json(exclude_none=True))
 
     def encode(self):
-        if (
-            isinstance(self.data, list)
-            and len(self.data) == 2
-            and isinstance(self.data[1], pydantic.BaseModel)
-        ):
-            pkt_data = FastIOPacket.PacketData.construct(__root__=self.data)
-            return str(self.packet_type) + pkt_data.json(exclude_none=True)
+        if isinstance(self.data, list) and len(self.data) == 2:
+            event, data = self.data
+            if isinstance(data, EncodedItem):
+                return str(self.packet_type) + data.json
+            if FastIOPacket._is_model_data(data):
+                return str(self.packet_type) + FastIOPacket.pre_encode(event, data).json
         return super().encode()
 
 
@@ -151,6 +231,7 @@ class FastIO(FastAPI):
         socketio_connect: Optional[
             Callable[[str, dict, Optional[dict]], Coroutine[Any, Any, bool]]
         ] = None,
+        outbound_queue_size: int = 100,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
@@ -164,6 +245,10 @@ class FastIO(FastAPI):
         self.sio.on("unsubscribe", self._on_unsubscribe)
         self.sio.on("disconnect", self._on_disconnect)
         self._sub_routes: List[SubRoute] = []
+        self._sub_route_trie = RouteTrie()
+        self._room_subs: Dict[str, RoomSubscription] = {}
+        self._outbound_queue_size = outbound_queue_size
+        self._outboxes: Dict[str, Outbox] = {}
 
         self._sio_route = APIRoute(
             socketio_path,
@@ -184,10 +269,14 @@ The message must be of the form:
 
 ```
 {
-    "room": "<room_name>"
+    "room": "<room_name>",
+    "max_hz": <optional max number of messages per second>
 }
 ```
 
+`max_hz` is only supported by rooms which send the whole state, only the latest state
+is sent when messages are limited. It is ignored by other rooms.
+
 ### unsubscribe
 Clients can send a message to this room to stop receiving messages on other rooms.
 The message must be of the form:
@@ -211,17 +300,18 @@ The message must be of the form:
         if isinstance(router, FastIORouter):
             for r in router.sub_routes:
                 full_path = prefix + router.prefix + r.path
-                self._sub_routes.append(
-                    SubRoute(
-                        full_path,
-                        r.endpoint,
-                        response_model=r.response_model,
-                    )
+                sub_route = SubRoute(
+                    full_path,
+                    r.endpoint,
+                    response_model=r.response_model,
+                    conflate=r.conflate,
                 )
+                self._sub_routes.append(sub_route)
+                self._sub_route_trie.add(sub_route)
                 if r.response_model:
                     response_schema = f"""
 ```
-{r.response_model.schema_json(indent=2)}
+{pydantic.schema_json_of(r.response_model, indent=2)}
 ```
 """
                 else:
@@ -239,16 +329,19 @@ The message must be of the form:
         if "room" not in data:
             raise SubscribeError("missing 'room'")
         room = url_unquote(data["room"])
-        return SubscriptionData(room=room)
+        max_hz = data.get("max_hz")
+        if max_hz is not None and (
+            not isinstance(max_hz, (int, float))
+            or isinstance(max_hz, bool)
+            or max_hz <= 0
+        ):
+            raise SubscribeError("'max_hz' must be a positive number")
+        return SubscriptionData(room=room, max_hz=max_hz)
 
     def _match_routes(
         self, sub_data: SubscriptionData
-    ) -> Optional[Tuple[Match, SubRoute]]:
-        for r in self._sub_routes:
-            match = r.matches(sub_data.room)
-            if match:
-                return match, r
-        return None
+    ) -> Optional[Tuple[Dict[str, str], SubRoute]]:
+        return self._sub_route_trie.match(sub_data.room)
 
     async def _on_subscribe(self, sid: str, data: dict):
         try:
@@ -265,29 +358,57 @@ The message must be of the form:
                     "subscribe", {"success": False, "error": "no events in path"}
                 )
                 return
-            match, route = result
+            params, route = result
 
             session: Dict[Any, Any] = await self.sio.get_session(sid)
             req = SubscriptionRequest(
                 sid=sid, sio=self.sio, room=sub_data.room, session=session
             )
-            maybe_coro = route.endpoint(req, **match.groupdict())
+            maybe_coro = route.endpoint(req, **params)
             if asyncio.iscoroutine(maybe_coro):
                 obs = await maybe_coro
             else:
                 obs = maybe_coro
             obs = cast(Observable, obs)
 
-            loop = asyncio.get_event_loop()
-
-            def on_next(data):
-                async def emit():
-                    await self.sio.emit(sub_data.room, data, to=sid)
-
-                loop.create_task(emit())
-
-            sub = obs.subscribe(on_next)
-            session.setdefault("_subscriptions", {})[sub_data.room] = sub
+            room = sub_data.room
+            self._outbox(sid).set_max_hz(
+                room, sub_data.max_hz if route.conflate is not False else None
+            )
+            room_sub = self._room_subs.get(room)
+            if room_sub is None:
+                # The first subscriber's observable becomes the upstream of the room,
+                # items are queued to the outbox of every sid in the room.
+                room_sub = RoomSubscription(route.conflate, {sid})
+                self._room_subs[room] = room_sub
+
+                def on_next(data):
+                    # serialized once here, every outbox sends the same encoded item
+                    key = self._conflation_key(room, room_sub.conflate, data)
+                    try:
+                        encoded = FastIOPacket.pre_encode(room, data)
+                    except Exception as e:  # pylint: disable=broad-except
+                        logger.error(f"failed to encode item of '{room}': {e}")
+                        return
+                    for room_sid in room_sub.sids:
+                        # a disconnected sid may still be in the room while it is released
+                        outbox = self._outboxes.get(room_sid)
+                        if outbox is not None:
+                            outbox.put(room, encoded, key)
+
+                room_sub.sub = obs.subscribe(on_next)
+            else:
+                # The room already has an upstream, only send the items emitted on
+                # subscription (usually the current state) to the new sid.
+                initial = []
+                obs.subscribe(initial.append).dispose()
+                room_sub.sids.add(sid)
+                outbox = self._outboxes.get(sid)
+                if outbox is not None:
+                    for item in initial:
+                        key = self._conflation_key(room, room_sub.conflate, item)
+                        outbox.put(room, FastIOPacket.pre_encode(room, item), key)
+            session.setdefault("_subscriptions", set()).add(sub_data.room)
 
         except HTTPException as e:
             await self.sio.emit(
@@ -296,24 +417,68 @@ The message must be of the form:
 
         await self.sio.emit("subscribe", {"success": True}, sid)
 
+    @staticmethod
+    def _conflation_key(room: str, conflate: Conflate, data: Any) -> Optional[Hashable]:
+        if conflate is False:
+            return None
+        if conflate is True:
+            return room
+        key = conflate(data)
+        if key is None:
+            return None
+        return (room, key)
+
+    def connection_stats(self) -> List[ConnectionStats]:
+        return [outbox.stats for outbox in self._outboxes.values()]
+
+    def _outbox(self, sid: str) -> Outbox:
+        outbox = self._outboxes.get(sid)
+        if outbox is None:
+            outbox = Outbox(
+                sid,
+                lambda room, data: self.sio.emit(room, data, to=sid),
+                lambda: self.sio.disconnect(sid),
+                self._outbound_queue_size,
+            )
+            self._outboxes[sid] = outbox
+        return outbox
+
+    def _release_room(self, sid: str, room: str):
+        room_sub = self._room_subs.get(room)
+        if room_sub is None:
+            return
+        room_sub.sids.discard(sid)
+        if not room_sub.sids:
+            if room_sub.sub is not None:
+                room_sub.sub.dispose()
+            del self._room_subs[room]
+
     async def _on_unsubscribe(self, sid: str, data: dict):
         try:
             sub_data = self._parse_sub_data(data)
             async with self.sio.session(sid) as session:
                 session: Dict[Any, Any]
-                sub = session["_subscriptions"].get(sub_data.room)
-                if sub is None:
+                subs: Set[str] = session.get("_subscriptions", set())
+                if sub_data.room not in subs:
                     raise SubscribeError("not subscribed to topic")
-                sub.dispose()
-                del session["_subscriptions"][sub_data.room]
+                subs.remove(sub_data.room)
+                self._release_room(sid, sub_data.room)
+                self._outbox(sid).set_max_hz(sub_data.room, None)
                 await self.sio.emit("unsubscribe", {"success": True})
         except SubscribeError as e:
             await self.sio.emit("unsubscribe", {"success": False, "error": str(e)})
 
     async def _on_disconnect(self, sid: str):
-        async with self.sio.session(sid) as session:
-            subs = session.get("_subscriptions")
-            if subs is None:
-                return
-            for s in subs.values():
-                s.dispose()
+        # leave the rooms before removing the outbox, so no item is queued for the sid
+        # once its outbox is closed
+        try:
+            async with self.sio.session(sid) as session:
+                subs = session.get("_subscriptions")
+                if subs is not None:
+                    for room in subs:
+                        self._release_room(sid, room)
+                    subs.clear()
+        finally:
+            outbox = self._outboxes.pop(sid, None)
+            if outbox is not None:
+                outbox.close()
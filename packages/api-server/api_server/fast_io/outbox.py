@@ -0,0 +1,138 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+import pydantic
+
+from api_server.logger import logger
+
+
+class ConnectionStats(pydantic.BaseModel):
+    sid: str
+    queue_depth: int = 0
+    sent: int = 0
+    conflated: int = 0
+    dropped: int = 0
+
+
+# marks a queued conflated item, the value is kept in `Outbox._latest`
+_LATEST = object()
+
+
+class Outbox:
+    """
+    Bounded queue of the messages waiting to be sent to a socket.io connection. Messages
+    are sent one at a time, so a slow client cannot pile up pending emits.
+
+    Conflated items replace the pending item with the same conflation key (usually the
+    room), a client which cannot keep up only receives the latest state. Conflated rooms
+    can also be limited to a max rate, in which case the latest item is held back until
+    it can be sent again. Other items are dropped when the queue is full, the client is
+    disconnected if it does not receive anything while a full queue worth of items is
+    dropped.
+    """
+
+    def __init__(
+        self,
+        sid: str,
+        send: Callable[[str, Any], Awaitable[Any]],
+        disconnect: Callable[[], Awaitable[Any]],
+        max_size: int,
+    ):
+        self.stats = ConnectionStats(sid=sid)
+        self._send = send
+        self._disconnect = disconnect
+        self._max_size = max_size
+        self._loop = asyncio.get_event_loop()
+        self._queue: Deque[Tuple[str, Any, Optional[Hashable]]] = deque()
+        self._latest: Dict[Hashable, Any] = {}
+        self._min_interval: Dict[str, float] = {}
+        self._next_send: Dict[Hashable, float] = {}
+        self._unconflated = 0
+        self._dropped_since_sent = 0
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def set_max_hz(self, room: str, max_hz: Optional[float]):
+        """
+        Limits the rate items of a conflated room are sent, `None` removes the limit.
+        """
+        if max_hz is None:
+            self._min_interval.pop(room, None)
+        else:
+            self._min_interval[room] = 1 / max_hz
+
+    def put(self, room: str, data: Any, key: Optional[Hashable]):
+        """
+        Queues an item to be sent, items with the same `key` are conflated, items without
+        a key are not.
+        """
+        if self._closed:
+            return
+        if key is not None:
+            if key in self._latest:
+                self._latest[key] = data
+                self.stats.conflated += 1
+                return
+            self._latest[key] = data
+            delay = self._next_send.get(key, 0) - self._loop.time()
+            if delay > 0:
+                self._loop.call_later(delay, self._put_latest, room, key)
+                return
+            self._queue.append((room, _LATEST, key))
+        else:
+            if self._unconflated >= self._max_size:
+                self.stats.dropped += 1
+                self._dropped_since_sent += 1
+                if self._dropped_since_sent >= self._max_size:
+                    logger.warning(
+                        f"{self.stats.sid}: disconnecting slow client, {self.stats.dropped} messages dropped"
+                    )
+                    self.close()
+                    self._loop.create_task(self._disconnect())
+                return
+            self._unconflated += 1
+            self._queue.append((room, data, None))
+        self._schedule_drain()
+
+    def _put_latest(self, room: str, key: Hashable):
+        if self._closed or key not in self._latest:
+            return
+        self._queue.append((room, _LATEST, key))
+        self._schedule_drain()
+
+    def _schedule_drain(self):
+        self.stats.queue_depth = len(self._queue)
+        if self._task is None:
+            self._task = self._loop.create_task(self._drain())
+
+    def close(self):
+        self._closed = True
+        self._queue.clear()
+        self._latest.clear()
+        self._next_send.clear()
+        self._unconflated = 0
+        self.stats.queue_depth = 0
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _drain(self):
+        while self._queue:
+            room, data, key = self._queue.popleft()
+            if data is _LATEST:
+                data = self._latest.pop(key)
+                if room in self._min_interval:
+                    self._next_send[key] = self._loop.time() + self._min_interval[room]
+                else:
+                    self._next_send.pop(key, None)
+            else:
+                self._unconflated -= 1
+            self.stats.queue_depth = len(self._queue)
+            try:
+                await self._send(room, data)
+                self.stats.sent += 1
+                self._dropped_since_sent = 0
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error(f"{self.stats.sid}: failed to send to '{room}': {e}")
+        self._task = None
@@ -0,0 +1,102 @@
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from starlette.convertors import PathConvertor, StringConvertor
+
+if TYPE_CHECKING:
+    from . import SubRoute
+
+_PARAM_SEGMENT = re.compile(r"^{([a-zA-Z_][a-zA-Z0-9_]*)(?::str)?}$")
+
+
+class _Node:
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.param: Optional["_Node"] = None
+        # (registration index, route, param names), param names is `None` if the regex of
+        # the route must be used to get the params.
+        self.routes: List[Tuple[int, "SubRoute", Optional[List[str]]]] = []
+
+
+class RouteTrie:
+    """
+    Indexes sub routes by their path segments, a path is resolved by walking its segments
+    instead of trying the regex of every route. The regex is only used for routes with
+    params that are not a whole segment or not a string, and for routes which can match
+    across segments (i.e. with the `path` convertor).
+
+    Like a linear search, the route registered first wins when more than one route match.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._multi_segment: List[Tuple[int, "SubRoute"]] = []
+        self._count = 0
+
+    def add(self, route: "SubRoute"):
+        index = self._count
+        self._count += 1
+        convertors = route.param_convertors.values()
+        if any(isinstance(x, PathConvertor) for x in convertors):
+            self._multi_segment.append((index, route))
+            return
+
+        node = self._root
+        names: Optional[List[str]] = []
+        for segment in route.path.split("/"):
+            if "{" in segment:
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+                param = _PARAM_SEGMENT.match(segment)
+                if names is not None and param:
+                    names.append(param.group(1))
+                else:
+                    names = None
+            else:
+                node = node.children.setdefault(segment, _Node())
+        if not all(isinstance(x, StringConvertor) for x in convertors):
+            names = None
+        node.routes.append((index, route, names))
+
+    def match(self, path: str) -> Optional[Tuple[Dict[str, str], "SubRoute"]]:
+        """
+        Returns the path params and the route matching a path.
+        """
+        segments = path.split("/")
+        end = len(segments)
+        # only a route added before the best match so far can replace it
+        best_index = self._count
+        best: Optional[Tuple[Dict[str, str], "SubRoute"]] = None
+        stack: List[Tuple[_Node, int, Tuple[str, ...]]] = [(self._root, 0, ())]
+        while stack:
+            node, depth, values = stack.pop()
+            if depth == end:
+                for index, route, names in node.routes:
+                    if index > best_index:
+                        break
+                    if names is None:
+                        match = route.matches(path)
+                        if not match:
+                            continue
+                        params = match.groupdict()
+                    else:
+                        params = dict(zip(names, values))
+                    best_index, best = index, (params, route)
+                    break
+                continue
+            segment = segments[depth]
+            child = node.children.get(segment)
+            if child is not None:
+                stack.append((child, depth + 1, values))
+            if node.param is not None and segment:
+                stack.append((node.param, depth + 1, values + (segment,)))
+
+        for index, route in self._multi_segment:
+            if index > best_index:
+                break
+            match = route.matches(path)
+            if match:
+                best = (match.groupdict(), route)
+                break
+        return best
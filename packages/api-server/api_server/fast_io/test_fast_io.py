@@ -0,0 +1,118 @@
+import asyncio
+import json
+import unittest
+from typing import Any, Dict, Optional
+from unittest.mock import AsyncMock, MagicMock
+
+import pydantic
+from reactivex import operators as rxops
+from reactivex.subject import Subject
+
+from . import FastIO, FastIOPacket, FastIORouter, SubscriptionRequest
+
+
+class TestFastIO(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fast_io = FastIO()
+        router = FastIORouter()
+        self.subject = Subject[str]()
+        self.upstream_subs = 0
+
+        def count_sub(_):
+            self.upstream_subs += 1
+
+        @router.sub("/test/{name}", conflate=True)
+        def sub_test(_req: SubscriptionRequest, name: str):
+            return self.subject.pipe(
+                rxops.filter(lambda x: x == name),
+                rxops.start_with(f"{name}_initial"),
+                rxops.do_action(on_next=count_sub),
+            )
+
+        self.fast_io.include_router(router)
+        sessions: Dict[str, Dict[Any, Any]] = {"sid1": {}, "sid2": {}}
+        self.fast_io.sio = MagicMock()
+        self.fast_io.sio.emit = AsyncMock()
+        self.fast_io.sio.get_session = AsyncMock(side_effect=lambda sid: sessions[sid])
+        session_context = MagicMock()
+        session_context.__aenter__ = AsyncMock(return_value=sessions["sid1"])
+        self.fast_io.sio.session.return_value = session_context
+
+    async def test_shares_upstream(self):
+        # pylint: disable=protected-access
+        fast_io = self.fast_io
+        await fast_io._on_subscribe("sid1", {"room": "/test/a"})
+        await fast_io._on_subscribe("sid2", {"room": "/test/a"})
+        self.assertEqual({"sid1", "sid2"}, fast_io._room_subs["/test/a"].sids)
+        # the initial state of the second subscriber is only sent to it
+        await asyncio.sleep(0)
+        fast_io.sio.emit.assert_any_await("/test/a", "a_initial", to="sid2")
+
+        fast_io.sio.emit.reset_mock()
+        self.upstream_subs = 0
+        self.subject.on_next("a")
+        # one upstream item, sent to every sid in the room
+        self.assertEqual(1, self.upstream_subs)
+        await asyncio.sleep(0)  # let the outboxes drain
+        fast_io.sio.emit.assert_any_await("/test/a", "a", to="sid1")
+        fast_io.sio.emit.assert_any_await("/test/a", "a", to="sid2")
+
+        await fast_io._on_unsubscribe("sid1", {"room": "/test/a"})
+        self.assertEqual({"sid2"}, fast_io._room_subs["/test/a"].sids)
+
+        fast_io._release_room("sid2", "/test/a")
+        self.assertNotIn("/test/a", fast_io._room_subs)
+        self.upstream_subs = 0
+        self.subject.on_next("a")
+        self.assertEqual(0, self.upstream_subs)
+
+    async def test_max_hz(self):
+        # pylint: disable=protected-access
+        fast_io = self.fast_io
+        await fast_io._on_subscribe("sid1", {"room": "/test/a", "max_hz": 2})
+        self.assertEqual(0.5, fast_io._outbox("sid1")._min_interval["/test/a"])
+        await fast_io._on_subscribe("sid1", {"room": "/test/a", "max_hz": "fast"})
+        fast_io.sio.emit.assert_awaited_with(
+            "subscribe",
+            {"success": False, "error": "'max_hz' must be a positive number"},
+        )
+
+    async def test_publish_while_disconnecting(self):
+        # pylint: disable=protected-access
+        fast_io = self.fast_io
+        await fast_io._on_subscribe("sid1", {"room": "/test/a"})
+        await fast_io._on_subscribe("sid2", {"room": "/test/a"})
+        await asyncio.sleep(0)
+        fast_io.sio.emit.reset_mock()
+
+        async def publish_on_enter():
+            self.subject.on_next("a")
+            return await fast_io.sio.get_session("sid1")
+
+        fast_io.sio.session.return_value.__aenter__ = AsyncMock(
+            side_effect=publish_on_enter
+        )
+        await fast_io._on_disconnect("sid1")
+        self.assertNotIn("sid1", fast_io._outboxes)
+        self.assertNotIn("sid1", fast_io._room_subs["/test/a"].sids)
+        await asyncio.sleep(0)
+        fast_io.sio.emit.assert_awaited_once_with("/test/a", "a", to="sid2")
+
+
+class TestFastIOPacket(unittest.TestCase):
+    def test_pre_encode(self):
+        class Item(pydantic.BaseModel):
+            name: str
+            value: Optional[int] = None
+
+        item = Item(name="a")
+        encoded = FastIOPacket.pre_encode("/test/a", [item])
+        self.assertEqual(
+            FastIOPacket(data=["/test/a", [item]]).encode(),
+            FastIOPacket(data=["/test/a", encoded]).encode(),
+        )
+        self.assertEqual(
+            ["/test/a", [{"name": "a"}]],
+            json.loads(FastIOPacket(data=["/test/a", encoded]).encode()[1:]),
+        )
+        self.assertEqual("a", FastIOPacket.pre_encode("/test/a", "a"))
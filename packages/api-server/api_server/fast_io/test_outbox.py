@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+from typing import Any, List, Tuple
+from unittest.mock import AsyncMock
+
+from .outbox import Outbox
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.sent: List[Tuple[str, Any]] = []
+        self.release = asyncio.Event()
+
+        async def send(room: str, data: Any):
+            await self.release.wait()
+            self.sent.append((room, data))
+
+        self.disconnect = AsyncMock()
+        self.outbox = Outbox("sid", send, self.disconnect, 2)
+
+    async def test_conflate(self):
+        # the first item is taken by the sender, the rest are conflated
+        for i in range(5):
+            self.outbox.put("state", i, "state")
+            await asyncio.sleep(0)
+        self.outbox.put("other_state", 0, "other_state")
+        self.assertEqual(3, self.outbox.stats.conflated)
+        self.assertEqual(2, self.outbox.stats.queue_depth)
+
+        self.release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(
+            [("state", 0), ("state", 4), ("other_state", 0)],
+            self.sent,
+        )
+        self.assertEqual(3, self.outbox.stats.sent)
+        self.assertEqual(0, self.outbox.stats.queue_depth)
+
+    async def test_drop_and_disconnect(self):
+        self.outbox.put("log", 0, None)
+        await asyncio.sleep(0)  # taken by the sender
+        self.outbox.put("log", 1, None)
+        self.outbox.put("log", 2, None)
+        self.outbox.put("log", 3, None)  # dropped
+        self.assertEqual(1, self.outbox.stats.dropped)
+        self.disconnect.assert_not_called()
+
+        self.outbox.put("log", 4, None)  # dropped, disconnects the client
+        await asyncio.sleep(0)
+        self.assertEqual(2, self.outbox.stats.dropped)
+        self.disconnect.assert_awaited_once()
+        self.assertEqual(0, self.outbox.stats.queue_depth)
+
+        self.outbox.put("log", 5, None)
+        self.assertEqual(2, self.outbox.stats.dropped)
+
+    async def test_max_hz(self):
+        self.release.set()
+        self.outbox.set_max_hz("state", 20)
+        self.outbox.put("state", 0, "state")
+        await asyncio.sleep(0.01)
+        self.assertEqual([("state", 0)], self.sent)
+
+        # held back until 50ms after the last send, only the latest is sent
+        self.outbox.put("state", 1, "state")
+        self.outbox.put("state", 2, "state")
+        await asyncio.sleep(0.01)
+        self.assertEqual([("state", 0)], self.sent)
+        await asyncio.sleep(0.06)
+        self.assertEqual([("state", 0), ("state", 2)], self.sent)
+        self.assertEqual(1, self.outbox.stats.conflated)
@@ -0,0 +1,57 @@
+import unittest
+
+from . import SubRoute
+from .route_trie import RouteTrie
+
+
+def endpoint(_req):
+    pass
+
+
+class TestRouteTrie(unittest.TestCase):
+    def setUp(self):
+        self.trie = RouteTrie()
+        self.routes = [
+            SubRoute("/doors/{door_name}/state", endpoint),
+            SubRoute("/doors/special/state", endpoint),
+            SubRoute("/doors/{door_name}/health", endpoint),
+            SubRoute("/building_map", endpoint),
+            SubRoute("/lifts/{lift_id:int}/state", endpoint),
+            SubRoute("/files/{file_path:path}", endpoint),
+        ]
+        for r in self.routes:
+            self.trie.add(r)
+
+    def test_match(self):
+        result = self.trie.match("/doors/door_1/state")
+        assert result is not None
+        params, route = result
+        self.assertIs(self.routes[0], route)
+        self.assertEqual({"door_name": "door_1"}, params)
+
+        result = self.trie.match("/doors/door_1/health")
+        assert result is not None
+        self.assertIs(self.routes[2], result[1])
+
+        result = self.trie.match("/building_map")
+        assert result is not None
+        self.assertIs(self.routes[3], result[1])
+
+        result = self.trie.match("/lifts/1/state")
+        assert result is not None
+        self.assertEqual({"lift_id": "1"}, result[0])
+        self.assertIsNone(self.trie.match("/lifts/lift_1/state"))
+
+        result = self.trie.match("/files/a/b/c")
+        assert result is not None
+        self.assertEqual({"file_path": "a/b/c"}, result[0])
+
+        self.assertIsNone(self.trie.match("/doors/door_1"))
+        self.assertIsNone(self.trie.match("/doors//state"))
+        self.assertIsNone(self.trie.match("/lifts/lift_1/state"))
+
+    def test_first_registered_wins(self):
+        # "/doors/{door_name}/state" is registered before "/doors/special/state"
+        result = self.trie.match("/doors/special/state")
+        assert result is not None
+        self.assertIs(self.routes[0], result[1])
@@ -4,7 +4,7 @@ import asyncio
 import base64
 import hashlib
 import logging
-from typing import Any, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import rclpy
 import rclpy.client
@@ -12,6 +12,7 @@ import rclpy.qos
 from builtin_interfaces.msg import Time as RosTime
 from fastapi import HTTPException
 from rclpy.subscription import Subscription
+from reactivex.subject import Subject
 from rmf_building_map_msgs.msg import AffineImage as RmfAffineImage
 from rmf_building_map_msgs.msg import BuildingMap as RmfBuildingMap
 from rmf_building_map_msgs.msg import Level as RmfLevel
@@ -26,10 +27,11 @@ from rmf_task_msgs.srv import CancelTask as RmfCancelTask
 from rmf_task_msgs.srv import SubmitTask as RmfSubmitTask
 from rosidl_runtime_py.convert import message_to_ordereddict
 
+from .app_config import app_config
 from .logger import logger as base_logger
 from .models import BuildingMap, DispenserState, DoorState, IngestorState, LiftState
 from .repositories import CachedFilesRepository, cached_files_repo
-from .rmf_io import rmf_events
+from .rmf_io import IngressFilter, LoopBridge, rmf_events
 from .ros import ros_node
 
 
@@ -77,6 +79,40 @@ class RmfGateway:
         self.cached_files = cached_files
         self.logger = logger or base_logger.getChild(self.__class__.__name__)
         self._subscriptions: List[Subscription] = []
+        # messages are converted on the ros thread, then emitted on the event loop
+        self.bridge = LoopBridge(
+            asyncio.get_event_loop(), logger=self.logger.getChild("LoopBridge")
+        )
+
+        # the fields of each type of state which are compared, apart from the timestamp
+        resend = app_config.ros_state_resend_interval
+        self.ingress: Dict[str, IngressFilter] = {
+            "door": IngressFilter(lambda x: x.door_name, ("current_mode",), resend),
+            "lift": IngressFilter(
+                lambda x: x.lift_name,
+                (
+                    "available_floors",
+                    "current_floor",
+                    "destination_floor",
+                    "door_state",
+                    "motion_state",
+                    "available_modes",
+                    "current_mode",
+                    "session_id",
+                ),
+                resend,
+            ),
+            "dispenser": IngressFilter(
+                lambda x: x.guid,
+                ("mode", "request_guid_queue", "seconds_remaining"),
+                resend,
+            ),
+            "ingestor": IngressFilter(
+                lambda x: x.guid,
+                ("mode", "request_guid_queue", "seconds_remaining"),
+                resend,
+            ),
+        }
 
         self._subscribe_all()
 
@@ -92,11 +128,31 @@ class RmfGateway:
         except asyncio.TimeoutError as e:
             raise HTTPException(503, "ros service call timed out") from e
 
+    def _on_state(
+        self, device_type: str, states: Subject, convert: Callable[[Any], Any]
+    ) -> Callable[[Any], None]:
+        """
+        States which did not change since the last state of their device are not
+        converted, they are only emitted as heartbeats. Both are handed to the event loop.
+        """
+        ingress = self.ingress[device_type]
+
+        def on_msg(msg):
+            if ingress.changed(msg):
+                self.bridge.post(states.on_next, convert(msg))
+            else:
+                self.bridge.post(
+                    rmf_events.device_heartbeats.on_next,
+                    (device_type, ingress.key(msg)),
+                )
+
+        return on_msg
+
     def _subscribe_all(self):
         door_states_sub = ros_node().create_subscription(
             RmfDoorState,
             "door_states",
-            lambda msg: rmf_events.door_states.on_next(DoorState.from_orm(msg)),
+            self._on_state("door", rmf_events.door_states, DoorState.from_orm),
             10,
         )
         self._subscriptions.append(door_states_sub)
@@ -108,7 +164,7 @@ class RmfGateway:
         lift_states_sub = ros_node().create_subscription(
             RmfLiftState,
             "lift_states",
-            lambda msg: rmf_events.lift_states.on_next(convert_lift_state(msg)),
+            self._on_state("lift", rmf_events.lift_states, convert_lift_state),
             10,
         )
         self._subscriptions.append(lift_states_sub)
@@ -116,8 +172,8 @@ class RmfGateway:
         dispenser_states_sub = ros_node().create_subscription(
             RmfDispenserState,
             "dispenser_states",
-            lambda msg: rmf_events.dispenser_states.on_next(
-                DispenserState.from_orm(msg)
+            self._on_state(
+                "dispenser", rmf_events.dispenser_states, DispenserState.from_orm
             ),
             10,
         )
@@ -126,7 +182,9 @@ class RmfGateway:
         ingestor_states_sub = ros_node().create_subscription(
             RmfIngestorState,
             "ingestor_states",
-            lambda msg: rmf_events.ingestor_states.on_next(IngestorState.from_orm(msg)),
+            self._on_state(
+                "ingestor", rmf_events.ingestor_states, IngestorState.from_orm
+            ),
             10,
         )
         self._subscriptions.append(ingestor_states_sub)
@@ -134,8 +192,9 @@ class RmfGateway:
         map_sub = ros_node().create_subscription(
             RmfBuildingMap,
             "map",
-            lambda msg: rmf_events.building_map.on_next(
-                process_building_map(msg, self.cached_files)
+            lambda msg: self.bridge.post(
+                rmf_events.building_map.on_next,
+                process_building_map(msg, self.cached_files),
             ),
             rclpy.qos.QoSProfile(
                 history=rclpy.qos.HistoryPolicy.KEEP_ALL,
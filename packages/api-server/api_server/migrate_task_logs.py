@@ -0,0 +1,80 @@
+"""
+Copies the task logs in the nested log tables to the denormalized log table, this must be
+done before enabling `denormalized_task_logs`.
+
+    RMF_API_SERVER_CONFIG=<config> python -m api_server.migrate_task_logs
+
+Entries which are already copied are skipped, so it can be run again to copy the logs
+written before the server was restarted with `denormalized_task_logs` enabled.
+"""
+
+import asyncio
+from typing import List
+
+from tortoise import Tortoise
+
+from api_server.app_config import app_config
+from api_server.logger import logger
+from api_server.models import tortoise_models as ttm
+from api_server.repositories.tasks import (
+    insert_task_log_entries,
+    iter_nested_task_log_entries,
+    iter_nested_task_log_markers,
+    task_log_marker,
+)
+
+
+async def migrate_task_logs(chunk_size: int = 1000) -> int:
+    """
+    :return: The number of entries read from the nested log tables.
+    """
+    # phases and events first, so their markers are in the order they were saved
+    rows: List[ttm.TaskLogEntry] = []
+    async for task_id, phase, event in iter_nested_task_log_markers():
+        rows.append(task_log_marker(task_id, phase, event))
+        if len(rows) >= chunk_size:
+            await insert_task_log_entries(rows)
+            rows = []
+    await insert_task_log_entries(rows)
+
+    count = 0
+    rows = []
+    async for task_id, phase, event, seq, unix_millis_time, tier, text in (
+        iter_nested_task_log_entries({})
+    ):
+        rows.append(
+            ttm.TaskLogEntry(
+                task_id=task_id,
+                phase=phase or "",
+                event=event or "",
+                seq=seq,
+                unix_millis_time=unix_millis_time,
+                tier=tier,
+                text=text,
+            )
+        )
+        if len(rows) >= chunk_size:
+            await insert_task_log_entries(rows)
+            count += len(rows)
+            rows = []
+    if rows:
+        await insert_task_log_entries(rows)
+        count += len(rows)
+    return count
+
+
+async def main():
+    await Tortoise.init(
+        db_url=app_config.db_url,
+        modules={"models": ["api_server.models.tortoise_models"]},
+    )
+    await Tortoise.generate_schemas()
+    try:
+        count = await migrate_task_logs()
+        logger.info(f"copied {count} task log entries")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
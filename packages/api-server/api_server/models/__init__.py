@@ -1,5 +1,6 @@
 from .authz import *
 from .building_map import *
+from .construct import construct_model
 from .dispensers import *
 from .doors import *
 from .fleets import *
@@ -44,4 +45,5 @@ from .rmf_api.task_state import Status, TaskState
 from .rmf_api.task_state_update import TaskStateUpdate
 from .rmf_api.undo_skip_phase_request import UndoPhaseSkipRequest
 from .rmf_api.undo_skip_phase_response import UndoPhaseSkipResponse
+from .task_stats import *
 from .user import *
@@ -1,3 +1,5 @@
+from api_server.upsert import upsert
+
 from . import tortoise_models as ttm
 from .ros_pydantic import rmf_building_map_msgs
 
@@ -22,4 +24,4 @@ class BuildingMap(rmf_building_map_msgs.BuildingMap):
         for m in existing_maps:
             if m.id_ != self.name:
                 await m.delete()
-        await ttm.BuildingMap.update_or_create({"data": self.dict()}, id_=self.name)
+        await upsert(ttm.BuildingMap, {"id_": self.name, "data": self.dict()})
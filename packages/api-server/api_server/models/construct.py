@@ -0,0 +1,65 @@
+from enum import Enum
+from typing import Any, Dict, Type, TypeVar
+
+from pydantic import BaseModel
+from pydantic.fields import (
+    SHAPE_DEFAULTDICT,
+    SHAPE_DICT,
+    SHAPE_LIST,
+    SHAPE_MAPPING,
+    SHAPE_SEQUENCE,
+    SHAPE_SINGLETON,
+    SHAPE_TUPLE_ELLIPSIS,
+    ModelField,
+)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_LIST_SHAPES = (SHAPE_LIST, SHAPE_SEQUENCE, SHAPE_TUPLE_ELLIPSIS)
+_DICT_SHAPES = (SHAPE_DICT, SHAPE_MAPPING, SHAPE_DEFAULTDICT)
+
+
+def _construct_type(type_: Any, value: Any) -> Any:
+    if not isinstance(type_, type):
+        return value
+    if issubclass(type_, BaseModel):
+        if "__root__" in type_.__fields__:
+            root = _construct_field(type_.__fields__["__root__"], value)
+            return type_.construct(__root__=root)
+        if isinstance(value, dict):
+            return construct_model(type_, value)
+        return value
+    if issubclass(type_, Enum):
+        try:
+            return type_(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _construct_field(field: ModelField, value: Any) -> Any:
+    if value is None:
+        return None
+    if field.sub_fields and field.shape == SHAPE_SINGLETON:
+        # unions cannot be resolved without validating, keep the raw value
+        return value
+    if field.shape == SHAPE_SINGLETON:
+        return _construct_type(field.type_, value)
+    if field.shape in _LIST_SHAPES and isinstance(value, list):
+        return [_construct_type(field.type_, v) for v in value]
+    if field.shape in _DICT_SHAPES and isinstance(value, dict):
+        return {k: _construct_type(field.type_, v) for k, v in value.items()}
+    return value
+
+
+def construct_model(cls: Type[ModelT], data: Dict[str, Any]) -> ModelT:
+    """
+    Like `BaseModel.construct`, but also constructs nested models and enums so attributes
+    can be accessed the same way as a validated model. No validation is done, this must
+    only be used on data from a trusted source.
+    """
+    values = {}
+    for name, field in cls.__fields__.items():
+        if field.alias in data:
+            values[name] = _construct_field(field, data[field.alias])
+    return cls.construct(**values)
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
 
+from api_server.upsert import upsert
+
 from . import tortoise_models as ttm
 from .health import BasicHealth, HealthStatus
 from .ros_pydantic import rmf_dispenser_msgs
@@ -25,4 +27,4 @@ class DispenserState(rmf_dispenser_msgs.DispenserState):
         return DispenserState(**tortoise.data)
 
     async def save(self) -> None:
-        await ttm.DispenserState.update_or_create({"data": self.dict()}, id_=self.guid)
+        await upsert(ttm.DispenserState, {"id_": self.guid, "data": self.dict()})
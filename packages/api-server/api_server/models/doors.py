@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 
+from api_server.upsert import upsert
+
 from . import tortoise_models as ttm
 from .health import BasicHealth, HealthStatus
 from .ros_pydantic import rmf_building_map_msgs, rmf_door_msgs
@@ -24,7 +26,7 @@ class DoorState(rmf_door_msgs.DoorState):
         return DoorState(**tortoise.data)
 
     async def save(self) -> None:
-        await ttm.DoorState.update_or_create({"data": self.dict()}, id_=self.door_name)
+        await upsert(ttm.DoorState, {"id_": self.door_name, "data": self.dict()})
 
 
 class DoorRequest(BaseModel):
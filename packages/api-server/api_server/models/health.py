@@ -13,3 +13,18 @@ class BasicHealth(BaseModel):
     id_: str
     health_status: HealthStatus
     health_message: str | None
+
+
+class HealthAvailability(BaseModel):
+    id_: str
+    # time in the period the device was healthy, in millis
+    uptime_millis: int
+    # time in the period the device was unhealthy or dead, in millis
+    downtime_millis: int
+    # uptime / (uptime + downtime), time before the first known health of the device is
+    # not counted
+    availability: float
+    # number of times the device went from healthy to unhealthy or dead in the period
+    failures: int
+    # mean time between failures, uptime / failures, `None` if there is no failure
+    mtbf_millis: float | None
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
 
+from api_server.upsert import upsert
+
 from . import tortoise_models as ttm
 from .health import BasicHealth, HealthStatus
 from .ros_pydantic import rmf_ingestor_msgs
@@ -25,4 +27,4 @@ class IngestorState(rmf_ingestor_msgs.IngestorState):
         return IngestorState(**tortoise.data)
 
     async def save(self) -> None:
-        await ttm.IngestorState.update_or_create({"data": self.dict()}, id_=self.guid)
+        await upsert(ttm.IngestorState, {"id_": self.guid, "data": self.dict()})
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 
+from api_server.upsert import upsert
+
 from . import tortoise_models as ttm
 from .health import BasicHealth, HealthStatus
 from .ros_pydantic import rmf_building_map_msgs, rmf_lift_msgs
@@ -25,7 +27,7 @@ class LiftState(rmf_lift_msgs.LiftState):
         return LiftState(**tortoise.data)
 
     async def save(self) -> None:
-        await ttm.LiftState.update_or_create({"data": self.dict()}, id_=self.lift_name)
+        await upsert(ttm.LiftState, {"id_": self.lift_name, "data": self.dict()})
 
 
 class LiftRequest(BaseModel):
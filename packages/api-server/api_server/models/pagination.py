@@ -7,3 +7,4 @@ class Pagination(BaseModel):
     limit: int
     offset: int
     order_by: Optional[str]
+    cursor: Optional[str] = None
@@ -0,0 +1,23 @@
+from enum import Enum
+
+from pydantic import BaseModel
+
+
+class TaskStatsPeriod(str, Enum):
+    hour = "hour"
+    day = "day"
+
+
+class TaskStats(BaseModel):
+    # start of the time bucket in unix millis, tasks are bucketed by their request time, or
+    # their start time if they do not have one
+    bucket: int
+    # `None` for the fields which are not grouped by
+    status: str | None
+    category: str | None
+    assigned_to: str | None
+    count: int
+    # number of tasks with both a start and a finish time
+    finished: int
+    # sum of the time between the start and finish time of the finished tasks
+    total_duration_millis: int
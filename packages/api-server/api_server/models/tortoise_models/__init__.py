@@ -9,6 +9,7 @@ from .health import (
     BasicHealthModel,
     DispenserHealth,
     DoorHealth,
+    HealthTransition,
     IngestorHealth,
     LiftHealth,
     RobotHealth,
@@ -26,7 +27,10 @@ from .tasks import (
     TaskEventLogPhasesLog,
     TaskFavorite,
     TaskFavoritePydantic,
+    TaskLogEntry,
     TaskRequest,
     TaskState,
+    TaskStatsEntry,
+    TaskStatsRollup,
 )
 from .user import *
@@ -1,4 +1,4 @@
-from tortoise.fields import CharField, TextField
+from tortoise.fields import BigIntField, CharField, TextField
 from tortoise.models import Model
 
 
@@ -29,3 +29,21 @@ class IngestorHealth(BasicHealthModel):
 
 class RobotHealth(BasicHealthModel):
     pass
+
+
+class HealthTransition(Model):
+    """
+    Append only history of the health of every device, with one row each time the health
+    status of a device changes. A status lasts until the next transition of the device.
+    """
+
+    id = BigIntField(pk=True)
+    # "door", "lift", "dispenser", "ingestor" or "robot"
+    device_type = CharField(255)
+    device_id = CharField(255)
+    health_status = CharField(255)
+    health_message = TextField(null=True)
+    unix_millis_start = BigIntField()
+
+    class Meta:
+        indexes = (("device_type", "device_id", "unix_millis_start"),)
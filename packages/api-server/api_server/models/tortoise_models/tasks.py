@@ -2,15 +2,20 @@ from datetime import datetime
 
 from tortoise.contrib.pydantic.creator import pydantic_model_creator
 from tortoise.fields import (
+    BigIntField,
+    CharEnumField,
     CharField,
     DatetimeField,
     ForeignKeyField,
     ForeignKeyRelation,
+    IntField,
     JSONField,
     ReverseRelation,
 )
 from tortoise.models import Model
 
+from api_server.models.task_stats import TaskStatsPeriod
+
 from .log import LogMixin
 
 
@@ -81,6 +86,61 @@ class TaskEventLogPhasesEventsLog(Model, LogMixin):
         unique_together = ("id", "seq")
 
 
+class TaskLogEntry(Model, LogMixin):
+    """
+    Log entries of tasks and their phases and events in a single table, so the log of a
+    task in a period is one index range scan. `phase` and `event` are empty for entries
+    which do not belong to a phase or an event.
+    """
+
+    task_id = CharField(255)
+    phase = CharField(255, default="")
+    event = CharField(255, default="")
+
+    class Meta:
+        unique_together = ("task_id", "phase", "event", "seq")
+        indexes = (("task_id", "unix_millis_time"),)
+
+
+class TaskStatsEntry(Model):
+    """
+    What a task state currently adds to the task stats rollups, so that its previous
+    contribution can be removed when it changes.
+    """
+
+    task_id = CharField(255, pk=True)
+    unix_millis_time = BigIntField(null=True)
+    status = CharField(255)
+    category = CharField(255)
+    assigned_to = CharField(255)
+    duration_millis = BigIntField(null=True)
+
+
+class TaskStatsRollup(Model):
+    """
+    Number of tasks and their durations for a time bucket and a combination of status,
+    category and assigned robot. Tasks without a value for one of them count as empty.
+    """
+
+    period = CharEnumField(TaskStatsPeriod, max_length=255)
+    bucket_millis = BigIntField()
+    status = CharField(255)
+    category = CharField(255)
+    assigned_to = CharField(255)
+    count = IntField(default=0)
+    finished = IntField(default=0)
+    total_duration_millis = BigIntField(default=0)
+
+    class Meta:
+        unique_together = (
+            "period",
+            "bucket_millis",
+            "status",
+            "category",
+            "assigned_to",
+        )
+
+
 class TaskFavorite(Model):
     id: str = CharField(255, pk=True, source_field="id")  # type: ignore
     name: str = CharField(255, null=False, index=True)  # type: ignore
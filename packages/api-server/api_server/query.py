@@ -1,5 +1,21 @@
-from typing import Dict, Optional
+import base64
+import json
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
 
+from fastapi import HTTPException
+from tortoise.expressions import Q
+from tortoise.models import Model
 from tortoise.queryset import MODEL, QuerySet
 
 from api_server.models.pagination import Pagination
@@ -30,3 +46,139 @@ def add_pagination(
                 order_fields.append(field_mappings.get(v, v))
         query = query.order_by(*order_fields)
     return query
+
+
+async def values_list_raw(
+    query: QuerySet[MODEL], *fields: str
+) -> List[Tuple[Any, ...]]:
+    """
+    Like `QuerySet.values_list`, but the values are returned as they are read from the
+    database instead of being converted by the fields. e.g. json fields are returned as
+    their json text, which can be sent as is without parsing and serializing it again.
+    """
+    sql = query.values_list(*fields).sql()
+    db = query.model._meta.db  # pylint: disable=W0212
+    _, rows = await db.execute_query(sql)
+    return [tuple(r) for r in rows]
+
+
+async def iter_values_raw(
+    query: QuerySet[MODEL], *fields: str, pk: str = "id", chunk_size: int = 1000
+) -> AsyncIterator[Tuple[Any, ...]]:
+    """
+    Iterates the values of every row of a query, like `values_list_raw`. The rows are read
+    in chunks ordered by `pk`, each chunk continues from the last `pk` of the previous one
+    so that reading a chunk is an index range scan and only one chunk is kept in memory.
+    """
+    after = None
+    while True:
+        chunk_query = query if after is None else query.filter(**{f"{pk}__gt": after})
+        rows = await values_list_raw(
+            chunk_query.order_by(pk).limit(chunk_size), pk, *fields
+        )
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][0]
+
+
+class KeysetPagination:
+    """
+    Paginates a query by the sort key of the last row of the previous page instead of an
+    offset, so that fetching a page is an index range scan no matter how deep the page is.
+
+    A page is ordered by a single key and `tiebreaker`, which must be unique. The position
+    of the next page is returned as an opaque cursor. Rows with a null sort key cannot be
+    positioned and are not returned.
+    """
+
+    def __init__(
+        self,
+        model: Type[Model],
+        pagination: Pagination,
+        keys: Collection[str],
+        tiebreaker: str,
+    ):
+        """
+        :param keys: The fields that can be sorted by, they should be indexed.
+        :raises HTTPException: If the order or the cursor is not valid.
+        """
+        self.limit = pagination.limit
+        self.order_by = pagination.order_by or tiebreaker
+        self._fields_map = model._meta.fields_map  # pylint: disable=W0212
+        self._tiebreaker = tiebreaker
+        self._descending = self.order_by.startswith("-")
+        self._key = self.order_by.lstrip("+-")
+        if "," in self.order_by:
+            raise HTTPException(
+                422, "cursor pagination only supports ordering by one field"
+            )
+        if self._key != tiebreaker and self._key not in keys:
+            raise HTTPException(
+                422,
+                f"cursor pagination cannot order by '{self._key}', supported fields are {sorted(set(keys) | {tiebreaker})}",
+            )
+        if pagination.offset:
+            raise HTTPException(422, "offset cannot be used with cursor")
+        self._after = self._decode(pagination.cursor) if pagination.cursor else None
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        """
+        The fields needed to make the cursor of a row.
+        """
+        if self._key == self._tiebreaker:
+            return (self._tiebreaker,)
+        return (self._key, self._tiebreaker)
+
+    def apply(self, query: QuerySet[MODEL]) -> QuerySet[MODEL]:
+        prefix = "-" if self._descending else ""
+        op = "lt" if self._descending else "gt"
+        if self._key != self._tiebreaker:
+            query = query.filter(**{f"{self._key}__isnull": False})
+        if self._after is not None:
+            if self._key == self._tiebreaker:
+                query = query.filter(**{f"{self._key}__{op}": self._after[0]})
+            else:
+                key_value, tiebreaker_value = self._after
+                query = query.filter(
+                    Q(**{f"{self._key}__{op}": key_value})
+                    | Q(
+                        **{
+                            self._key: key_value,
+                            f"{self._tiebreaker}__{op}": tiebreaker_value,
+                        }
+                    )
+                )
+        return query.order_by(*(prefix + f for f in self.fields)).limit(self.limit)
+
+    def next_cursor(self, rows: Sequence[Sequence[Any]]) -> Optional[str]:
+        """
+        :param rows: The values of `fields` of each row in the page, as returned by
+            `values_list` or `values_list_raw`.
+        :return: The cursor of the next page, `None` if this is the last page.
+        """
+        if len(rows) < self.limit:
+            return None
+        values = []
+        for name, value in zip(self.fields, rows[-1]):
+            value = self._fields_map[name].to_python_value(value)
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        data = json.dumps({"order_by": self.order_by, "after": values})
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def _decode(self, cursor: str) -> List[Any]:
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values = [
+                self._fields_map[name].to_python_value(value)
+                for name, value in zip(self.fields, data["after"], strict=True)
+            ]
+        except Exception as e:
+            raise HTTPException(422, "invalid cursor") from e
+        if data.get("order_by") != self.order_by:
+            raise HTTPException(
+                422, "cursor was made with a different order, start from the first page"
+            )
+        return values
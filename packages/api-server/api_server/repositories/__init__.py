@@ -1,5 +1,12 @@
 from .alerts import AlertRepository, alert_repo_dep
 from .cached_files import CachedFilesRepository, cached_files_repo
-from .fleets import FleetRepository, fleet_repo_dep
+from .fleets import (
+    FleetRepository,
+    FleetStateWriteBehind,
+    fleet_repo_dep,
+    fleet_state_write_behind,
+)
+from .health_history import query_health_availability
 from .rmf import RmfRepository, rmf_repo_dep
+from .task_stats import query_task_stats, update_task_stats
 from .tasks import TaskRepository, task_repo_dep
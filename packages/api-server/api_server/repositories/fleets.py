@@ -1,14 +1,21 @@
-from typing import List, Optional, Sequence, Tuple
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from fastapi import Depends
 from tortoise.exceptions import IntegrityError
 from tortoise.query_utils import Prefetch
 from tortoise.transactions import in_transaction
 
+from api_server.app_config import app_config
 from api_server.authenticator import user_dep
-from api_server.logger import format_exception, logger
+from api_server.logger import format_exception
+from api_server.logger import logger as base_logger
 from api_server.models import FleetLog, FleetState, LogEntry, User
 from api_server.models import tortoise_models as ttm
+from api_server.query import iter_values_raw, values_list_raw
+from api_server.upsert import upsert, upsert_many
 
 
 class FleetRepository:
@@ -17,15 +24,44 @@ class FleetRepository:
 
     async def get_all_fleets(self) -> List[FleetState]:
         db_states = await ttm.FleetState.all().values_list("data")
-        return [FleetState(**s[0]) for s in db_states]
+        fleets = {s.name: s for s in (FleetState(**s[0]) for s in db_states)}
+        fleets.update(fleet_state_write_behind.all_pending())
+        return list(fleets.values())
+
+    async def get_all_fleets_raw(self) -> List[str]:
+        """
+        Like `get_all_fleets`, but returns the json of the fleet states without parsing the
+        stored states.
+        """
+        db_states = await values_list_raw(ttm.FleetState.all(), "name", "data")
+        fleets: Dict[str, str] = dict(db_states)
+        fleets.update(fleet_state_write_behind.all_pending_json())
+        return list(fleets.values())
 
     async def get_fleet_state(self, name: str) -> Optional[FleetState]:
         # TODO: enforce with authz
+        pending = fleet_state_write_behind.get_pending(name)
+        if pending is not None:
+            return pending
         result = await ttm.FleetState.get_or_none(name=name)
         if result is None:
             return None
         return FleetState(**result.data)
 
+    async def get_fleet_state_raw(self, name: str) -> Optional[str]:
+        """
+        Like `get_fleet_state`, but returns the json of the fleet state without parsing the
+        stored state.
+        """
+        # TODO: enforce with authz
+        pending = fleet_state_write_behind.get_pending_json(name)
+        if pending is not None:
+            return pending
+        results = await values_list_raw(ttm.FleetState.filter(name=name), "data")
+        if not results:
+            return None
+        return results[0][0]
+
     async def get_fleet_log(
         self, name: str, between: Tuple[int, int]
     ) -> Optional[FleetLog]:
@@ -55,12 +91,61 @@ class FleetRepository:
             robots=robots,
         )
 
-    async def save_fleet_state(self, fleet_state: FleetState) -> None:
-        await ttm.FleetState.update_or_create(
+    async def export_fleet_logs(self, between: Tuple[int, int]) -> AsyncIterator[str]:
+        """
+        Yields every log entry of every fleet in a period as json. The entries of the fleets
+        and robots are yielded one after another, they are not sorted by time.
+
+        :param between: The period in unix millis to fetch.
+        """
+        between_filters = {
+            "unix_millis_time__gte": between[0],
+            "unix_millis_time__lte": between[1],
+        }
+        log_fields = ("seq", "unix_millis_time", "tier", "text")
+        async for fleet, seq, unix_millis_time, tier, text in iter_values_raw(
+            ttm.FleetLogLog.filter(**between_filters), "fleet_id", *log_fields
+        ):
+            yield json.dumps(
+                {
+                    "fleet": fleet,
+                    "robot": None,
+                    "seq": seq,
+                    "unix_millis_time": unix_millis_time,
+                    "tier": tier,
+                    "text": text,
+                }
+            )
+        async for fleet, robot, seq, unix_millis_time, tier, text in iter_values_raw(
+            ttm.FleetLogRobotsLog.filter(**between_filters),
+            "robot__fleet_id",
+            "robot__name",
+            *log_fields,
+        ):
+            yield json.dumps(
+                {
+                    "fleet": fleet,
+                    "robot": robot,
+                    "seq": seq,
+                    "unix_millis_time": unix_millis_time,
+                    "tier": tier,
+                    "text": text,
+                }
+            )
+
+    async def save_fleet_state(
+        self, fleet_state: FleetState, data_json: Optional[str] = None
+    ) -> None:
+        """
+        :param data_json: The json of `fleet_state`, if it is already available, it is
+            stored as is instead of serializing `fleet_state` again.
+        """
+        await upsert(
+            ttm.FleetState,
             {
-                "data": fleet_state.json(),
+                "name": fleet_state.name,
+                "data": data_json if data_json is not None else fleet_state.json(),
             },
-            name=fleet_state.name,
         )
 
     async def save_fleet_log(self, fleet_log: FleetLog) -> None:
@@ -80,7 +165,135 @@ class FleetRepository:
                 if fleet_log.log:
                     await _save_logs(db_fleet_log, fleet_log.log)
             except IntegrityError as e:
-                logger.error(format_exception(e))
+                base_logger.error(format_exception(e))
+
+
+class FleetStateWriteBehind:
+    """
+    Buffers fleet states keyed by fleet name and periodically writes only the latest state
+    of each fleet to the database. States that are not yet written are still visible
+    through `FleetRepository`.
+    """
+
+    def __init__(self, interval: float, *, logger: Optional[logging.Logger] = None):
+        """
+        :param interval: Seconds between each write. If it is 0 or the buffer is not
+            started, fleet states are written as they are received.
+        """
+        self.interval = interval
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._pending: Dict[str, Tuple[FleetState, Optional[str]]] = {}
+        # states of the flush in progress, they are still visible until it commits
+        self._in_flight: Dict[str, Tuple[FleetState, Optional[str]]] = {}
+        self._write_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def get_pending(self, name: str) -> Optional[FleetState]:
+        pending = self._pending.get(name, self._in_flight.get(name))
+        return pending[0] if pending is not None else None
+
+    def all_pending(self) -> Dict[str, FleetState]:
+        return {name: pending[0] for name, pending in self._all_pending().items()}
+
+    def get_pending_json(self, name: str) -> Optional[str]:
+        pending = self._pending.get(name, self._in_flight.get(name))
+        return self._pending_json(pending) if pending is not None else None
+
+    def all_pending_json(self) -> Dict[str, str]:
+        return {
+            name: self._pending_json(pending)
+            for name, pending in self._all_pending().items()
+        }
+
+    def _all_pending(self) -> Dict[str, Tuple[FleetState, Optional[str]]]:
+        return {**self._in_flight, **self._pending}
+
+    @staticmethod
+    def _pending_json(pending: Tuple[FleetState, Optional[str]]) -> str:
+        fleet_state, data_json = pending
+        return data_json if data_json is not None else fleet_state.json()
+
+    async def put(
+        self, fleet_state: FleetState, data_json: Optional[str] = None
+    ) -> None:
+        """
+        :param data_json: The json of `fleet_state`, if it is already available, it is
+            stored as is instead of serializing `fleet_state` again.
+        """
+        if self._flush_task is None:
+            await self._write([(fleet_state, data_json)])
+            return
+        self._pending[fleet_state.name] = (fleet_state, data_json)
+
+    async def flush(self) -> None:
+        async with self._write_lock:
+            if not self._pending:
+                return
+            pending = self._pending
+            self._pending = {}
+            self._in_flight = pending
+            try:
+                await self._write(pending.values())
+            except BaseException:
+                # keep the states that are not superseded while writing so they are
+                # retried, this includes being cancelled
+                for name, item in pending.items():
+                    self._pending.setdefault(name, item)
+                raise
+            finally:
+                self._in_flight = {}
+
+    async def start(self) -> None:
+        if self.interval <= 0 or self._flush_task is not None:
+            return
+        self._stopping = asyncio.Event()
+        self._flush_task = asyncio.create_task(self._spin(self._stopping))
+
+    async def stop(self) -> None:
+        if self._flush_task is None:
+            return
+        assert self._stopping is not None
+        # let an in-flight write finish instead of cancelling it
+        self._stopping.set()
+        await self._flush_task
+        self._flush_task = None
+        self._stopping = None
+        await self.flush()
+
+    @staticmethod
+    async def _write(items: Iterable[Tuple[FleetState, Optional[str]]]) -> None:
+        async with in_transaction():
+            await upsert_many(
+                ttm.FleetState,
+                [
+                    {
+                        "name": fleet_state.name,
+                        "data": data_json
+                        if data_json is not None
+                        else fleet_state.json(),
+                    }
+                    for fleet_state, data_json in items
+                ],
+            )
+
+    async def _spin(self, stopping: asyncio.Event) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(stopping.wait(), self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.error(f"failed to write fleet states: {e}")
+
+
+fleet_state_write_behind = FleetStateWriteBehind(
+    app_config.fleet_state_write_interval,
+    logger=base_logger.getChild("FleetStateWriteBehind"),
+)
 
 
 def fleet_repo_dep(user: User = Depends(user_dep)):
@@ -0,0 +1,201 @@
+from typing import Dict, List, Optional, Tuple
+
+from tortoise.expressions import Q
+from tortoise.functions import Max
+
+from api_server.models import HealthAvailability, HealthStatus
+from api_server.models import tortoise_models as ttm
+
+# dialects `_availability_sql` is written for
+_SQL_DIALECTS = ("sqlite", "postgres")
+
+# device id, uptime, downtime and failures
+AvailabilityRow = Tuple[str, int, int, int]
+
+
+def _availability_sql(parameters: List[str], by_device: bool) -> str:
+    table = ttm.HealthTransition._meta.db_table  # pylint: disable=W0212
+    healthy = HealthStatus.HEALTHY.value
+    lo, hi, device_type = parameters[:3]
+    if by_device:
+        devices = f"SELECT CAST({parameters[3]} AS VARCHAR(255)) AS device_id"
+    else:
+        # walks the index one device at a time instead of reading all their transitions
+        devices = f"""SELECT MIN(t.device_id) AS device_id
+    FROM "{table}" t, period
+    WHERE t.device_type = period.device_type
+    UNION ALL
+    SELECT (
+        SELECT MIN(t.device_id)
+        FROM "{table}" t
+        WHERE t.device_type = (SELECT device_type FROM period)
+            AND t.device_id > devices.device_id
+    )
+    FROM devices
+    WHERE devices.device_id IS NOT NULL"""
+    # the window of each device starts at its last transition before the period, which
+    # gives its status at the start of the period, so older transitions are not read.
+    # CROSS JOIN stops sqlite from reordering the join, so that the window of each device
+    # is one index range scan. Spans are clamped to the period.
+    return f"""
+WITH RECURSIVE period AS (
+    SELECT
+        CAST({lo} AS BIGINT) AS lo,
+        CAST({hi} AS BIGINT) AS hi,
+        CAST({device_type} AS VARCHAR(255)) AS device_type
+),
+devices AS (
+    {devices}
+),
+windows AS (
+    SELECT
+        devices.device_id,
+        (
+            SELECT MAX(t.unix_millis_start)
+            FROM "{table}" t
+            WHERE t.device_type = period.device_type
+                AND t.device_id = devices.device_id
+                AND t.unix_millis_start < period.lo
+        ) AS window_start
+    FROM devices, period
+    WHERE devices.device_id IS NOT NULL
+),
+transitions AS (
+    SELECT
+        t.device_id,
+        t.health_status,
+        t.unix_millis_start,
+        LEAD(t.unix_millis_start) OVER w AS next_start,
+        LAG(t.health_status) OVER w AS prev_status
+    FROM windows CROSS JOIN period CROSS JOIN "{table}" t
+    WHERE t.device_type = period.device_type
+        AND t.device_id = windows.device_id
+        AND t.unix_millis_start >= COALESCE(windows.window_start, period.lo)
+        AND t.unix_millis_start < period.hi
+    WINDOW w AS (PARTITION BY t.device_id ORDER BY t.unix_millis_start, t.id)
+),
+spans AS (
+    SELECT
+        device_id,
+        health_status,
+        prev_status,
+        unix_millis_start >= period.lo AS in_period,
+        CASE WHEN unix_millis_start < period.lo
+            THEN period.lo ELSE unix_millis_start END AS span_start,
+        CASE WHEN next_start IS NULL OR next_start > period.hi
+            THEN period.hi ELSE next_start END AS span_end
+    FROM transitions, period
+)
+SELECT
+    device_id,
+    SUM(CASE WHEN health_status = '{healthy}'
+        THEN span_end - span_start ELSE 0 END),
+    SUM(CASE WHEN health_status = '{healthy}'
+        THEN 0 ELSE span_end - span_start END),
+    SUM(CASE WHEN in_period AND health_status <> '{healthy}'
+        AND prev_status = '{healthy}' THEN 1 ELSE 0 END)
+FROM spans
+WHERE span_end > span_start
+GROUP BY device_id
+ORDER BY device_id
+"""
+
+
+async def _query_availability_sql(
+    device_type: str, between: Tuple[int, int], device_id: Optional[str]
+) -> List[AvailabilityRow]:
+    db = ttm.HealthTransition._meta.db  # pylint: disable=W0212
+    executor = db.executor_class(model=ttm.HealthTransition, db=db)
+    values: List[object] = [between[0], between[1], device_type]
+    if device_id is not None:
+        values.append(device_id)
+    parameters = [executor.parameter(i).get_sql() for i in range(len(values))]
+    sql = _availability_sql(parameters, device_id is not None)
+    _, rows = await db.execute_query(sql, values)
+    return [(row[0], int(row[1]), int(row[2]), int(row[3])) for row in rows]
+
+
+async def _query_availability_orm(
+    device_type: str, between: Tuple[int, int], device_id: Optional[str]
+) -> List[AvailabilityRow]:
+    """
+    Computes the same rows as `_availability_sql` from transitions read with the orm, for
+    databases the sql is not written for.
+    """
+    lo, hi = between
+    query = ttm.HealthTransition.filter(device_type=device_type)
+    if device_id is not None:
+        query = query.filter(device_id=device_id)
+    window_starts = (
+        await query.filter(unix_millis_start__lt=lo)
+        .annotate(window_start=Max("unix_millis_start"))
+        .group_by("device_id")
+        .values_list("device_id", "window_start")
+    )
+    in_window = Q(unix_millis_start__gte=lo, unix_millis_start__lt=hi)
+    for window_device_id, window_start in window_starts:
+        in_window |= Q(device_id=window_device_id, unix_millis_start=window_start)
+    windows: Dict[str, List[Tuple[int, int, str]]] = {}
+    for transition_device_id, status, start, id_ in await query.filter(
+        in_window
+    ).values_list("device_id", "health_status", "unix_millis_start", "id"):
+        windows.setdefault(transition_device_id, []).append((start, id_, status))
+
+    healthy = HealthStatus.HEALTHY.value
+    rows = []
+    for window_device_id in sorted(windows):
+        transitions = sorted(windows[window_device_id])
+        uptime, downtime, failures = 0, 0, 0
+        for i, (start, _, status) in enumerate(transitions):
+            next_start = transitions[i + 1][0] if i + 1 < len(transitions) else hi
+            span = min(next_start, hi) - max(start, lo)
+            if span <= 0:
+                continue
+            if status == healthy:
+                uptime += span
+            else:
+                downtime += span
+            if (
+                start >= lo
+                and status != healthy
+                and i > 0
+                and transitions[i - 1][2] == healthy
+            ):
+                failures += 1
+        if uptime + downtime > 0:
+            rows.append((window_device_id, uptime, downtime, failures))
+    return rows
+
+
+async def query_health_availability(
+    device_type: str, between: Tuple[int, int], device_id: Optional[str] = None
+) -> List[HealthAvailability]:
+    """
+    Availability, downtime and mean time between failures of each device of a type, from
+    the health transitions in a period. Everything is computed by a single aggregate
+    query, on databases other than sqlite and postgres it is computed from the
+    transitions in the period instead. The time after the last transition of a device
+    counts as its last status until the end of the period.
+
+    :param device_type: "door", "lift", "dispenser", "ingestor" or "robot".
+    :param between: The period in unix millis.
+    :param device_id: Only query this device.
+    """
+    db = ttm.HealthTransition._meta.db  # pylint: disable=W0212
+    if db.capabilities.dialect in _SQL_DIALECTS:
+        rows = await _query_availability_sql(device_type, between, device_id)
+    else:
+        rows = await _query_availability_orm(device_type, between, device_id)
+    result = []
+    for row_device_id, uptime, downtime, failures in rows:
+        result.append(
+            HealthAvailability(
+                id_=row_device_id,
+                uptime_millis=uptime,
+                downtime_millis=downtime,
+                availability=uptime / (uptime + downtime),
+                failures=failures,
+                mtbf_millis=uptime / failures if failures else None,
+            )
+        )
+    return result
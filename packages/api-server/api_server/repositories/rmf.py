@@ -20,6 +20,7 @@ from api_server.models import (
 )
 from api_server.models import tortoise_models as ttm
 from api_server.query import add_pagination
+from api_server.rmf_io import CachedBuildingMap, latest_states
 
 
 class RmfRepository:
@@ -34,79 +35,197 @@ class RmfRepository:
                 filter_params[k] = v
         return filter_params
 
+    async def get_cached_building_map(self) -> CachedBuildingMap | None:
+        if latest_states.building_map is not None:
+            return latest_states.building_map
+        db_building_map = await ttm.BuildingMap.first()
+        if db_building_map is None:
+            return None
+        cached = CachedBuildingMap(BuildingMap(**db_building_map.data))
+        # a newer map may have been published while loading from the db
+        if latest_states.building_map is None:
+            latest_states.building_map = cached
+        return latest_states.building_map
+
     async def get_bulding_map(self) -> BuildingMap | None:
-        building_map = await ttm.BuildingMap.first()
-        if building_map is None:
+        cached = await self.get_cached_building_map()
+        if cached is None:
             return None
-        return BuildingMap(**building_map.data)
+        return cached.building_map
 
     async def get_doors(self) -> list[Door]:
-        building_map = await self.get_bulding_map()
-        if building_map is None:
+        cached = await self.get_cached_building_map()
+        if cached is None:
             return []
-        return [door for level in building_map.levels for door in level.doors]
+        return cached.doors
+
+    async def get_door(self, door_name: str) -> Door | None:
+        cached = await self.get_cached_building_map()
+        if cached is None:
+            return None
+        return cached.doors_by_name.get(door_name)
 
     async def get_door_state(self, door_name: str) -> DoorState | None:
-        door_state = await ttm.DoorState.get_or_none(id_=door_name)
-        if door_state is None:
+        door_state = latest_states.door_states.get(door_name)
+        if door_state is not None:
+            return door_state
+        db_door_state = await ttm.DoorState.get_or_none(id_=door_name)
+        if db_door_state is None:
             return None
-        return DoorState(**door_state.data)
+        return latest_states.door_states.setdefault(
+            door_name, DoorState(**db_door_state.data)
+        )
 
     async def get_door_health(self, door_name: str) -> DoorHealth | None:
-        door_health = await ttm.DoorHealth.get_or_none(id_=door_name)
-        if door_health is None:
+        door_health = latest_states.door_health.get(door_name)
+        if door_health is not None:
+            return door_health
+        db_door_health = await ttm.DoorHealth.get_or_none(id_=door_name)
+        if db_door_health is None:
             return None
-        return await DoorHealth.from_tortoise_orm(door_health)
+        return latest_states.door_health.setdefault(
+            door_name, await DoorHealth.from_tortoise_orm(db_door_health)
+        )
+
+    async def get_all_door_states(self) -> list[DoorState]:
+        if latest_states.loaded:
+            return list(latest_states.door_states.values())
+        return [DoorState(**x.data) for x in await ttm.DoorState.all()]
+
+    async def get_all_door_health(self) -> list[DoorHealth]:
+        if latest_states.loaded:
+            return list(latest_states.door_health.values())
+        return [
+            await DoorHealth.from_tortoise_orm(x) for x in await ttm.DoorHealth.all()
+        ]
 
     async def get_lifts(self) -> list[Lift]:
-        building_map = await self.get_bulding_map()
-        if building_map is None:
+        cached = await self.get_cached_building_map()
+        if cached is None:
             return []
-        return building_map.lifts
+        return cached.building_map.lifts
+
+    async def get_lift(self, lift_name: str) -> Lift | None:
+        cached = await self.get_cached_building_map()
+        if cached is None:
+            return None
+        return cached.lifts_by_name.get(lift_name)
 
     async def get_lift_state(self, lift_name: str) -> LiftState | None:
-        lift_state = await ttm.LiftState.get_or_none(id_=lift_name)
-        if lift_state is None:
+        lift_state = latest_states.lift_states.get(lift_name)
+        if lift_state is not None:
+            return lift_state
+        db_lift_state = await ttm.LiftState.get_or_none(id_=lift_name)
+        if db_lift_state is None:
             return None
-        return LiftState(**lift_state.data)
+        return latest_states.lift_states.setdefault(
+            lift_name, LiftState(**db_lift_state.data)
+        )
 
     async def get_lift_health(self, lift_name: str) -> LiftHealth | None:
-        lift_health = await ttm.LiftHealth.get_or_none(id_=lift_name)
-        if lift_health is None:
+        lift_health = latest_states.lift_health.get(lift_name)
+        if lift_health is not None:
+            return lift_health
+        db_lift_health = await ttm.LiftHealth.get_or_none(id_=lift_name)
+        if db_lift_health is None:
             return None
-        return await LiftHealth.from_tortoise_orm(lift_health)
+        return latest_states.lift_health.setdefault(
+            lift_name, await LiftHealth.from_tortoise_orm(db_lift_health)
+        )
+
+    async def get_all_lift_states(self) -> list[LiftState]:
+        if latest_states.loaded:
+            return list(latest_states.lift_states.values())
+        return [LiftState(**x.data) for x in await ttm.LiftState.all()]
+
+    async def get_all_lift_health(self) -> list[LiftHealth]:
+        if latest_states.loaded:
+            return list(latest_states.lift_health.values())
+        return [
+            await LiftHealth.from_tortoise_orm(x) for x in await ttm.LiftHealth.all()
+        ]
 
     async def get_dispensers(self) -> list[Dispenser]:
+        if latest_states.loaded:
+            return [Dispenser(guid=guid) for guid in latest_states.dispenser_states]
         states = await ttm.DispenserState.all()
         return [Dispenser(guid=state.data["guid"]) for state in states]
 
     async def get_dispenser_state(self, guid: str) -> DispenserState | None:
-        dispenser_state = await ttm.DispenserState.get_or_none(id_=guid)
-        if dispenser_state is None:
+        dispenser_state = latest_states.dispenser_states.get(guid)
+        if dispenser_state is not None:
+            return dispenser_state
+        db_dispenser_state = await ttm.DispenserState.get_or_none(id_=guid)
+        if db_dispenser_state is None:
             return None
-        return DispenserState(**dispenser_state.data)
+        return latest_states.dispenser_states.setdefault(
+            guid, DispenserState(**db_dispenser_state.data)
+        )
 
     async def get_dispenser_health(self, guid: str) -> DispenserHealth | None:
-        dispenser_health = await ttm.DispenserHealth.get_or_none(id_=guid)
-        if dispenser_health is None:
+        dispenser_health = latest_states.dispenser_health.get(guid)
+        if dispenser_health is not None:
+            return dispenser_health
+        db_dispenser_health = await ttm.DispenserHealth.get_or_none(id_=guid)
+        if db_dispenser_health is None:
             return None
-        return await DispenserHealth.from_tortoise_orm(dispenser_health)
+        return latest_states.dispenser_health.setdefault(
+            guid, await DispenserHealth.from_tortoise_orm(db_dispenser_health)
+        )
+
+    async def get_all_dispenser_states(self) -> list[DispenserState]:
+        if latest_states.loaded:
+            return list(latest_states.dispenser_states.values())
+        return [DispenserState(**x.data) for x in await ttm.DispenserState.all()]
+
+    async def get_all_dispenser_health(self) -> list[DispenserHealth]:
+        if latest_states.loaded:
+            return list(latest_states.dispenser_health.values())
+        return [
+            await DispenserHealth.from_tortoise_orm(x)
+            for x in await ttm.DispenserHealth.all()
+        ]
 
     async def get_ingestors(self) -> list[Ingestor]:
+        if latest_states.loaded:
+            return [Ingestor(guid=guid) for guid in latest_states.ingestor_states]
         states = await ttm.IngestorState.all()
         return [Ingestor(guid=state.data["guid"]) for state in states]
 
     async def get_ingestor_state(self, guid: str) -> IngestorState | None:
-        ingestor_state = await ttm.IngestorState.get_or_none(id_=guid)
-        if ingestor_state is None:
+        ingestor_state = latest_states.ingestor_states.get(guid)
+        if ingestor_state is not None:
+            return ingestor_state
+        db_ingestor_state = await ttm.IngestorState.get_or_none(id_=guid)
+        if db_ingestor_state is None:
             return None
-        return IngestorState(**ingestor_state.data)
+        return latest_states.ingestor_states.setdefault(
+            guid, IngestorState(**db_ingestor_state.data)
+        )
 
     async def get_ingestor_health(self, guid: str) -> IngestorHealth | None:
-        ingestor_health = await ttm.IngestorHealth.get_or_none(id_=guid)
-        if ingestor_health is None:
+        ingestor_health = latest_states.ingestor_health.get(guid)
+        if ingestor_health is not None:
+            return ingestor_health
+        db_ingestor_health = await ttm.IngestorHealth.get_or_none(id_=guid)
+        if db_ingestor_health is None:
             return None
-        return await IngestorHealth.from_tortoise_orm(ingestor_health)
+        return latest_states.ingestor_health.setdefault(
+            guid, await IngestorHealth.from_tortoise_orm(db_ingestor_health)
+        )
+
+    async def get_all_ingestor_states(self) -> list[IngestorState]:
+        if latest_states.loaded:
+            return list(latest_states.ingestor_states.values())
+        return [IngestorState(**x.data) for x in await ttm.IngestorState.all()]
+
+    async def get_all_ingestor_health(self) -> list[IngestorHealth]:
+        if latest_states.loaded:
+            return list(latest_states.ingestor_health.values())
+        return [
+            await IngestorHealth.from_tortoise_orm(x)
+            for x in await ttm.IngestorHealth.all()
+        ]
 
     async def query_users(
         self,
@@ -0,0 +1,166 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+from tortoise.expressions import F
+from tortoise.functions import Sum
+from tortoise.transactions import in_transaction
+
+from api_server.models import TaskState, TaskStats, TaskStatsPeriod
+from api_server.models import tortoise_models as ttm
+from api_server.upsert import upsert
+
+PERIOD_MILLIS = {
+    TaskStatsPeriod.hour: 60 * 60 * 1000,
+    TaskStatsPeriod.day: 24 * 60 * 60 * 1000,
+}
+GROUP_BY_FIELDS = ("status", "category", "assigned_to")
+_ROLLUP_KEY_FIELDS = ("period", "bucket_millis", *GROUP_BY_FIELDS)
+_ENTRY_FIELDS = (
+    "unix_millis_time",
+    "status",
+    "category",
+    "assigned_to",
+    "duration_millis",
+)
+# an entry without a time adds nothing to the rollups
+_EMPTY_ENTRY_VALUES = (None, "", "", "", None)
+
+
+def _stats_entry(task_state: TaskState) -> ttm.TaskStatsEntry:
+    start = task_state.unix_millis_start_time
+    finish = task_state.unix_millis_finish_time
+    return ttm.TaskStatsEntry(
+        task_id=task_state.booking.id,
+        unix_millis_time=task_state.booking.unix_millis_request_time or start,
+        status=task_state.status.value if task_state.status else "",
+        category=task_state.category.__root__ if task_state.category else "",
+        assigned_to=task_state.assigned_to.name if task_state.assigned_to else "",
+        duration_millis=finish - start
+        if start is not None and finish is not None
+        else None,
+    )
+
+
+def _entry_values(entry: ttm.TaskStatsEntry) -> Tuple[Any, ...]:
+    return tuple(getattr(entry, f) for f in _ENTRY_FIELDS)
+
+
+async def _increment_rollup(
+    key: Tuple[Any, ...], count: int, finished: int, duration_millis: int
+) -> None:
+    where = dict(zip(_ROLLUP_KEY_FIELDS, key))
+    updates = {
+        "count": F("count") + count,
+        "finished": F("finished") + finished,
+        "total_duration_millis": F("total_duration_millis") + duration_millis,
+    }
+    if await ttm.TaskStatsRollup.filter(**where).update(**updates):
+        return
+    # another writer may create it concurrently, so only insert it if it is missing
+    await upsert(
+        ttm.TaskStatsRollup,
+        {**where, "count": 0, "finished": 0, "total_duration_millis": 0},
+        conflict=_ROLLUP_KEY_FIELDS,
+        update=False,
+    )
+    await ttm.TaskStatsRollup.filter(**where).update(**updates)
+
+
+def _add_to_rollups(
+    increments: Dict[Tuple[Any, ...], List[int]], entry: ttm.TaskStatsEntry, sign: int
+) -> None:
+    if entry.unix_millis_time is None:
+        return
+    for period, millis in PERIOD_MILLIS.items():
+        key = (
+            period,
+            entry.unix_millis_time - entry.unix_millis_time % millis,
+            entry.status,
+            entry.category,
+            entry.assigned_to,
+        )
+        increment = increments.setdefault(key, [0, 0, 0])
+        increment[0] += sign
+        increment[1] += sign if entry.duration_millis is not None else 0
+        increment[2] += sign * (entry.duration_millis or 0)
+
+
+async def update_task_stats(task_state: TaskState) -> None:
+    """
+    Updates the task stats rollups with the latest state of a task. The rollups are only
+    written when a field that they are grouped by, or the duration of the task, changes.
+    Updating with the same state again does nothing.
+
+    The entry of the task is locked for the whole update so that concurrent updates of the
+    same task are applied one after the other.
+    """
+    entry = _stats_entry(task_state)
+    async with in_transaction():
+        # make sure there is a row to lock
+        await upsert(
+            ttm.TaskStatsEntry,
+            {"task_id": entry.task_id, **dict(zip(_ENTRY_FIELDS, _EMPTY_ENTRY_VALUES))},
+            update=False,
+        )
+        previous = await ttm.TaskStatsEntry.select_for_update().get(
+            task_id=entry.task_id
+        )
+        values = _entry_values(entry)
+        if _entry_values(previous) == values:
+            return
+        increments: Dict[Tuple[Any, ...], List[int]] = {}
+        _add_to_rollups(increments, previous, -1)
+        _add_to_rollups(increments, entry, 1)
+        # rows are always locked in the same order to avoid deadlocks between writers
+        for key in sorted(increments):
+            if any(increments[key]):
+                await _increment_rollup(key, *increments[key])
+        await ttm.TaskStatsEntry.filter(task_id=entry.task_id).update(
+            **dict(zip(_ENTRY_FIELDS, values))
+        )
+
+
+async def query_task_stats(
+    period: TaskStatsPeriod, between: Tuple[int, int], group_by: Sequence[str]
+) -> List[TaskStats]:
+    """
+    :param between: The period in unix millis to fetch, buckets which start before the
+        period but overlap with it are included.
+    :param group_by: The fields to group by in addition to the time bucket, a subset of
+        `GROUP_BY_FIELDS`.
+    """
+    millis = PERIOD_MILLIS[period]
+    rows = (
+        await ttm.TaskStatsRollup.filter(
+            period=period,
+            bucket_millis__gte=between[0] - between[0] % millis,
+            bucket_millis__lte=between[1],
+        )
+        .annotate(
+            sum_count=Sum("count"),
+            sum_finished=Sum("finished"),
+            sum_duration_millis=Sum("total_duration_millis"),
+        )
+        .group_by("bucket_millis", *group_by)
+        .order_by("bucket_millis", *group_by)
+        .values(
+            "bucket_millis",
+            *group_by,
+            "sum_count",
+            "sum_finished",
+            "sum_duration_millis",
+        )
+    )
+    return [
+        TaskStats(
+            bucket=r["bucket_millis"],
+            status=r.get("status"),
+            category=r.get("category"),
+            assigned_to=r.get("assigned_to"),
+            count=r["sum_count"],
+            finished=r["sum_finished"],
+            total_duration_millis=r["sum_duration_millis"],
+        )
+        for r in rows
+        # tasks can move out of a group, leaving it empty
+        if r["sum_count"]
+    ]
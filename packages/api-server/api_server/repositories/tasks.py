@@ -1,15 +1,17 @@
+import json
 import sys
 from datetime import datetime
-from typing import Dict, List, Optional, Sequence, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple, Type
 
 from fastapi import Depends, HTTPException
-from tortoise.exceptions import FieldError, IntegrityError
+from tortoise.exceptions import FieldError
+from tortoise.models import Model
 from tortoise.query_utils import Prefetch
 from tortoise.queryset import QuerySet
 from tortoise.transactions import in_transaction
 
+from api_server.app_config import app_config
 from api_server.authenticator import user_dep
-from api_server.logger import format_exception, logger
 from api_server.models import (
     LogEntry,
     Pagination,
@@ -24,8 +26,23 @@ from api_server.models.rmf_api.log_entry import Tier
 from api_server.models.rmf_api.task_state import Category, Id, Phase
 from api_server.models.tortoise_models import TaskRequest as DbTaskRequest
 from api_server.models.tortoise_models import TaskState as DbTaskState
-from api_server.query import add_pagination
+from api_server.query import (
+    KeysetPagination,
+    add_pagination,
+    iter_values_raw,
+    values_list_raw,
+)
 from api_server.rmf_io import task_events
+from api_server.upsert import upsert, upsert_many
+
+from .task_stats import update_task_stats
+
+# indexed fields that task states can be ordered by with cursor pagination
+TASK_STATE_CURSOR_FIELDS = (
+    "unix_millis_request_time",
+    "unix_millis_start_time",
+    "unix_millis_finish_time",
+)
 
 
 class TaskRepository:
@@ -33,9 +50,7 @@ class TaskRepository:
         self.user = user
 
     async def save_task_request(self, task_id: str, task_request: TaskRequest) -> None:
-        await DbTaskRequest.update_or_create(
-            {"request": task_request.json()}, id_=task_id
-        )
+        await upsert(DbTaskRequest, {"id_": task_id, "request": task_request.json()})
 
     async def get_task_request(self, task_id: str) -> Optional[TaskRequest]:
         result = await DbTaskRequest.get_or_none(id_=task_id)
@@ -43,31 +58,46 @@ class TaskRepository:
             return None
         return TaskRequest(**result.request)
 
-    async def save_task_state(self, task_state: TaskState) -> None:
-        await DbTaskState.update_or_create(
-            {
-                "data": task_state.json(),
-                "category": task_state.category.__root__
-                if task_state.category
-                else None,
-                "assigned_to": task_state.assigned_to.name
-                if task_state.assigned_to
-                else None,
-                "unix_millis_start_time": task_state.unix_millis_start_time
-                and datetime.fromtimestamp(task_state.unix_millis_start_time / 1000),
-                "unix_millis_finish_time": task_state.unix_millis_finish_time
-                and datetime.fromtimestamp(task_state.unix_millis_finish_time / 1000),
-                "status": task_state.status if task_state.status else None,
-                "unix_millis_request_time": task_state.booking.unix_millis_request_time
-                and datetime.fromtimestamp(
-                    task_state.booking.unix_millis_request_time / 1000
-                ),
-                "requester": task_state.booking.requester
-                if task_state.booking.requester
-                else None,
-            },
-            id_=task_state.booking.id,
-        )
+    async def save_task_state(
+        self, task_state: TaskState, data_json: Optional[str] = None
+    ) -> None:
+        """
+        :param data_json: The json of `task_state`, if it is already available, it is
+            stored as is instead of serializing `task_state` again.
+        """
+        # the stats are updated in the same transaction, so they always count the state
+        # that is stored
+        async with in_transaction():
+            await upsert(
+                DbTaskState,
+                {
+                    "id_": task_state.booking.id,
+                    "data": data_json if data_json is not None else task_state.json(),
+                    "category": task_state.category.__root__
+                    if task_state.category
+                    else None,
+                    "assigned_to": task_state.assigned_to.name
+                    if task_state.assigned_to
+                    else None,
+                    "unix_millis_start_time": task_state.unix_millis_start_time
+                    and datetime.fromtimestamp(
+                        task_state.unix_millis_start_time / 1000
+                    ),
+                    "unix_millis_finish_time": task_state.unix_millis_finish_time
+                    and datetime.fromtimestamp(
+                        task_state.unix_millis_finish_time / 1000
+                    ),
+                    "status": task_state.status if task_state.status else None,
+                    "unix_millis_request_time": task_state.booking.unix_millis_request_time
+                    and datetime.fromtimestamp(
+                        task_state.booking.unix_millis_request_time / 1000
+                    ),
+                    "requester": task_state.booking.requester
+                    if task_state.booking.requester
+                    else None,
+                },
+            )
+            await update_task_stats(task_state)
 
     async def query_task_states(
         self, query: QuerySet[DbTaskState], pagination: Optional[Pagination] = None
@@ -81,6 +111,39 @@ class TaskRepository:
         except FieldError as e:
             raise HTTPException(422, str(e)) from e
 
+    async def query_task_states_raw(
+        self, query: QuerySet[DbTaskState], pagination: Optional[Pagination] = None
+    ) -> Tuple[List[str], Optional[str]]:
+        """
+        Like `query_task_states`, but returns the stored json of the task states without
+        parsing them.
+
+        :return: The task states and, when `pagination` has a cursor, the cursor of the
+            next page.
+        """
+        try:
+            if pagination and pagination.cursor is not None:
+                keyset = KeysetPagination(
+                    DbTaskState,
+                    pagination,
+                    TASK_STATE_CURSOR_FIELDS,
+                    tiebreaker="id_",
+                )
+                # TODO: enforce with authz
+                results = await values_list_raw(
+                    keyset.apply(query), "data", *keyset.fields
+                )
+                return [r[0] for r in results], keyset.next_cursor(
+                    [r[1:] for r in results]
+                )
+            if pagination:
+                query = add_pagination(query, pagination)
+            # TODO: enforce with authz
+            results = await values_list_raw(query, "data")
+            return [r[0] for r in results], None
+        except FieldError as e:
+            raise HTTPException(422, str(e)) from e
+
     async def get_task_state(self, task_id: str) -> Optional[TaskState]:
         # TODO: enforce with authz
         result = await DbTaskState.get_or_none(id_=task_id)
@@ -88,12 +151,66 @@ class TaskRepository:
             return None
         return TaskState(**result.data)
 
+    async def get_task_state_raw(self, task_id: str) -> Optional[str]:
+        """
+        Like `get_task_state`, but returns the stored json of the task state without
+        parsing it.
+        """
+        # TODO: enforce with authz
+        results = await values_list_raw(DbTaskState.filter(id_=task_id), "data")
+        if not results:
+            return None
+        return results[0][0]
+
+    async def export_task_states(
+        self, query: QuerySet[DbTaskState]
+    ) -> AsyncIterator[str]:
+        """
+        Yields the stored json of every task state matched by `query`, the task states are
+        read in chunks instead of all at once.
+        """
+        # TODO: enforce with authz
+        async for (data,) in iter_values_raw(query, "data", pk="id_"):
+            yield data
+
+    async def export_task_logs(self, between: Tuple[int, int]) -> AsyncIterator[str]:
+        """
+        Yields every log entry of every task in a period as json. With the nested log
+        storage, the entries of the tasks, phases and events are yielded one after
+        another, they are not sorted by time.
+
+        :param between: The period in unix millis to fetch.
+        """
+        between_filters = {
+            "unix_millis_time__gte": between[0],
+            "unix_millis_time__lte": between[1],
+        }
+        if app_config.denormalized_task_logs:
+            entries = iter_task_log_entries(between_filters)
+        else:
+            entries = iter_nested_task_log_entries(between_filters)
+        # TODO: enforce with authz
+        async for task_id, phase, event, seq, unix_millis_time, tier, text in entries:
+            yield json.dumps(
+                {
+                    "task_id": task_id,
+                    "phase": phase,
+                    "event": event,
+                    "seq": seq,
+                    "unix_millis_time": unix_millis_time,
+                    "tier": tier,
+                    "text": text,
+                }
+            )
+
     async def get_task_log(
         self, task_id: str, between: Tuple[int, int]
     ) -> Optional[TaskEventLog]:
         """
         :param between: The period in unix millis to fetch.
         """
+        if app_config.denormalized_task_logs:
+            return await self._get_denormalized_task_log(task_id, between)
         between_filters = {
             "unix_millis_time__gte": between[0],
             "unix_millis_time__lte": between[1],
@@ -128,51 +245,234 @@ class TaskRepository:
             phases=phases,
         )
 
+    @staticmethod
+    async def _get_denormalized_task_log(
+        task_id: str, between: Tuple[int, int]
+    ) -> Optional[TaskEventLog]:
+        markers = (
+            await ttm.TaskLogEntry.filter(
+                task_id=task_id, unix_millis_time=TASK_LOG_MARKER_MILLIS
+            )
+            .order_by("id")
+            .values_list("phase", "event")
+        )
+        rows = (
+            await ttm.TaskLogEntry.filter(
+                task_id=task_id,
+                unix_millis_time__gte=max(between[0], TASK_LOG_MARKER_MILLIS + 1),
+                unix_millis_time__lte=between[1],
+            )
+            .order_by("unix_millis_time", "seq")
+            .values_list("phase", "event", "seq", "unix_millis_time", "tier", "text")
+        )
+        if (
+            not markers
+            and not rows
+            and not await ttm.TaskEventLog.exists(task_id=task_id)
+        ):
+            return None
+        log = []
+        phases: Dict[str, Phases] = {}
+        # phases and events are in the order they were first saved, like the nested logs
+        for phase_id, event_id in markers:
+            phase = phases.get(phase_id)
+            if phase is None:
+                phase = phases[phase_id] = Phases.construct(log=[], events={})
+            if event_id:
+                phase.events.setdefault(event_id, [])  # type: ignore
+        for phase_id, event_id, seq, unix_millis_time, tier, text in rows:
+            entry = LogEntry.construct(
+                seq=seq, tier=tier, unix_millis_time=unix_millis_time, text=text
+            )
+            if not phase_id:
+                log.append(entry)
+                continue
+            phase = phases.get(phase_id)
+            if phase is None:
+                phase = phases[phase_id] = Phases.construct(log=[], events={})
+            if event_id:
+                phase.events.setdefault(event_id, []).append(entry)  # type: ignore
+            else:
+                phase.log.append(entry)  # type: ignore
+        return TaskEventLog.construct(task_id=task_id, log=log, phases=phases)
+
+    @staticmethod
+    async def _save_denormalized_task_log(task_log: TaskEventLog):
+        def rows(phase_id: str, event_id: str, logs: Sequence[LogEntry]):
+            return (
+                ttm.TaskLogEntry(
+                    task_id=task_log.task_id,
+                    phase=phase_id,
+                    event=event_id,
+                    seq=log.seq,
+                    unix_millis_time=log.unix_millis_time,
+                    tier=log.tier.name,
+                    text=log.text,
+                )
+                for log in logs
+            )
+
+        # the markers are inserted first so that new phases and events are after the
+        # saved ones when the markers are read in insertion order
+        markers = []
+        entries = list(rows("", "", task_log.log or []))
+        for phase_id, phase in (task_log.phases or {}).items():
+            markers.append(task_log_marker(task_log.task_id, phase_id))
+            entries.extend(rows(phase_id, "", phase.log or []))
+            for event_id, logs in (phase.events or {}).items():
+                markers.append(task_log_marker(task_log.task_id, phase_id, event_id))
+                entries.extend(rows(phase_id, event_id, logs))
+        await insert_task_log_entries(markers + entries)
+
+    @staticmethod
+    def _new_log_rows(
+        parent_field: str,
+        parent_id: Any,
+        logs: Sequence[LogEntry],
+        seen: Set[Tuple[Any, int]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Builds the values of the log rows for `logs`, skipping every `(parent, seq)` in
+        `seen`. `seen` is updated in place so duplicates within the same batch are also
+        skipped.
+        """
+        rows = []
+        for log in logs:
+            key = (parent_id, log.seq)
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append(
+                {
+                    f"{parent_field}_id": parent_id,
+                    "seq": log.seq,
+                    "unix_millis_time": log.unix_millis_time,
+                    "tier": log.tier.name,
+                    "text": log.text,
+                }
+            )
+        return rows
+
+    @staticmethod
+    async def _insert_log_rows(model: Type[Model], rows: List[Dict[str, Any]]):
+        # saved (parent, seq) pairs are skipped before inserting, rows inserted
+        # concurrently by another writer are skipped by the database
+        await upsert_many(model, rows, conflict=(), update=False)
+
+    @staticmethod
+    async def _existing_log_keys(
+        model: Type[Model], parent_field: str, parent_ids: List[Any], seqs: List[int]
+    ) -> Set[Tuple[Any, int]]:
+        if not parent_ids or not seqs:
+            return set()
+        return set(
+            await model.filter(
+                **{f"{parent_field}_id__in": parent_ids, "seq__in": seqs}
+            ).values_list(f"{parent_field}_id", "seq")
+        )
+
     async def _saveEventLogs(
         self,
-        db_phase: ttm.TaskEventLogPhases,
-        events: Dict[str, List[LogEntry]],
+        db_phases: Dict[str, ttm.TaskEventLogPhases],
+        phases: Dict[str, Phases],
     ):
-        for event_id, logs in events.items():
-            db_event = (
-                await ttm.TaskEventLogPhasesEvents.get_or_create(
-                    phase=db_phase, event=event_id
-                )
-            )[0]
-            for log in logs:
-                await ttm.TaskEventLogPhasesEventsLog.create(
-                    event=db_event, **log.dict()
+        wanted = [
+            (db_phases[phase_id].id, event_id)
+            for phase_id, phase in phases.items()
+            if phase.events
+            for event_id in phase.events
+        ]
+        if not wanted:
+            return
+        phase_ids = list({phase_id for phase_id, _ in wanted})
+
+        async def fetch_events(event_ids: List[str]):
+            return {
+                (e.phase_id, e.event): e  # type: ignore
+                for e in await ttm.TaskEventLogPhasesEvents.filter(
+                    phase_id__in=phase_ids, event__in=event_ids
                 )
+            }
+
+        event_ids = list({event_id for _, event_id in wanted})
+        db_events = await fetch_events(event_ids)
+        missing = [k for k in dict.fromkeys(wanted) if k not in db_events]
+        if missing:
+            await ttm.TaskEventLogPhasesEvents.bulk_create(
+                [
+                    ttm.TaskEventLogPhasesEvents(phase_id=phase_id, event=event_id)
+                    for phase_id, event_id in missing
+                ]
+            )
+            db_events.update(
+                await fetch_events(list({event_id for _, event_id in missing}))
+            )
+
+        batches = [
+            (db_events[(db_phases[phase_id].id, event_id)].id, logs)
+            for phase_id, phase in phases.items()
+            if phase.events
+            for event_id, logs in phase.events.items()
+        ]
+        seen = await self._existing_log_keys(
+            ttm.TaskEventLogPhasesEventsLog,
+            "event",
+            [event_id for event_id, _ in batches],
+            [log.seq for _, logs in batches for log in logs],
+        )
+        rows = []
+        for event_id, logs in batches:
+            rows.extend(self._new_log_rows("event", event_id, logs, seen))
+        await self._insert_log_rows(ttm.TaskEventLogPhasesEventsLog, rows)
 
     async def _savePhaseLogs(
         self, db_task_log: ttm.TaskEventLog, phases: Dict[str, Phases]
     ):
-        for phase_id, phase in phases.items():
-            db_phase = (
-                await ttm.TaskEventLogPhases.get_or_create(
-                    task=db_task_log, phase=phase_id
+        async def fetch_phases(phase_ids: List[str]):
+            return {
+                p.phase: p
+                for p in await ttm.TaskEventLogPhases.filter(
+                    task=db_task_log, phase__in=phase_ids
                 )
-            )[0]
-            if phase.log:
-                for log in phase.log:
-                    await ttm.TaskEventLogPhasesLog.create(
-                        phase=db_phase,
-                        **log.dict(),
-                    )
-            if phase.events:
-                await self._saveEventLogs(db_phase, phase.events)
+            }
+
+        db_phases = await fetch_phases(list(phases))
+        missing = [phase_id for phase_id in phases if phase_id not in db_phases]
+        if missing:
+            await ttm.TaskEventLogPhases.bulk_create(
+                [
+                    ttm.TaskEventLogPhases(task=db_task_log, phase=phase_id)
+                    for phase_id in missing
+                ]
+            )
+            db_phases.update(await fetch_phases(missing))
+
+        batches = [
+            (db_phases[phase_id].id, phase.log)
+            for phase_id, phase in phases.items()
+            if phase.log
+        ]
+        seen = await self._existing_log_keys(
+            ttm.TaskEventLogPhasesLog,
+            "phase",
+            [phase_id for phase_id, _ in batches],
+            [log.seq for _, logs in batches for log in logs],
+        )
+        rows = []
+        for phase_id, logs in batches:
+            rows.extend(self._new_log_rows("phase", phase_id, logs, seen))
+        await self._insert_log_rows(ttm.TaskEventLogPhasesLog, rows)
+
+        await self._saveEventLogs(db_phases, phases)
 
     async def _saveTaskLogs(
         self, db_task_log: ttm.TaskEventLog, logs: Sequence[LogEntry]
     ):
-        for log in logs:
-            await ttm.TaskEventLogLog.create(
-                task=db_task_log,
-                seq=log.seq,
-                unix_millis_time=log.unix_millis_time,
-                tier=log.tier.name,
-                text=log.text,
-            )
+        seen = await self._existing_log_keys(
+            ttm.TaskEventLogLog, "task", [db_task_log.pk], [log.seq for log in logs]
+        )
+        rows = self._new_log_rows("task", db_task_log.pk, logs, seen)
+        await self._insert_log_rows(ttm.TaskEventLogLog, rows)
 
     async def save_log_acknowledged_task_completion(
         self, task_id: str, acknowledged_by: str, unix_millis_acknowledged_time: int
@@ -230,13 +530,132 @@ class TaskRepository:
             db_task_log = (
                 await ttm.TaskEventLog.get_or_create(task_id=task_log.task_id)
             )[0]
-            try:
-                if task_log.log:
-                    await self._saveTaskLogs(db_task_log, task_log.log)
-                if task_log.phases:
-                    await self._savePhaseLogs(db_task_log, task_log.phases)
-            except IntegrityError as e:
-                logger.error(format_exception(e))
+            if app_config.denormalized_task_logs:
+                await self._save_denormalized_task_log(task_log)
+                return
+            if task_log.log:
+                await self._saveTaskLogs(db_task_log, task_log.log)
+            if task_log.phases:
+                await self._savePhaseLogs(db_task_log, task_log.phases)
+
+
+# Phases and events are saved in the denormalized task log table as marker rows with this
+# time and seq, so that the ones without entries are kept, along with their order.
+TASK_LOG_MARKER_MILLIS = -1
+TASK_LOG_MARKER_SEQ = -1
+
+
+def task_log_marker(task_id: str, phase: str, event: str = "") -> ttm.TaskLogEntry:
+    return ttm.TaskLogEntry(
+        task_id=task_id,
+        phase=phase,
+        event=event,
+        seq=TASK_LOG_MARKER_SEQ,
+        unix_millis_time=TASK_LOG_MARKER_MILLIS,
+        tier=Tier.uninitialized.name,
+        text="",
+    )
+
+
+async def insert_task_log_entries(entries: Sequence[ttm.TaskLogEntry]) -> None:
+    """
+    Inserts the entries of the denormalized task log table which are not saved yet,
+    `(task_id, phase, event, seq)` is unique.
+    """
+    if not entries:
+        return
+    seen = set(
+        await ttm.TaskLogEntry.filter(
+            task_id__in=list({e.task_id for e in entries}),
+            seq__in=list({e.seq for e in entries}),
+        ).values_list("task_id", "phase", "event", "seq")
+    )
+    rows = []
+    for entry in entries:
+        key = (entry.task_id, entry.phase, entry.event, entry.seq)
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append(
+            {
+                "task_id": entry.task_id,
+                "phase": entry.phase,
+                "event": entry.event,
+                "seq": entry.seq,
+                "unix_millis_time": entry.unix_millis_time,
+                "tier": entry.tier,
+                "text": entry.text,
+            }
+        )
+    # ignore rows inserted concurrently by another writer
+    await upsert_many(ttm.TaskLogEntry, rows, conflict=(), update=False)
+
+
+TaskLogEntryRow = Tuple[str, Optional[str], Optional[str], int, int, str, str]
+
+
+async def iter_task_log_entries(
+    filters: Dict[str, Any]
+) -> AsyncIterator[TaskLogEntryRow]:
+    """
+    Iterates the entries of the denormalized task log table matching `filters` as
+    `(task_id, phase, event, seq, unix_millis_time, tier, text)`, without the markers of
+    phases and events.
+    """
+    async for task_id, phase, event, *log in iter_values_raw(
+        ttm.TaskLogEntry.filter(**filters),
+        "task_id",
+        "phase",
+        "event",
+        "seq",
+        "unix_millis_time",
+        "tier",
+        "text",
+    ):
+        if log[1] == TASK_LOG_MARKER_MILLIS:
+            continue
+        yield (task_id, phase or None, event or None, *log)  # type: ignore
+
+
+async def iter_nested_task_log_entries(
+    filters: Dict[str, Any]
+) -> AsyncIterator[TaskLogEntryRow]:
+    """
+    Iterates the entries of the nested task log tables matching `filters` as
+    `(task_id, phase, event, seq, unix_millis_time, tier, text)`. The entries of the
+    tasks, phases and events are iterated one after another.
+    """
+    log_fields = ("seq", "unix_millis_time", "tier", "text")
+    sources: Sequence[Tuple[Type[Model], Tuple[str, ...]]] = (
+        (ttm.TaskEventLogLog, ("task_id",)),
+        (ttm.TaskEventLogPhasesLog, ("phase__task_id", "phase__phase")),
+        (
+            ttm.TaskEventLogPhasesEventsLog,
+            ("event__phase__task_id", "event__phase__phase", "event__event"),
+        ),
+    )
+    for model, owner_fields in sources:
+        padding = (None,) * (3 - len(owner_fields))
+        async for row in iter_values_raw(
+            model.filter(**filters), *owner_fields, *log_fields
+        ):
+            yield row[: len(owner_fields)] + padding + row[len(owner_fields) :]  # type: ignore
+
+
+async def iter_nested_task_log_markers() -> AsyncIterator[Tuple[str, str, str]]:
+    """
+    Iterates the phases and then the events of the nested task log tables as
+    `(task_id, phase, event)`, each in the order they were saved. `event` is empty for
+    phases.
+    """
+    async for task_id, phase in iter_values_raw(
+        ttm.TaskEventLogPhases.all(), "task_id", "phase"
+    ):
+        yield task_id, phase, ""
+    async for task_id, phase, event in iter_values_raw(
+        ttm.TaskEventLogPhasesEvents.all(), "phase__task_id", "phase__phase", "event"
+    ):
+        yield task_id, phase, event
 
 
 def task_repo_dep(user: User = Depends(user_dep)):
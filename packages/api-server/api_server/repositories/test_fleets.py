@@ -0,0 +1,133 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from api_server.models import tortoise_models as ttm
+from api_server.test import AppFixture, make_fleet_state
+
+from .fleets import FleetRepository, FleetStateWriteBehind, fleet_state_write_behind
+
+
+class TestFleetStateWriteBehind(AppFixture):
+    def test_coalesce_and_flush_on_stop(self):
+        fleet_state = make_fleet_state()
+        latest = fleet_state.copy(update={"robots": None})
+        # long interval so nothing is written until the buffer is stopped
+        write_behind = FleetStateWriteBehind(3600)
+
+        async def run():
+            await write_behind.start()
+            await write_behind.put(fleet_state)
+            await write_behind.put(latest)
+            self.assertIsNone(await ttm.FleetState.get_or_none(name=fleet_state.name))
+            self.assertIs(latest, write_behind.get_pending(fleet_state.name))
+
+            await write_behind.stop()
+            self.assertIsNone(write_behind.get_pending(fleet_state.name))
+            db_state = await ttm.FleetState.get(name=fleet_state.name)
+            self.assertIsNone(db_state.data["robots"])
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+
+    def test_cancelled_flush_keeps_pending(self):
+        fleet_state = make_fleet_state()
+        write_behind = FleetStateWriteBehind(3600)
+
+        async def hang(_items):
+            await asyncio.Event().wait()
+
+        async def run():
+            await write_behind.start()
+            await write_behind.put(fleet_state)
+            with patch.object(write_behind, "_write", hang):
+                flush = asyncio.create_task(write_behind.flush())
+                await asyncio.sleep(0)
+                flush.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await flush
+            self.assertIs(fleet_state, write_behind.get_pending(fleet_state.name))
+
+            await write_behind.stop()
+            self.assertIsNotNone(
+                await ttm.FleetState.get_or_none(name=fleet_state.name)
+            )
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+
+    def test_read_states_being_written(self):
+        fleet_state = make_fleet_state()
+        write_behind = FleetStateWriteBehind(3600)
+        writing = asyncio.Event()
+        resume = asyncio.Event()
+        write = write_behind._write  # pylint: disable=protected-access
+
+        async def slow_write(items):
+            writing.set()
+            await resume.wait()
+            await write(items)
+
+        async def run():
+            await write_behind.start()
+            await write_behind.put(fleet_state)
+            with patch.object(write_behind, "_write", slow_write):
+                flush = asyncio.create_task(write_behind.flush())
+                await writing.wait()
+                self.assertIs(fleet_state, write_behind.get_pending(fleet_state.name))
+                self.assertIn(fleet_state.name, write_behind.all_pending_json())
+                resume.set()
+                await flush
+            self.assertIsNone(write_behind.get_pending(fleet_state.name))
+            self.assertIsNotNone(
+                await ttm.FleetState.get_or_none(name=fleet_state.name)
+            )
+            await write_behind.stop()
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+
+    def test_write_through_when_disabled(self):
+        fleet_state = make_fleet_state()
+        write_behind = FleetStateWriteBehind(0)
+
+        async def run():
+            await write_behind.start()
+            await write_behind.put(fleet_state)
+            self.assertIsNone(write_behind.get_pending(fleet_state.name))
+            self.assertIsNotNone(
+                await ttm.FleetState.get_or_none(name=fleet_state.name)
+            )
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+
+
+class TestFleetRepository(AppFixture):
+    def test_get_all_fleets_raw(self):
+        stored = make_fleet_state()
+        pending = make_fleet_state()
+        repo = FleetRepository(self.admin_user)
+
+        async def run():
+            await repo.save_fleet_state(stored)
+            # pretend the write behind buffer is started so the state stays pending
+            # pylint: disable=protected-access
+            fleet_state_write_behind._pending[pending.name] = (pending, None)
+            try:
+                raw = await repo.get_all_fleets_raw()
+                self.assertIn(pending.json(), raw)
+                self.assertIn(stored.name, [json.loads(x)["name"] for x in raw])
+                self.assertEqual(
+                    pending.json(), await repo.get_fleet_state_raw(pending.name)
+                )
+                self.assertEqual(
+                    json.loads(stored.json()),
+                    json.loads(await repo.get_fleet_state_raw(stored.name) or ""),
+                )
+                self.assertIsNone(await repo.get_fleet_state_raw("not_exist"))
+            finally:
+                fleet_state_write_behind._pending.pop(pending.name, None)
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
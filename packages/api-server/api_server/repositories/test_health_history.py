@@ -0,0 +1,122 @@
+from typing import List, Tuple
+from unittest.mock import patch
+
+from api_server.models import HealthStatus
+from api_server.models import tortoise_models as ttm
+from api_server.test import AppFixture
+
+from .health_history import query_health_availability
+
+HEALTHY = HealthStatus.HEALTHY.value
+UNHEALTHY = HealthStatus.UNHEALTHY.value
+DEAD = HealthStatus.DEAD.value
+
+
+async def save_transitions(device_id: str, transitions: List[Tuple[int, str]]):
+    await ttm.HealthTransition.bulk_create(
+        [
+            ttm.HealthTransition(
+                device_type="lift",
+                device_id=device_id,
+                health_status=status,
+                unix_millis_start=start,
+            )
+            for start, status in transitions
+        ]
+    )
+
+
+class TestHealthHistory(AppFixture):
+    def test_query_health_availability(self):
+        device_id = "test_query_health_availability"
+        self.client.portal.call(
+            save_transitions,
+            device_id,
+            [
+                (0, HEALTHY),
+                (1000, UNHEALTHY),
+                (1500, DEAD),
+                (2000, HEALTHY),
+                (4000, DEAD),
+            ],
+        )
+
+        result = self.client.portal.call(
+            query_health_availability, "lift", (500, 5000), device_id
+        )
+        self.assertEqual(1, len(result))
+        self.assertEqual(device_id, result[0].id_)
+        self.assertEqual(2500, result[0].uptime_millis)
+        self.assertEqual(2000, result[0].downtime_millis)
+        self.assertAlmostEqual(2500 / 4500, result[0].availability)
+        # unhealthy to dead is not another failure
+        self.assertEqual(2, result[0].failures)
+        self.assertEqual(1250, result[0].mtbf_millis)
+
+        # the status at the start of the period is the last one before it
+        result = self.client.portal.call(
+            query_health_availability, "lift", (2500, 3000), device_id
+        )
+        self.assertEqual(500, result[0].uptime_millis)
+        self.assertEqual(0, result[0].downtime_millis)
+        self.assertEqual(1, result[0].availability)
+        self.assertEqual(0, result[0].failures)
+        self.assertIsNone(result[0].mtbf_millis)
+
+        # nothing is known before the first transition
+        result = self.client.portal.call(
+            query_health_availability, "lift", (-1000, 0), device_id
+        )
+        self.assertEqual([], result)
+
+    def test_query_all_devices(self):
+        prefix = "test_query_all_devices"
+
+        async def run():
+            await save_transitions(f"{prefix}_1", [(10000, HEALTHY), (10500, DEAD)])
+            # only transitions before the period, it is dead for all of it
+            await save_transitions(f"{prefix}_2", [(9000, HEALTHY), (9500, DEAD)])
+            # only transitions after the period
+            await save_transitions(f"{prefix}_3", [(20000, HEALTHY)])
+            return await query_health_availability("lift", (10000, 11000))
+
+        result = {
+            x.id_: (x.uptime_millis, x.downtime_millis)
+            for x in self.client.portal.call(run)
+            if x.id_.startswith(prefix)
+        }
+        self.assertEqual({f"{prefix}_1": (500, 500), f"{prefix}_2": (0, 1000)}, result)
+
+    def test_query_without_sql(self):
+        prefix = "test_query_without_sql"
+
+        async def run():
+            await save_transitions(
+                f"{prefix}_1",
+                [(0, HEALTHY), (1000, UNHEALTHY), (1500, DEAD), (2000, HEALTHY)],
+            )
+            await save_transitions(f"{prefix}_2", [(500, HEALTHY), (500, DEAD)])
+            await save_transitions(f"{prefix}_3", [(3000, DEAD)])
+            results = []
+            for between in [(500, 5000), (2500, 3000), (-1000, 0), (1000, 1000)]:
+                sql = await query_health_availability("lift", between)
+                with patch("api_server.repositories.health_history._SQL_DIALECTS", ()):
+                    orm = await query_health_availability("lift", between)
+                    by_device = await query_health_availability(
+                        "lift", between, f"{prefix}_1"
+                    )
+                results.append(
+                    (
+                        [x for x in sql if x.id_.startswith(prefix)],
+                        [x for x in orm if x.id_.startswith(prefix)],
+                        [x for x in sql if x.id_ == f"{prefix}_1"],
+                        by_device,
+                    )
+                )
+            return results
+
+        results = self.client.portal.call(run)
+        self.assertEqual(3, len(results[0][0]))
+        for sql, orm, sql_by_device, orm_by_device in results:
+            self.assertEqual(sql, orm)
+            self.assertEqual(sql_by_device, orm_by_device)
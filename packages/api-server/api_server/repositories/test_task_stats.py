@@ -0,0 +1,142 @@
+import asyncio
+from unittest.mock import patch
+
+from api_server import models as mdl
+from api_server.backfill_task_stats import backfill_task_stats
+from api_server.models import tortoise_models as ttm
+from api_server.models.rmf_api.task_state import AssignedTo, Category
+from api_server.test import AppFixture, make_task_state
+
+from .tasks import TaskRepository
+
+HOUR = 60 * 60 * 1000
+# far from the task states saved by other tests
+BASE_TIME = 1000 * 24 * HOUR
+
+
+def make_stats_task_state(task_id: str, request_offset: int) -> mdl.TaskState:
+    task_state = make_task_state(task_id)
+    task_state.booking.unix_millis_request_time = BASE_TIME + request_offset
+    task_state.category = Category(__root__="test_task_stats")
+    task_state.status = mdl.Status.queued
+    task_state.assigned_to = None
+    task_state.unix_millis_start_time = None
+    task_state.unix_millis_finish_time = None
+    return task_state
+
+
+class TestTaskStats(AppFixture):
+    def test_task_stats(self):
+        repo = TaskRepository(self.admin_user)
+        task1 = make_stats_task_state("test_task_stats_1", 0)
+        task2 = make_stats_task_state("test_task_stats_2", 10)
+        task3 = make_stats_task_state("test_task_stats_3", HOUR)
+        for task_state in (task1, task2, task3):
+            self.client.portal.call(repo.save_task_state, task_state)
+        # saving the same state again is not counted twice
+        self.client.portal.call(repo.save_task_state, task1)
+
+        # task 1 completes
+        task1.status = mdl.Status.completed
+        task1.assigned_to = AssignedTo(group="fleet", name="robot")
+        task1.unix_millis_start_time = BASE_TIME + 100
+        task1.unix_millis_finish_time = BASE_TIME + 1100
+        self.client.portal.call(repo.save_task_state, task1)
+
+        between = f"{BASE_TIME},{BASE_TIME + 2 * HOUR - 1}"
+        resp = self.client.get(f"/tasks/stats?between={between}&group_by=status")
+        self.assertEqual(200, resp.status_code, resp.json())
+        stats = [
+            (x["bucket"], x["status"], x["count"], x["finished"]) for x in resp.json()
+        ]
+        self.assertEqual(
+            [
+                (BASE_TIME, "completed", 1, 1),
+                (BASE_TIME, "queued", 1, 0),
+                (BASE_TIME + HOUR, "queued", 1, 0),
+            ],
+            stats,
+        )
+
+        resp = self.client.get(
+            f"/tasks/stats?period=day&between={between}&group_by=assigned_to,category"
+        )
+        self.assertEqual(200, resp.status_code, resp.json())
+        self.assertEqual(
+            [
+                {
+                    "bucket": BASE_TIME,
+                    "status": None,
+                    "category": "test_task_stats",
+                    "assigned_to": "",
+                    "count": 2,
+                    "finished": 0,
+                    "total_duration_millis": 0,
+                },
+                {
+                    "bucket": BASE_TIME,
+                    "status": None,
+                    "category": "test_task_stats",
+                    "assigned_to": "robot",
+                    "count": 1,
+                    "finished": 1,
+                    "total_duration_millis": 1000,
+                },
+            ],
+            resp.json(),
+        )
+
+        resp = self.client.get(f"/tasks/stats?between={between}&group_by=not_a_field")
+        self.assertEqual(422, resp.status_code)
+
+    def test_concurrent_updates(self):
+        repo = TaskRepository(self.admin_user)
+        task_state = make_stats_task_state("test_concurrent_updates", 72 * HOUR)
+        completed = task_state.copy(update={"status": mdl.Status.completed})
+
+        async def run():
+            await asyncio.gather(
+                *(repo.save_task_state(x) for x in [task_state, completed] * 5)
+            )
+
+        self.client.portal.call(run)
+        between = f"{BASE_TIME + 72 * HOUR},{BASE_TIME + 73 * HOUR - 1}"
+        resp = self.client.get(f"/tasks/stats?between={between}")
+        self.assertEqual(200, resp.status_code, resp.json())
+        self.assertEqual([1], [x["count"] for x in resp.json()])
+
+    def test_without_on_conflict(self):
+        repo = TaskRepository(self.admin_user)
+        task_state = make_stats_task_state("test_without_on_conflict", 96 * HOUR)
+        completed = task_state.copy(update={"status": mdl.Status.completed})
+
+        async def run():
+            with patch("api_server.upsert._ON_CONFLICT_DIALECTS", ()):
+                for x in [task_state, completed, completed]:
+                    await repo.save_task_state(x)
+
+        self.client.portal.call(run)
+        between = f"{BASE_TIME + 96 * HOUR},{BASE_TIME + 97 * HOUR - 1}"
+        resp = self.client.get(f"/tasks/stats?between={between}&group_by=status")
+        self.assertEqual(200, resp.status_code, resp.json())
+        self.assertEqual(
+            [("completed", 1)], [(x["status"], x["count"]) for x in resp.json()]
+        )
+
+    def test_backfill_task_stats(self):
+        task_state = make_stats_task_state("test_backfill_task_stats", 48 * HOUR)
+
+        async def run():
+            # saved without updating the stats, like a task state saved before the
+            # rollups existed
+            await ttm.TaskState.create(
+                id_=task_state.booking.id, data=task_state.json()
+            )
+            await backfill_task_stats()
+            await backfill_task_stats()
+
+        self.client.portal.call(run)
+        between = f"{BASE_TIME + 48 * HOUR},{BASE_TIME + 49 * HOUR - 1}"
+        resp = self.client.get(f"/tasks/stats?between={between}")
+        self.assertEqual(200, resp.status_code, resp.json())
+        self.assertEqual([1], [x["count"] for x in resp.json()])
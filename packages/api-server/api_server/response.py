@@ -1,5 +1,61 @@
-from fastapi.responses import PlainTextResponse
+import zlib
+from typing import AsyncIterable, AsyncIterator, Iterable
+
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 
 class RawJSONResponse(PlainTextResponse):
     media_type = "application/json"
+
+
+def json_array(items: Iterable[str]) -> str:
+    """
+    Joins json documents into a json array.
+    """
+    return f"[{','.join(items)}]"
+
+
+class NDJSONResponse(StreamingResponse):
+    """
+    Streams json documents, one per line. Lines are sent in chunks of about `chunk_size`
+    bytes as they are produced so the whole response is never kept in memory.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def __init__(
+        self, lines: AsyncIterable[str], gzip: bool = False, chunk_size: int = 65536
+    ):
+        """
+        :param lines: The json documents, without the trailing newline.
+        :param gzip: Compress the response with `Content-Encoding: gzip`.
+        """
+        super().__init__(
+            self._chunks(lines, gzip, chunk_size),
+            headers={"Content-Encoding": "gzip"} if gzip else None,
+        )
+
+    @staticmethod
+    async def _chunks(
+        lines: AsyncIterable[str], gzip: bool, chunk_size: int
+    ) -> AsyncIterator[bytes]:
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if gzip else None
+        buffer = []
+        size = 0
+        async for line in lines:
+            data = f"{line}\n".encode()
+            buffer.append(data)
+            size += len(data)
+            if size >= chunk_size:
+                chunk = b"".join(buffer)
+                buffer.clear()
+                size = 0
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+        chunk = b"".join(buffer)
+        if compressor is not None:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        if chunk:
+            yield chunk
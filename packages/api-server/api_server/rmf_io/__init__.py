@@ -1,4 +1,13 @@
-from .book_keeper import RmfBookKeeper, RmfBookKeeperEvents
+from .book_keeper import (
+    BoundedWriteQueue,
+    CoalescingStateWriter,
+    HealthHistoryWriter,
+    OverflowPolicy,
+    RmfBookKeeper,
+    RmfBookKeeperEvents,
+    StateWriteStats,
+    rmf_bookkeeper,
+)
 from .events import (
     RmfEvents,
     TaskEvents,
@@ -9,5 +18,9 @@ from .events import (
     task_events,
 )
 from .health_watchdog import HealthWatchdog
+from .ingress_filter import IngressFilter, IngressFilterStats
+from .latest_states import CachedBuildingMap, LatestStates, latest_states
+from .liveness import LivenessMonitor
+from .loop_bridge import LoopBridge, LoopBridgeStats
 from .rmf_service import RmfService, tasks_service
 from .topics import topics
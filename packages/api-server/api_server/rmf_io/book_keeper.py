@@ -1,12 +1,35 @@
 import asyncio
 import json
 import logging
-from collections import namedtuple
-from typing import Coroutine, List, Optional
+from collections import OrderedDict, namedtuple
+from enum import Enum
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
+import pydantic
+from reactivex import Observable
 from reactivex.abc import DisposableBase
 from reactivex.subject import Subject
-
+from tortoise.expressions import Subquery
+from tortoise.functions import Max
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from api_server import clock
+from api_server.app_config import app_config
+from api_server.logger import logger as base_logger
 from api_server.models import (
     BasicHealth,
     BuildingMap,
@@ -19,10 +42,394 @@ from api_server.models import (
     IngestorState,
     LiftHealth,
     LiftState,
+    RobotHealth,
 )
 from api_server.models import tortoise_models as ttm
+from api_server.upsert import upsert, upsert_many
 
 from .events import RmfEvents
+from .events import rmf_events as default_rmf_events
+
+
+class StateWriteStats(pydantic.BaseModel):
+    # writes waiting in the queue
+    queue_depth: int = 0
+    received: int = 0
+    # not written because they are the same as the last written state
+    skipped: int = 0
+    # not written because a newer write of the same entity was received before
+    coalesced: int = 0
+    # not written because the queue was full
+    dropped: int = 0
+    written: int = 0
+    failed: int = 0
+    # milliseconds between receiving a write and committing it
+    last_write_latency_ms: float = 0
+    max_write_latency_ms: float = 0
+
+    def record_written(self, received_at: float, now: float) -> None:
+        self.written += 1
+        self.last_write_latency_ms = (now - received_at) * 1000
+        self.max_write_latency_ms = max(
+            self.max_write_latency_ms, self.last_write_latency_ms
+        )
+
+
+class OverflowPolicy(str, Enum):
+    # replace the queued write of the same entity, drop the oldest write if there is none
+    coalesce = "coalesce"
+    drop_oldest = "drop_oldest"
+
+
+StateT = TypeVar("StateT", bound=pydantic.BaseModel)
+T = TypeVar("T")
+
+
+class CoalescingStateWriter(Generic[StateT]):
+    """
+    Buffers states keyed by id and periodically writes only the latest state of each id to
+    the database, in one transaction. States which are the same as the last state of their
+    id that is written or being written, apart from the ignored fields, are not written.
+    States which fail to be written are kept and written again with the next flush.
+    """
+
+    def __init__(
+        self,
+        model: Type[Model],
+        key: Callable[[StateT], str],
+        ignore: Set[str],
+        interval: float,
+        *,
+        logger: Optional[logging.Logger] = None,
+    ):
+        """
+        :param model: The model the states are stored in.
+        :param key: Returns the id of a state.
+        :param ignore: Fields which are not compared, e.g. the timestamp of the state.
+        :param interval: Seconds between each write. If it is 0 or the writer is not
+            started, states are written as they are received.
+        """
+        self.stats = StateWriteStats()
+        self.interval = interval
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._model = model
+        self._key = key
+        self._ignore = ignore
+        self._pending: Dict[str, Tuple[StateT, Dict[str, Any], float]] = {}
+        self._written: Dict[str, Dict[str, Any]] = {}
+        # states of the flush in progress, they are not in `_written` until it commits
+        self._in_flight: Dict[str, Dict[str, Any]] = {}
+        self._write_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._drain_task: Optional[asyncio.Task] = None
+
+    def put(self, state: StateT) -> None:
+        self.stats.received += 1
+        key = self._key(state)
+        compared = state.dict(exclude=self._ignore)
+        loop = asyncio.get_event_loop()
+        if self._pending.pop(key, None) is not None:
+            self.stats.coalesced += 1
+        last = self._in_flight.get(key, self._written.get(key))
+        if last == compared:
+            self.stats.skipped += 1
+        else:
+            self._pending[key] = (state, compared, loop.time())
+        self.stats.queue_depth = len(self._pending)
+        # without a periodic flush, a single task writes the pending states as soon as
+        # possible, states received while it is writing are coalesced.
+        if self._pending and self._flush_task is None and self._drain_task is None:
+            self._drain_task = loop.create_task(self._drain())
+
+    async def flush(self) -> None:
+        async with self._write_lock:
+            if not self._pending:
+                return
+            pending = self._pending
+            self._pending = {}
+            self.stats.queue_depth = 0
+            self._in_flight = {
+                key: compared for key, (_, compared, _) in pending.items()
+            }
+            try:
+                async with in_transaction():
+                    await upsert_many(
+                        self._model,
+                        [
+                            {"id_": key, "data": state.dict()}
+                            for key, (state, _, _) in pending.items()
+                        ],
+                    )
+            except BaseException:
+                # keep the states that are not superseded while writing so they are
+                # retried, this includes being cancelled by `stop`
+                self.stats.failed += len(pending)
+                for key, item in pending.items():
+                    self._pending.setdefault(key, item)
+                self.stats.queue_depth = len(self._pending)
+                raise
+            finally:
+                self._in_flight = {}
+            now = asyncio.get_event_loop().time()
+            for key, (_, compared, received_at) in pending.items():
+                self._written[key] = compared
+                self.stats.record_written(received_at, now)
+
+    async def start(self) -> None:
+        if self.interval <= 0 or self._flush_task is not None:
+            return
+        self._flush_task = asyncio.create_task(self._spin())
+
+    async def stop(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._drain_task is not None:
+            await self._drain_task
+        await self.flush()
+
+    async def _flush_logged(self) -> bool:
+        try:
+            await self.flush()
+            return True
+        except Exception as e:  # pylint: disable=broad-except
+            self.logger.error(f"failed to write states: {e}")
+            return False
+
+    async def _drain(self) -> None:
+        try:
+            # after a failure, the states are retried when the next state is received
+            while self._pending and await self._flush_logged():
+                pass
+        finally:
+            self._drain_task = None
+
+    async def _spin(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._flush_logged()
+
+
+class HealthHistoryWriter:
+    """
+    Appends a health transition each time the health status of a device changes, healths
+    which do not change the status (e.g. heartbeats) are not recorded. Transitions are
+    appended in batches by a single task, in the order they are received, they are never
+    coalesced or dropped, a batch which fails to be written is retried until the writer
+    is stopped.
+    """
+
+    def __init__(
+        self,
+        *,
+        retry_interval: float = 1.0,
+        logger: Optional[logging.Logger] = None,
+    ):
+        """
+        :param retry_interval: Seconds to wait before writing a failed batch again.
+        """
+        self.stats = StateWriteStats()
+        self.retry_interval = retry_interval
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        # last status of each (device type, device id)
+        self._statuses: Dict[Tuple[str, str], str] = {}
+        self._pending: List[Tuple[ttm.HealthTransition, float]] = []
+        self._drain_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def put(self, device_type: str, health: BasicHealth, unix_millis: int) -> None:
+        self.stats.received += 1
+        key = (device_type, health.id_)
+        status = health.health_status.value
+        if self._statuses.get(key) == status:
+            self.stats.skipped += 1
+            return
+        self._statuses[key] = status
+        loop = asyncio.get_event_loop()
+        self._pending.append(
+            (
+                ttm.HealthTransition(
+                    device_type=device_type,
+                    device_id=health.id_,
+                    health_status=status,
+                    health_message=health.health_message,
+                    unix_millis_start=unix_millis,
+                ),
+                loop.time(),
+            )
+        )
+        self.stats.queue_depth = len(self._pending)
+        if self._drain_task is None:
+            self._drain_task = loop.create_task(self._drain())
+
+    async def start(self) -> None:
+        """
+        Loads the last status of each device, so that a restart does not record a
+        transition for every device.
+        """
+        last_ids = (
+            ttm.HealthTransition.annotate(last_id=Max("id"))
+            .group_by("device_type", "device_id")
+            .values("last_id")
+        )
+        rows = await ttm.HealthTransition.filter(id__in=Subquery(last_ids)).values_list(
+            "device_type", "device_id", "health_status"
+        )
+        for device_type, device_id, status in rows:
+            self._statuses.setdefault((device_type, device_id), status)
+
+    async def stop(self) -> None:
+        """
+        Waits for the pending transitions to be written, failed transitions are tried once
+        more and are lost if they fail again.
+        """
+        self._stopping = True
+        if self._drain_task is not None:
+            await self._drain_task
+        if self._pending:
+            await self._drain()
+        self._stopping = False
+
+    async def _drain(self) -> None:
+        try:
+            while self._pending:
+                pending = self._pending
+                self._pending = []
+                self.stats.queue_depth = 0
+                try:
+                    await ttm.HealthTransition.bulk_create([x for x, _ in pending])
+                except Exception as e:  # pylint: disable=broad-except
+                    self.stats.failed += len(pending)
+                    # put the batch back before the transitions received while writing it
+                    self._pending[:0] = pending
+                    self.stats.queue_depth = len(self._pending)
+                    if self._stopping:
+                        self.logger.error(
+                            f"failed to write {len(pending)} health transitions: {e}"
+                        )
+                        return
+                    self.logger.error(
+                        f"failed to write health transitions, retrying: {e}"
+                    )
+                    await asyncio.sleep(self.retry_interval)
+                    continue
+                now = asyncio.get_event_loop().time()
+                for _, received_at in pending:
+                    self.stats.record_written(received_at, now)
+        finally:
+            self._drain_task = None
+
+
+class _WriteShard:
+    def __init__(self):
+        # (item, received at) by entity key, or by sequence number if writes of the same
+        # entity are not coalesced.
+        self.items: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.has_items = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+
+class BoundedWriteQueue(Generic[T]):
+    """
+    Bounded queue of the writes of one type of entity, consumed by a fixed number of
+    workers. Writes of the same entity are always done by the same worker, in order.
+
+    Items are put from synchronous callbacks so a full queue cannot block the producer,
+    instead the overflow policy decides which write is given up.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[T], Awaitable[None]],
+        key: Callable[[T], Hashable],
+        *,
+        workers: int,
+        max_queue_size: int,
+        overflow: OverflowPolicy,
+        logger: Optional[logging.Logger] = None,
+    ):
+        """
+        :param workers: Number of workers writing concurrently.
+        :param max_queue_size: Max number of writes waiting for each worker.
+        """
+        self.stats = StateWriteStats()
+        self.workers = max(workers, 1)
+        self.max_queue_size = max_queue_size
+        self.overflow = overflow
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._write = write
+        self._key = key
+        self._shards: List[_WriteShard] = []
+        self._worker_tasks: List[asyncio.Task] = []
+        self._seq = 0
+
+    def put(self, item: T) -> None:
+        self.stats.received += 1
+        if not self._shards:
+            self.stats.dropped += 1
+            self.logger.warning("write queue is not started, dropping write")
+            return
+        key = self._key(item)
+        shard = self._shards[hash(key) % len(self._shards)]
+        received_at = asyncio.get_event_loop().time()
+        if self.overflow == OverflowPolicy.coalesce:
+            if key in shard.items:
+                # keep the place and the receive time of the replaced write, so the
+                # latency counts from the oldest unwritten change of the entity
+                shard.items[key] = (item, shard.items[key][1])
+                self.stats.coalesced += 1
+                return
+            queue_key: Hashable = key
+        else:
+            self._seq += 1
+            queue_key = self._seq
+        if len(shard.items) >= self.max_queue_size:
+            shard.items.popitem(last=False)
+            self.stats.dropped += 1
+            self.stats.queue_depth -= 1
+        shard.items[queue_key] = (item, received_at)
+        self.stats.queue_depth += 1
+        shard.idle.clear()
+        shard.has_items.set()
+
+    async def start(self) -> None:
+        if self._shards:
+            return
+        self._shards = [_WriteShard() for _ in range(self.workers)]
+        self._worker_tasks = [asyncio.create_task(self._spin(s)) for s in self._shards]
+
+    async def stop(self) -> None:
+        """
+        Waits for all queued writes to be done and stops the workers.
+        """
+        for shard in self._shards:
+            await shard.idle.wait()
+        for t in self._worker_tasks:
+            t.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._shards = []
+
+    async def _spin(self, shard: _WriteShard) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            await shard.has_items.wait()
+            while shard.items:
+                _, (item, received_at) = shard.items.popitem(last=False)
+                self.stats.queue_depth -= 1
+                try:
+                    await self._write(item)
+                    self.stats.record_written(received_at, loop.time())
+                except Exception as e:  # pylint: disable=broad-except
+                    self.stats.failed += 1
+                    self.logger.error(f"failed to write: {type(e).__name__}: {e}")
+            shard.has_items.clear()
+            shard.idle.set()
 
 
 class RmfBookKeeperEvents:
@@ -53,13 +460,25 @@ class RmfBookKeeper:
         self,
         rmf_events: RmfEvents,
         *,
+        write_interval: float = 0,
+        writers: int = 1,
+        max_queue_size: int = 100,
+        overflow: OverflowPolicy = OverflowPolicy.coalesce,
         logger: Optional[logging.Logger] = None,
     ):
+        """
+        :param write_interval: Seconds between each write of the door, lift, dispenser and
+            ingestor states, only the latest state of each device in an interval is
+            written. If it is 0, states are written as they are received.
+        :param writers: Number of workers writing each type of health and the building
+            map.
+        :param max_queue_size: Max number of writes waiting for each worker.
+        :param overflow: What to do with a write when the queue is full.
+        """
         self.rmf = rmf_events
         self.bookkeeper_events = RmfBookKeeperEvents()
         self._loop: asyncio.AbstractEventLoop
         self._main_logger = logger or logging.getLogger(self.__class__.__name__)
-        self._pending_tasks = set()
 
         self._loggers = self._ChildLoggers(
             self._main_logger.getChild("building_map"),
@@ -90,8 +509,93 @@ class RmfBookKeeper:
 
         self._subscriptions: List[DisposableBase] = []
 
+        self._writers = {
+            "door_state": CoalescingStateWriter[DoorState](
+                ttm.DoorState,
+                lambda x: x.door_name,
+                {"door_time"},
+                write_interval,
+                logger=self._loggers.door_state,
+            ),
+            "lift_state": CoalescingStateWriter[LiftState](
+                ttm.LiftState,
+                lambda x: x.lift_name,
+                {"lift_time"},
+                write_interval,
+                logger=self._loggers.lift_state,
+            ),
+            "dispenser_state": CoalescingStateWriter[DispenserState](
+                ttm.DispenserState,
+                lambda x: x.guid,
+                {"time"},
+                write_interval,
+                logger=self._loggers.dispenser_state,
+            ),
+            "ingestor_state": CoalescingStateWriter[IngestorState](
+                ttm.IngestorState,
+                lambda x: x.guid,
+                {"time"},
+                write_interval,
+                logger=self._loggers.ingestor_state,
+            ),
+        }
+
+        def make_queue(write: Callable[[Any], Awaitable[None]], logger: logging.Logger):
+            return BoundedWriteQueue(
+                write,
+                lambda x: x.id_,
+                workers=writers,
+                max_queue_size=max_queue_size,
+                overflow=overflow,
+                logger=logger,
+            )
+
+        self._queues: Dict[str, BoundedWriteQueue] = {
+            "building_map": BoundedWriteQueue(
+                self._write_building_map,
+                lambda x: x.name,
+                workers=1,
+                max_queue_size=max_queue_size,
+                overflow=overflow,
+                logger=self._loggers.building_map,
+            ),
+            "door_health": make_queue(
+                self._write_door_health, self._loggers.door_health
+            ),
+            "lift_health": make_queue(
+                self._write_lift_health, self._loggers.lift_health
+            ),
+            "dispenser_health": make_queue(
+                self._write_dispenser_health, self._loggers.dispenser_health
+            ),
+            "ingestor_health": make_queue(
+                self._write_ingestor_health, self._loggers.ingestor_health
+            ),
+            "robot_health": make_queue(
+                self._write_robot_health, self._loggers.robot_health
+            ),
+        }
+
+        self._health_history = HealthHistoryWriter(
+            logger=self._main_logger.getChild("health_history")
+        )
+
+    def write_stats(self) -> Dict[str, StateWriteStats]:
+        """
+        Queue depths, counters and write latencies, by type of entity.
+        """
+        stats = {name: writer.stats for name, writer in self._writers.items()}
+        stats.update({name: queue.stats for name, queue in self._queues.items()})
+        stats["health_history"] = self._health_history.stats
+        return stats
+
     async def start(self):
         self._loop = asyncio.get_event_loop()
+        for writer in self._writers.values():
+            await writer.start()
+        for queue in self._queues.values():
+            await queue.start()
+        await self._health_history.start()
         self._record_building_map()
         self._record_door_state()
         self._record_door_health()
@@ -101,18 +605,27 @@ class RmfBookKeeper:
         self._record_dispenser_health()
         self._record_ingestor_state()
         self._record_ingestor_health()
+        self._record_robot_health()
 
     async def stop(self):
         for sub in self._subscriptions:
             sub.dispose()
         self._subscriptions.clear()
-        if len(self._pending_tasks) > 0:
-            await asyncio.wait(self._pending_tasks)
-
-    def _create_task(self, coro: Coroutine):
-        task = self._loop.create_task(coro)
-        task.add_done_callback(self._pending_tasks.remove)
-        self._pending_tasks.add(task)
+        # nothing is received after the subscriptions are disposed, let the events already
+        # scheduled on the loop be queued, then drain everything that is queued.
+        await asyncio.sleep(0)
+        for queue in self._queues.values():
+            await queue.stop()
+        for writer in self._writers.values():
+            await writer.stop()
+        await self._health_history.stop()
+
+    def _on_loop(self, callback: Callable[[Any], None]) -> Callable[[Any], None]:
+        """
+        Events may be emitted from other threads (e.g. health watchdog timers), the
+        writers must only be used from the event loop.
+        """
+        return lambda x: self._loop.call_soon_threadsafe(callback, x)
 
     @staticmethod
     def _report_health(health: BasicHealth, logger: logging.Logger):
@@ -124,93 +637,115 @@ class RmfBookKeeper:
         else:
             logger.info(message)
 
+    def _record_health(self, device_type: str, healths: Observable[BasicHealth]):
+        queue = self._queues[f"{device_type}_health"]
+
+        def update(health: BasicHealth):
+            self._health_history.put(device_type, health, clock.now())
+            queue.put(health)
+
+        self._subscriptions.append(healths.subscribe(self._on_loop(update)))
+
+    async def _write_building_map(self, building_map: BuildingMap):
+        await building_map.save()
+        self._loggers.building_map.info(json.dumps(building_map.dict()))
+
     def _record_building_map(self):
-        async def update(building_map: BuildingMap | None):
-            if not building_map:
-                return
-            await building_map.save()
-            self._loggers.building_map.info(json.dumps(building_map.dict()))
+        queue = self._queues["building_map"]
+
+        def update(building_map: BuildingMap | None):
+            if building_map:
+                queue.put(building_map)
 
         self._subscriptions.append(
-            self.rmf.building_map.subscribe(lambda x: self._create_task(update(x)))
+            self.rmf.building_map.subscribe(self._on_loop(update))
         )
 
     def _record_door_state(self):
-        async def update(door_state: DoorState):
-            await door_state.save()
+        writer = self._writers["door_state"]
+
+        def update(door_state: DoorState):
+            writer.put(door_state)
             self._loggers.door_state.info(json.dumps(door_state.dict()))
 
         self._subscriptions.append(
-            self.rmf.door_states.subscribe(lambda x: self._create_task(update(x)))
+            self.rmf.door_states.subscribe(self._on_loop(update))
         )
 
-    def _record_door_health(self):
-        async def update(health: DoorHealth):
-            await ttm.DoorHealth.update_or_create(
-                health.dict(exclude={"id_"}), id_=health.id_
-            )
-            self._report_health(health, self._loggers.door_health)
+    async def _write_door_health(self, health: DoorHealth):
+        await upsert(ttm.DoorHealth, health.dict())
+        self._report_health(health, self._loggers.door_health)
 
-        self._subscriptions.append(
-            self.rmf.door_health.subscribe(lambda x: self._create_task(update(x)))
-        )
+    def _record_door_health(self):
+        self._record_health("door", self.rmf.door_health)
 
     def _record_lift_state(self):
-        async def update(lift_state: LiftState):
-            await lift_state.save()
+        writer = self._writers["lift_state"]
+
+        def update(lift_state: LiftState):
+            writer.put(lift_state)
             self._loggers.lift_state.info(lift_state.json())
 
         self._subscriptions.append(
-            self.rmf.lift_states.subscribe(lambda x: self._create_task(update(x)))
+            self.rmf.lift_states.subscribe(self._on_loop(update))
         )
 
-    def _record_lift_health(self):
-        async def update(health: LiftHealth):
-            await ttm.LiftHealth.update_or_create(
-                health.dict(exclude={"id_"}), id_=health.id_
-            )
-            self._report_health(health, self._loggers.lift_health)
+    async def _write_lift_health(self, health: LiftHealth):
+        await upsert(ttm.LiftHealth, health.dict())
+        self._report_health(health, self._loggers.lift_health)
 
-        self._subscriptions.append(
-            self.rmf.lift_health.subscribe(lambda x: self._create_task(update(x)))
-        )
+    def _record_lift_health(self):
+        self._record_health("lift", self.rmf.lift_health)
 
     def _record_dispenser_state(self):
-        async def update(dispenser_state: DispenserState):
-            await dispenser_state.save()
+        writer = self._writers["dispenser_state"]
+
+        def update(dispenser_state: DispenserState):
+            writer.put(dispenser_state)
             self._loggers.dispenser_state.info(dispenser_state.json())
 
         self._subscriptions.append(
-            self.rmf.dispenser_states.subscribe(lambda x: self._create_task(update(x)))
+            self.rmf.dispenser_states.subscribe(self._on_loop(update))
         )
 
-    def _record_dispenser_health(self):
-        async def update(health: DispenserHealth):
-            await ttm.DispenserHealth.update_or_create(
-                health.dict(exclude={"id_"}), id_=health.id_
-            )
-            self._report_health(health, self._loggers.dispenser_health)
+    async def _write_dispenser_health(self, health: DispenserHealth):
+        await upsert(ttm.DispenserHealth, health.dict())
+        self._report_health(health, self._loggers.dispenser_health)
 
-        self._subscriptions.append(
-            self.rmf.dispenser_health.subscribe(lambda x: self._create_task(update(x)))
-        )
+    def _record_dispenser_health(self):
+        self._record_health("dispenser", self.rmf.dispenser_health)
 
     def _record_ingestor_state(self):
-        async def update(ingestor_state: IngestorState):
-            await ingestor_state.save()
+        writer = self._writers["ingestor_state"]
+
+        def update(ingestor_state: IngestorState):
+            writer.put(ingestor_state)
             self._loggers.ingestor_state.info(ingestor_state.json())
 
         self._subscriptions.append(
-            self.rmf.ingestor_states.subscribe(lambda x: self._create_task(update(x)))
+            self.rmf.ingestor_states.subscribe(self._on_loop(update))
         )
 
+    async def _write_ingestor_health(self, health: IngestorHealth):
+        await upsert(ttm.IngestorHealth, health.dict())
+        self._report_health(health, self._loggers.ingestor_health)
+
     def _record_ingestor_health(self):
-        async def update(health: IngestorHealth):
-            await ttm.IngestorHealth.update_or_create(
-                health.dict(exclude={"id_"}), id_=health.id_
-            )
-            self._report_health(health, self._loggers.ingestor_health)
+        self._record_health("ingestor", self.rmf.ingestor_health)
 
-        self._subscriptions.append(
-            self.rmf.ingestor_health.subscribe(lambda x: self._create_task(update(x)))
-        )
+    async def _write_robot_health(self, health: RobotHealth):
+        await upsert(ttm.RobotHealth, health.dict())
+        self._report_health(health, self._loggers.robot_health)
+
+    def _record_robot_health(self):
+        self._record_health("robot", self.rmf.robot_health)
+
+
+rmf_bookkeeper = RmfBookKeeper(
+    default_rmf_events,
+    write_interval=app_config.bookkeeper_write_interval,
+    writers=app_config.bookkeeper_writers,
+    max_queue_size=app_config.bookkeeper_queue_size,
+    overflow=OverflowPolicy(app_config.bookkeeper_overflow),
+    logger=base_logger.getChild("BookKeeper"),
+)
@@ -1,22 +1,91 @@
+from typing import Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from reactivex import Observable
+from reactivex.abc import DisposableBase, ObserverBase, SchedulerBase
+from reactivex.disposable import Disposable
 from reactivex.subject import BehaviorSubject, Subject
 from tortoise.contrib.pydantic.base import PydanticModel
 
 from api_server import models as mdl
 
+T = TypeVar("T")
+
+
+class KeyedSubject(Subject[T]):
+    """
+    A subject which can also be subscribed to by key. Items are dispatched to the
+    subscribers of their key with a dict lookup, so the cost of an item does not grow with
+    the number of subscribers of other keys.
+    """
+
+    def __init__(self, key_mapper: Callable[[T], Hashable]):
+        super().__init__()
+        self.key_mapper = key_mapper
+        self._keyed: Dict[Hashable, Subject[T]] = {}
+
+    def by_key(self, key: Hashable) -> Observable[T]:
+        """
+        Returns an observable sequence of items where `key_mapper(item) == key`.
+        """
+
+        def subscribe(
+            observer: ObserverBase[T], scheduler: Optional[SchedulerBase] = None
+        ) -> DisposableBase:
+            with self.lock:
+                subject = self._keyed.get(key)
+                if subject is None:
+                    subject = Subject[T]()
+                    self._keyed[key] = subject
+                sub = subject.subscribe(observer, scheduler=scheduler)
+
+            def dispose():
+                with self.lock:
+                    sub.dispose()
+                    if not subject.observers and self._keyed.get(key) is subject:
+                        del self._keyed[key]
+
+            return Disposable(dispose)
+
+        return Observable(subscribe)
+
+    def _on_next_core(self, value: T) -> None:
+        super()._on_next_core(value)
+        with self.lock:
+            subject = self._keyed.get(self.key_mapper(value))
+        if subject is not None:
+            subject.on_next(value)
+
+    def _on_error_core(self, error: Exception) -> None:
+        super()._on_error_core(error)
+        with self.lock:
+            subjects = list(self._keyed.values())
+        for subject in subjects:
+            subject.on_error(error)
+
+    def _on_completed_core(self) -> None:
+        super()._on_completed_core()
+        with self.lock:
+            subjects = list(self._keyed.values())
+        for subject in subjects:
+            subject.on_completed()
+
 
 class RmfEvents:
     def __init__(self):
-        self.door_states = Subject[mdl.DoorState]()
-        self.door_health = Subject[mdl.DoorHealth]()
-        self.lift_states = Subject[mdl.LiftState]()
-        self.lift_health = Subject[mdl.LiftHealth]()
-        self.dispenser_states = Subject[mdl.DispenserState]()
-        self.dispenser_health = Subject[mdl.DispenserHealth]()
-        self.ingestor_states = Subject[mdl.IngestorState]()
-        self.ingestor_health = Subject[mdl.IngestorHealth]()
+        self.door_states = KeyedSubject[mdl.DoorState](lambda x: x.door_name)
+        self.door_health = KeyedSubject[mdl.DoorHealth](lambda x: x.id_)
+        self.lift_states = KeyedSubject[mdl.LiftState](lambda x: x.lift_name)
+        self.lift_health = KeyedSubject[mdl.LiftHealth](lambda x: x.id_)
+        self.dispenser_states = KeyedSubject[mdl.DispenserState](lambda x: x.guid)
+        self.dispenser_health = KeyedSubject[mdl.DispenserHealth](lambda x: x.id_)
+        self.ingestor_states = KeyedSubject[mdl.IngestorState](lambda x: x.guid)
+        self.ingestor_health = KeyedSubject[mdl.IngestorHealth](lambda x: x.id_)
         self.fleet_states = Subject[mdl.FleetState]()
-        self.robot_health = Subject[mdl.RobotHealth]()
+        self.robot_health = KeyedSubject[mdl.RobotHealth](lambda x: x.id_)
         self.building_map = BehaviorSubject[mdl.BuildingMap | None](None)
+        # (device type, device id) of states which are dropped because they did not
+        # change, they are only heartbeats.
+        self.device_heartbeats = Subject[Tuple[str, str]]()
 
 
 rmf_events = RmfEvents()
@@ -24,8 +93,8 @@ rmf_events = RmfEvents()
 
 class TaskEvents:
     def __init__(self):
-        self.task_states = Subject[mdl.TaskState]()
-        self.task_event_logs = Subject[mdl.TaskEventLog]()
+        self.task_states = KeyedSubject[mdl.TaskState](lambda x: x.booking.id)
+        self.task_event_logs = KeyedSubject[mdl.TaskEventLog](lambda x: x.task_id)
 
 
 task_events = TaskEvents()
@@ -33,8 +102,8 @@ task_events = TaskEvents()
 
 class FleetEvents:
     def __init__(self):
-        self.fleet_states = Subject[mdl.FleetState]()
-        self.fleet_logs = Subject[mdl.FleetLog]()
+        self.fleet_states = KeyedSubject[mdl.FleetState](lambda x: x.name)
+        self.fleet_logs = KeyedSubject[mdl.FleetLog](lambda x: x.name)
 
 
 fleet_events = FleetEvents()
@@ -1,10 +1,11 @@
 import logging
-from typing import Any, Callable, Dict, Optional, TypeVar, cast
+import threading
+from typing import Callable, Dict, Generic, Hashable, List, Optional, Type, TypeVar
 
-from reactivex import Observable, compose
-from reactivex import operators as ops
-from reactivex.scheduler.scheduler import Scheduler
-from reactivex.subject.behaviorsubject import BehaviorSubject
+from reactivex import Observable
+from reactivex.abc import SchedulerBase
+from reactivex.operators._timestamp import Timestamp
+from reactivex.subject import Subject
 from rmf_dispenser_msgs.msg import DispenserState as RmfDispenserState
 from rmf_door_msgs.msg import DoorMode as RmfDoorMode
 from rmf_ingestor_msgs.msg import IngestorState as RmfIngestorState
@@ -19,19 +20,75 @@ from api_server.models import (
     DispenserState,
     DoorHealth,
     DoorState,
+    FleetState,
     HealthStatus,
     Ingestor,
     IngestorHealth,
     IngestorState,
     LiftHealth,
     LiftState,
+    RobotHealth,
+    Status2,
 )
 from api_server.models import tortoise_models as ttm
+from api_server.models.rmf_api.robot_state import RobotState
 
-from .events import RmfEvents
-from .operators import filter_not_none, heartbeat, most_critical
+from .events import FleetEvents, RmfEvents
+from .events import fleet_events as default_fleet_events
+from .liveness import LivenessMonitor
+from .operators import get_most_critical
 
 T = TypeVar("T", bound=BasicHealth)
+StateT = TypeVar("StateT")
+
+
+class _DeviceHealths(Generic[T]):
+    """
+    Combines the heartbeat health and the mode health of each device of one type, the most
+    critical of them is emitted whenever one of them changes.
+    """
+
+    def __init__(
+        self,
+        health_type: Type[T],
+        health_subject: Subject,
+        scheduler: SchedulerBase,
+    ):
+        self.health_type = health_type
+        self.health_subject = health_subject
+        self.scheduler = scheduler
+        # [heartbeat health, mode health] of each device, `None` until it is known
+        self._healths: Dict[str, List[Optional[Timestamp[Optional[T]]]]] = {}
+        self._lock = threading.Lock()
+
+    def on_mode(self, id_: str, health: Optional[T]):
+        self._update(id_, 1, health)
+
+    def on_heartbeat(self, id_: str, has_heartbeat: bool):
+        if has_heartbeat:
+            health = self.health_type(
+                id_=id_, health_status=HealthStatus.HEALTHY, health_message=""
+            )
+        else:
+            health = self.health_type(
+                id_=id_,
+                health_status=HealthStatus.DEAD,
+                health_message="heartbeat failed",
+            )
+        self._update(id_, 0, health)
+
+    def _update(self, id_: str, index: int, health: Optional[T]):
+        with self._lock:
+            healths = self._healths.setdefault(id_, [None, None])
+            current = healths[index]
+            if current is not None and current.value == health:
+                return
+            healths[index] = Timestamp(value=health, timestamp=self.scheduler.now)
+            if None in healths:
+                return
+            most_critical = get_most_critical(healths)
+        if most_critical is not None:
+            self.health_subject.on_next(most_critical)
 
 
 class HealthWatchdog:
@@ -41,35 +98,67 @@ class HealthWatchdog:
         self,
         rmf_events: RmfEvents,
         *,
-        scheduler: Optional[Scheduler] = None,
+        fleet_events: Optional[FleetEvents] = None,
+        low_battery_threshold: float = 0.1,
+        scheduler: Optional[SchedulerBase] = None,
         logger: Optional[logging.Logger] = None,
     ):
+        """
+        :param fleet_events: Robot health is derived from the fleet states of these
+            events, defaults to the global fleet events.
+        :param low_battery_threshold: Robots with a battery (0 to 1) below this are
+            unhealthy.
+        """
         self.rmf = rmf_events
-        self.scheduler = scheduler
+        self.fleet_events = fleet_events or default_fleet_events
+        self.low_battery_threshold = low_battery_threshold
         self.logger = logger or logging.getLogger(self.__class__.__name__)
+        # a single timer checks the heartbeats of every device
+        self.liveness = LivenessMonitor(
+            self.LIVELINESS, self._on_heartbeat, scheduler=scheduler
+        )
+        self.scheduler = self.liveness.scheduler
+        self._devices: Dict[str, _DeviceHealths] = {}
 
     async def start(self):
         await self._watch_door_health()
         await self._watch_lift_health()
         await self._watch_dispenser_health()
         await self._watch_ingestor_health()
+        await self._watch_robot_health()
+        # states which did not change are dropped by the gateway, they still beat
+        self.rmf.device_heartbeats.subscribe(self.liveness.beat)
+        self.liveness.start()
 
-    @staticmethod
-    def _combine_most_critical(
-        *obs: Observable[T | None],
-    ) -> Callable[[Observable[T]], Observable[T]]:
-        """
-        Combines an observable sequence of an observable sequence of BasicHealthModel to an
-        observable sequence of BasicHealthModel with the most critical health status. If there
-        are multiple BasicHealthModel with the same criticality, the most recent item is
-        chosen.
-        """
-        return compose(
-            ops.timestamp(),
-            cast(Any, ops.combine_latest(*[x.pipe(ops.timestamp()) for x in obs])),
-            most_critical(),
-            filter_not_none,
-        )
+    async def stop(self):
+        self.liveness.stop()
+
+    def _on_heartbeat(self, key: Hashable, has_heartbeat: bool):
+        kind, id_ = key  # type: ignore
+        self._devices[kind].on_heartbeat(id_, has_heartbeat)
+
+    def _watch(
+        self,
+        kind: str,
+        health_type: Type[T],
+        mode_to_health: Callable[[StateT], Optional[T]],
+        health_subject: Subject,
+        states: Observable[StateT],
+        key: Callable[[StateT], str],
+        initial_states: Dict[str, Optional[StateT]],
+    ):
+        devices = _DeviceHealths(health_type, health_subject, self.scheduler)
+        self._devices[kind] = devices
+        for id_, state in initial_states.items():
+            devices.on_mode(id_, None if state is None else mode_to_health(state))
+            self.liveness.beat((kind, id_))
+
+        def on_state(state: StateT):
+            id_ = key(state)
+            devices.on_mode(id_, mode_to_health(state))
+            self.liveness.beat((kind, id_))
+
+        states.subscribe(on_state)
 
     @staticmethod
     def door_mode_to_health(state: Optional[DoorState]) -> Optional[DoorHealth]:
@@ -99,28 +188,6 @@ class HealthWatchdog:
         )
 
     async def _watch_door_health(self):
-        def to_door_health(id_: str, has_heartbeat: bool):
-            if has_heartbeat:
-                return DoorHealth(
-                    id_=id_, health_status=HealthStatus.HEALTHY, health_message=""
-                )
-            return DoorHealth(
-                id_=id_,
-                health_status=HealthStatus.DEAD,
-                health_message="heartbeat failed",
-            )
-
-        def watch(id_: str, obs: Observable):
-            door_mode_health = obs.pipe(
-                ops.map(self.door_mode_to_health),
-                ops.distinct_until_changed(),
-            )
-            obs.pipe(
-                heartbeat(self.LIVELINESS),
-                ops.map(lambda has_heartbeat: to_door_health(id_, has_heartbeat)),
-                self._combine_most_critical(door_mode_health),
-            ).subscribe(self.rmf.door_health.on_next, scheduler=self.scheduler)
-
         try:
             ttm_map = await ttm.BuildingMap.get_or_none()
         except MultipleObjectsReturned:
@@ -144,21 +211,15 @@ class HealthWatchdog:
         states_list = [DoorState.from_tortoise(x) for x in await ttm.DoorState.all()]
         door_states = {state.door_name: state for state in states_list}
         initial_states = {door.name: door_states.get(door.name, None) for door in doors}
-
-        subjects: Dict[str, BehaviorSubject] = {
-            id_: BehaviorSubject(state) for id_, state in initial_states.items()
-        }
-        for id_, subject in subjects.items():
-            watch(id_, subject)
-
-        def on_state(state: DoorState):
-            if state.door_name not in subjects:
-                subjects[state.door_name] = BehaviorSubject(state)
-                watch(state.door_name, subjects[state.door_name])
-            else:
-                subjects[state.door_name].on_next(state)
-
-        self.rmf.door_states.subscribe(on_state)
+        self._watch(
+            "door",
+            DoorHealth,
+            self.door_mode_to_health,
+            self.rmf.door_health,
+            self.rmf.door_states,
+            lambda x: x.door_name,
+            initial_states,
+        )
 
     @staticmethod
     def lift_mode_to_health(state: Optional[LiftState]):
@@ -193,28 +254,6 @@ class HealthWatchdog:
         )
 
     async def _watch_lift_health(self):
-        def to_lift_health(id_: str, has_heartbeat: bool):
-            if has_heartbeat:
-                return LiftHealth(
-                    id_=id_, health_status=HealthStatus.HEALTHY, health_message=""
-                )
-            return LiftHealth(
-                id_=id_,
-                health_status=HealthStatus.DEAD,
-                health_message="heartbeat failed",
-            )
-
-        def watch(id_: str, obs: Observable):
-            lift_mode_health = obs.pipe(
-                ops.map(self.lift_mode_to_health),
-                ops.distinct_until_changed(),
-            )
-            obs.pipe(
-                heartbeat(self.LIVELINESS),
-                ops.map(lambda has_heartbeat: to_lift_health(id_, has_heartbeat)),
-                self._combine_most_critical(lift_mode_health),
-            ).subscribe(self.rmf.lift_health.on_next, scheduler=self.scheduler)
-
         ttm_map = await ttm.BuildingMap.get_or_none()
         if ttm_map is None:
             lifts = []
@@ -224,21 +263,15 @@ class HealthWatchdog:
         states_list = [LiftState.from_tortoise(x) for x in await ttm.LiftState.all()]
         lift_states = {state.lift_name: state for state in states_list}
         initial_states = {lift.name: lift_states.get(lift.name, None) for lift in lifts}
-
-        subjects: Dict[str, BehaviorSubject] = {
-            id_: BehaviorSubject(state) for id_, state in initial_states.items()
-        }
-        for id_, subject in subjects.items():
-            watch(id_, subject)
-
-        def on_state(state: LiftState):
-            if state.lift_name not in subjects:
-                subjects[state.lift_name] = BehaviorSubject(state)
-                watch(state.lift_name, subjects[state.lift_name])
-            else:
-                subjects[state.lift_name].on_next(state)
-
-        self.rmf.lift_states.subscribe(on_state)
+        self._watch(
+            "lift",
+            LiftHealth,
+            self.lift_mode_to_health,
+            self.rmf.lift_health,
+            self.rmf.lift_states,
+            lambda x: x.lift_name,
+            initial_states,
+        )
 
     @staticmethod
     def dispenser_mode_to_health(state: Optional[DispenserState]):
@@ -266,30 +299,6 @@ class HealthWatchdog:
         )
 
     async def _watch_dispenser_health(self):
-        def to_dispenser_health(id_: str, has_heartbeat: bool):
-            if has_heartbeat:
-                return DispenserHealth(
-                    id_=id_, health_status=HealthStatus.HEALTHY, health_message=""
-                )
-            return DispenserHealth(
-                id_=id_,
-                health_status=HealthStatus.DEAD,
-                health_message="heartbeat failed",
-            )
-
-        def watch(id_: str, obs: Observable):
-            dispenser_mode_health = obs.pipe(
-                ops.map(self.dispenser_mode_to_health),
-                ops.distinct_until_changed(),
-            )
-            obs.pipe(
-                heartbeat(self.LIVELINESS),
-                ops.map(
-                    lambda has_heartbeat: to_dispenser_health(id_, has_heartbeat),
-                ),
-                self._combine_most_critical(dispenser_mode_health),
-            ).subscribe(self.rmf.dispenser_health.on_next, scheduler=self.scheduler)
-
         states_list = [
             DispenserState.from_tortoise(x) for x in await ttm.DispenserState.all()
         ]
@@ -299,21 +308,15 @@ class HealthWatchdog:
             dispenser.guid: dispenser_states.get(dispenser.guid, None)
             for dispenser in dispensers
         }
-
-        subjects: Dict[str, BehaviorSubject] = {
-            id_: BehaviorSubject(state) for id_, state in initial_states.items()
-        }
-        for id_, subject in subjects.items():
-            watch(id_, subject)
-
-        def on_state(state: DispenserState):
-            if state.guid not in subjects:
-                subjects[state.guid] = BehaviorSubject(state)
-                watch(state.guid, subjects[state.guid])
-            else:
-                subjects[state.guid].on_next(state)
-
-        self.rmf.dispenser_states.subscribe(on_state)
+        self._watch(
+            "dispenser",
+            DispenserHealth,
+            self.dispenser_mode_to_health,
+            self.rmf.dispenser_health,
+            self.rmf.dispenser_states,
+            lambda x: x.guid,
+            initial_states,
+        )
 
     @staticmethod
     def ingestor_mode_to_health(state: IngestorState):
@@ -337,30 +340,6 @@ class HealthWatchdog:
         )
 
     async def _watch_ingestor_health(self):
-        def to_ingestor_health(id_: str, has_heartbeat: bool):
-            if has_heartbeat:
-                return IngestorHealth(
-                    id_=id_, health_status=HealthStatus.HEALTHY, health_message=""
-                )
-            return IngestorHealth(
-                id_=id_,
-                health_status=HealthStatus.DEAD,
-                health_message="heartbeat failed",
-            )
-
-        def watch(id_: str, obs: Observable):
-            ingestor_mode_health = obs.pipe(
-                ops.map(self.ingestor_mode_to_health),
-                ops.distinct_until_changed(),
-            )
-            obs.pipe(
-                heartbeat(self.LIVELINESS),
-                ops.map(
-                    lambda has_heartbeat: to_ingestor_health(id_, has_heartbeat),
-                ),
-                self._combine_most_critical(ingestor_mode_health),
-            ).subscribe(self.rmf.ingestor_health.on_next, scheduler=self.scheduler)
-
         states_list = [
             IngestorState.from_tortoise(x) for x in await ttm.IngestorState.all()
         ]
@@ -370,18 +349,67 @@ class HealthWatchdog:
             ingestor.guid: ingestor_states.get(ingestor.guid, None)
             for ingestor in ingestors
         }
+        self._watch(
+            "ingestor",
+            IngestorHealth,
+            self.ingestor_mode_to_health,
+            self.rmf.ingestor_health,
+            self.rmf.ingestor_states,
+            lambda x: x.guid,
+            initial_states,
+        )
 
-        subjects: Dict[str, BehaviorSubject] = {
-            id_: BehaviorSubject(state) for id_, state in initial_states.items()
-        }
-        for id_, subject in subjects.items():
-            watch(id_, subject)
-
-        def on_state(state: IngestorState):
-            if state.guid not in subjects:
-                subjects[state.guid] = BehaviorSubject(state)
-                watch(state.guid, subjects[state.guid])
-            else:
-                subjects[state.guid].on_next(state)
+    @staticmethod
+    def robot_state_to_health(
+        id_: str, state: RobotState, low_battery_threshold: float
+    ) -> RobotHealth:
+        messages = []
+        if state.status == Status2.error:
+            messages.append("robot is in ERROR")
+        elif state.status == Status2.offline:
+            messages.append("robot is OFFLINE")
+        if state.issues:
+            categories = ", ".join(str(x.category) for x in state.issues)
+            messages.append(f"robot has issues: {categories}")
+        if state.battery is not None and state.battery < low_battery_threshold:
+            messages.append(f"robot battery is low ({state.battery:.0%})")
+        if messages:
+            return RobotHealth(
+                id_=id_,
+                health_status=HealthStatus.UNHEALTHY,
+                health_message="; ".join(messages),
+            )
+        return RobotHealth(
+            id_=id_, health_status=HealthStatus.HEALTHY, health_message=""
+        )
 
-        self.rmf.ingestor_states.subscribe(on_state)
+    async def _watch_robot_health(self):
+        """
+        Robots share the liveness monitor of the devices, the heartbeat of a robot is a
+        fleet state with a new `unix_millis_time` for it. Robots are identified by
+        "<fleet>/<robot>".
+        """
+        devices = _DeviceHealths(RobotHealth, self.rmf.robot_health, self.scheduler)
+        self._devices["robot"] = devices
+        # last `unix_millis_time` of each robot, a fleet adapter may keep sending a robot
+        # which stopped updating.
+        last_times: Dict[str, Optional[int]] = {}
+
+        def on_fleet_state(fleet_state: FleetState):
+            for name, robot in (fleet_state.robots or {}).items():
+                id_ = f"{fleet_state.name}/{name}"
+                devices.on_mode(
+                    id_,
+                    self.robot_state_to_health(id_, robot, self.low_battery_threshold),
+                )
+                # robots without a time are alive as long as their fleet is
+                if id_ in last_times and robot.unix_millis_time is not None:
+                    if last_times[id_] == robot.unix_millis_time:
+                        continue
+                last_times[id_] = robot.unix_millis_time
+                self.liveness.beat(("robot", id_))
+
+        db_states = await ttm.FleetState.all().values_list("data", flat=True)
+        for data in db_states:
+            on_fleet_state(FleetState(**data))
+        self.fleet_events.fleet_states.subscribe(on_fleet_state)
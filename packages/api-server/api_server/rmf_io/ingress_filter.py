@@ -0,0 +1,62 @@
+import time
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+import pydantic
+
+
+class IngressFilterStats(pydantic.BaseModel):
+    received: int = 0
+    # same as the last message of their device, only used as a heartbeat
+    unchanged: int = 0
+
+
+class IngressFilter:
+    """
+    Compares the fields of raw state messages with the last message of the same device,
+    so that messages in which only the timestamp changed can be dropped before they are
+    converted to models. An unchanged message is still let through once every
+    `resend_interval` seconds, so that a state which is lost or skipped downstream is
+    eventually sent again.
+    """
+
+    def __init__(
+        self,
+        key: Callable[[Any], str],
+        fields: Sequence[str],
+        resend_interval: float,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param key: Returns the id of the device of a message.
+        :param fields: The fields which are compared, the timestamp must not be one of
+            them.
+        :param resend_interval: Seconds after which an unchanged message is let through.
+        """
+        self.stats = IngressFilterStats()
+        self.key = key
+        self.resend_interval = resend_interval
+        self._fields = fields
+        self._clock = clock
+        # values of the last message let through and when it was let through
+        self._last: Dict[str, Tuple[Tuple[Any, ...], float]] = {}
+
+    def changed(self, msg: Any) -> bool:
+        """
+        Returns whether a message is different from the last message of its device, or
+        the same message was last let through more than `resend_interval` seconds ago.
+        """
+        self.stats.received += 1
+        key = self.key(msg)
+        values = tuple(getattr(msg, f) for f in self._fields)
+        now = self._clock()
+        last = self._last.get(key)
+        if (
+            last is not None
+            and last[0] == values
+            and now - last[1] < self.resend_interval
+        ):
+            self.stats.unchanged += 1
+            return False
+        self._last[key] = (values, now)
+        return True
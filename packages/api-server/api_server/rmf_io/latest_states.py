@@ -0,0 +1,73 @@
+import hashlib
+from typing import Dict, List, Optional
+
+from api_server import models as mdl
+
+from .events import RmfEvents, rmf_events
+
+
+class CachedBuildingMap:
+    """
+    A building map with name indexes and its pre-serialized json, the map is immutable once
+    cached.
+    """
+
+    def __init__(self, building_map: mdl.BuildingMap):
+        self.building_map = building_map
+        self.json = building_map.json().encode()
+        self.etag = f'"{hashlib.sha256(self.json).hexdigest()}"'
+        self.doors: List[mdl.Door] = [
+            door for level in building_map.levels for door in level.doors
+        ]
+        self.levels_by_name: Dict[str, mdl.Level] = {
+            level.name: level for level in building_map.levels
+        }
+        self.doors_by_name: Dict[str, mdl.Door] = {
+            door.name: door for door in self.doors
+        }
+        self.lifts_by_name: Dict[str, mdl.Lift] = {
+            lift.name: lift for lift in building_map.lifts
+        }
+
+
+class LatestStates:
+    """
+    In-memory store of the building map and the latest states and health of doors, lifts,
+    dispensers and ingestors, updated from `RmfEvents`. It is complete once the states in the database are
+    loaded on startup (see `loaded`), before that, readers should fall back to the
+    database when a value is missing.
+    """
+
+    def __init__(self, events: RmfEvents):
+        self.loaded = False
+        self.building_map: Optional[CachedBuildingMap] = None
+        self.door_states: Dict[str, mdl.DoorState] = {}
+        self.door_health: Dict[str, mdl.DoorHealth] = {}
+        self.lift_states: Dict[str, mdl.LiftState] = {}
+        self.lift_health: Dict[str, mdl.LiftHealth] = {}
+        self.dispenser_states: Dict[str, mdl.DispenserState] = {}
+        self.dispenser_health: Dict[str, mdl.DispenserHealth] = {}
+        self.ingestor_states: Dict[str, mdl.IngestorState] = {}
+        self.ingestor_health: Dict[str, mdl.IngestorHealth] = {}
+
+        def store(latest: Dict, key_mapper):
+            return lambda x: latest.__setitem__(key_mapper(x), x)
+
+        def cache_building_map(building_map: Optional[mdl.BuildingMap]):
+            if building_map is not None:
+                self.building_map = CachedBuildingMap(building_map)
+
+        events.building_map.subscribe(cache_building_map)
+        events.door_states.subscribe(store(self.door_states, lambda x: x.door_name))
+        events.door_health.subscribe(store(self.door_health, lambda x: x.id_))
+        events.lift_states.subscribe(store(self.lift_states, lambda x: x.lift_name))
+        events.lift_health.subscribe(store(self.lift_health, lambda x: x.id_))
+        events.dispenser_states.subscribe(
+            store(self.dispenser_states, lambda x: x.guid)
+        )
+        events.dispenser_health.subscribe(store(self.dispenser_health, lambda x: x.id_))
+        events.ingestor_states.subscribe(store(self.ingestor_states, lambda x: x.guid))
+        events.ingestor_health.subscribe(store(self.ingestor_health, lambda x: x.id_))
+
+
+latest_states = LatestStates(rmf_events)
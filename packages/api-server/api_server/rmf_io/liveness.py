@@ -0,0 +1,115 @@
+import math
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Set
+
+from reactivex.abc import DisposableBase, SchedulerBase
+from reactivex.scheduler import TimeoutScheduler
+
+
+class LivenessMonitor:
+    """
+    Tracks the liveness of many entities with a single periodic timer. An entity is alive
+    while it beats at least once every `liveliness` seconds, `on_change` is called when
+    an entity becomes alive or dead. It is called with the lock of the monitor held, so
+    changes are never reported out of order, it must not wait for other threads that use
+    the monitor.
+
+    Deadlines are kept in a hashed timing wheel with slots of `resolution` seconds. A beat
+    only records the time the entity is seen, the entity is checked when its slot comes
+    up and is either dead or moved to the slot of its new deadline. Each tick only visits
+    the entities in one slot, an entity is found dead between `liveliness` and
+    `liveliness + resolution` seconds after its last beat.
+    """
+
+    def __init__(
+        self,
+        liveliness: float,
+        on_change: Callable[[Hashable, bool], None],
+        *,
+        resolution: float = 1.0,
+        scheduler: Optional[SchedulerBase] = None,
+    ):
+        self.liveliness = liveliness
+        self.resolution = resolution
+        self.scheduler = scheduler or TimeoutScheduler.singleton()
+        self._on_change = on_change
+        self._last_seen: Dict[Hashable, float] = {}
+        # tick each alive entity is checked at, dead entities are not in the wheel
+        self._scheduled: Dict[Hashable, int] = {}
+        self._wheel: List[Set[Hashable]] = [
+            set() for _ in range(math.ceil(liveliness / resolution) + 1)
+        ]
+        self._start = self._now()
+        self._tick = 0
+        # beats may come from other threads than the timer, reentrant so that `on_change`
+        # can use the monitor
+        self._lock = threading.RLock()
+        self._timer: Optional[DisposableBase] = None
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def is_alive(self, key: Hashable) -> bool:
+        return key in self._scheduled
+
+    def beat(self, key: Hashable) -> None:
+        with self._lock:
+            now = self._now()
+            self._last_seen[key] = now
+            if key in self._scheduled:
+                return
+            self._schedule(key, now + self.liveliness)
+            self._on_change(key, True)
+
+    def start(self) -> None:
+        if self._timer is None:
+            self._timer = self.scheduler.schedule_periodic(
+                self.resolution, lambda _: self.check()
+            )
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.dispose()
+            self._timer = None
+
+    def check(self) -> None:
+        """
+        Finds the entities which are dead, this is called periodically once started.
+        """
+        with self._lock:
+            now = self._now()
+            current = math.floor((now - self._start) / self.resolution)
+            # every slot is visited at most once, entries due in skipped ticks are still
+            # found because they are due at or before the tick of their slot.
+            self._tick = max(self._tick, current - len(self._wheel))
+            dead: List[Hashable] = []
+            while self._tick < current:
+                self._tick += 1
+                dead.extend(self._check_slot(now))
+            for key in dead:
+                self._on_change(key, False)
+
+    def _check_slot(self, now: float) -> List[Hashable]:
+        slot = self._wheel[self._tick % len(self._wheel)]
+        due = [k for k in slot if self._scheduled[k] <= self._tick]
+        dead = []
+        for key in due:
+            slot.discard(key)
+            deadline = self._last_seen[key] + self.liveliness
+            if deadline <= now:
+                del self._scheduled[key]
+                dead.append(key)
+            else:
+                self._schedule(key, deadline)
+        return dead
+
+    def _schedule(self, key: Hashable, deadline: float) -> None:
+        tick = math.ceil((deadline - self._start) / self.resolution)
+        # an entity is never scheduled a whole revolution ahead, if the ticks are late it
+        # is checked early and moved again.
+        tick = min(max(tick, self._tick + 1), self._tick + len(self._wheel) - 1)
+        self._scheduled[key] = tick
+        self._wheel[tick % len(self._wheel)].add(key)
+
+    def _now(self) -> float:
+        return self.scheduler.now.timestamp()
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Optional, Tuple
+
+import pydantic
+
+
+class LoopBridgeStats(pydantic.BaseModel):
+    posted: int = 0
+    # number of times the loop was woken up to dispatch the posted items
+    batches: int = 0
+    max_batch_size: int = 0
+
+
+class LoopBridge:
+    """
+    Hands off items from other threads (e.g. the ros spin thread) to an asyncio loop. The
+    callbacks are called on the loop thread in the order the items are posted, so they
+    can use the loop and anything which is not thread safe.
+
+    Items are appended to a deque, which is safe without a lock, and the loop is only woken
+    up when there is no pending wake up, every item posted until then is dispatched in the
+    same batch.
+    """
+
+    def __init__(
+        self,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        *,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.stats = LoopBridgeStats()
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._loop = loop or asyncio.get_event_loop()
+        self._queue: Deque[Tuple[Callable[[Any], Any], Any]] = deque()
+        self._scheduled = False
+
+    def post(self, callback: Callable[[Any], Any], item: Any) -> None:
+        """
+        Calls `callback(item)` on the loop thread, this can be called from any thread.
+        """
+        self._queue.append((callback, item))
+        self.stats.posted += 1
+        # the flag is cleared before the batch is taken, an item appended before the flag
+        # is seen set is always in a batch.
+        if self._scheduled:
+            return
+        self._scheduled = True
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch)
+        except RuntimeError:
+            # the loop is closed, e.g. messages are received while shutting down
+            self._queue.clear()
+
+    def _dispatch(self) -> None:
+        self._scheduled = False
+        # only the items posted until now, so that a high rate of items does not starve
+        # the loop. Items posted while dispatching wake up the loop again.
+        size = len(self._queue)
+        self.stats.batches += 1
+        self.stats.max_batch_size = max(self.stats.max_batch_size, size)
+        for _ in range(size):
+            callback, item = self._queue.popleft()
+            try:
+                callback(item)
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.exception(f"failed to dispatch {type(item).__name__}: {e}")
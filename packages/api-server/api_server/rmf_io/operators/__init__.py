@@ -1,4 +1,4 @@
 from .filter_not_none import filter_not_none
 from .grouped_sample import grouped_sample
-from .health import most_critical
+from .health import get_most_critical, most_critical
 from .heartbeat import heartbeat
@@ -12,6 +12,8 @@ from rmf_task_msgs.msg import ApiRequest, ApiResponse
 from api_server.logger import logger
 from api_server.ros import ros_node as default_ros_node
 
+from .loop_bridge import LoopBridge
+
 
 class RmfService:
     """
@@ -32,6 +34,9 @@ class RmfService:
         self.ros_node = ros_node
         self._logger = logger.getChild(self.__class__.__name__)
         self._requests: Dict[str, Future] = {}
+        # responses are received on the ros thread, the bridge is created on the first
+        # call so that it uses the loop the calls are awaited in.
+        self._bridge: Optional[LoopBridge] = None
         self._api_pub = self.ros_node().create_publisher(
             ApiRequest,
             request_topic,
@@ -45,7 +50,7 @@ class RmfService:
         self._api_sub = self.ros_node().create_subscription(
             ApiResponse,
             response_topic,
-            self._handle_response,
+            self._on_response,
             rclpy.qos.QoSProfile(
                 depth=10,
                 history=rclpy.qos.HistoryPolicy.KEEP_LAST,
@@ -62,6 +67,10 @@ class RmfService:
         self._api_pub.destroy()
 
     async def call(self, payload: str, timeout: float = 5) -> str:
+        if self._bridge is None:
+            self._bridge = LoopBridge(
+                asyncio.get_running_loop(), logger=self._logger.getChild("LoopBridge")
+            )
         req_id = str(uuid4())
         msg = ApiRequest(request_id=req_id, json_msg=payload)
         fut = Future()
@@ -76,6 +85,12 @@ class RmfService:
         finally:
             del self._requests[req_id]
 
+    def _on_response(self, msg: ApiResponse):
+        if self._bridge is None:
+            # there cannot be any pending request before the first call
+            return
+        self._bridge.post(self._handle_response, msg)
+
     def _handle_response(self, msg: ApiResponse):
         self._logger.info(f"got response '{msg.request_id}'")
         self._logger.debug(msg)
@@ -85,6 +100,9 @@ class RmfService:
                 f"Received response for unknown request id: {msg.request_id}"
             )
             return
+        if fut.done():
+            # duplicated response, or the request timed out
+            return
         fut.set_result(msg.json_msg)
 
 
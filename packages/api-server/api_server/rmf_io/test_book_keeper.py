@@ -0,0 +1,276 @@
+import asyncio
+import unittest
+from typing import List, Tuple
+from unittest.mock import patch
+
+from rmf_door_msgs.msg import DoorMode as RmfDoorMode
+
+from api_server.models import DoorHealth, HealthStatus
+from api_server.models import tortoise_models as ttm
+from api_server.test import AppFixture, make_door_state
+
+from .book_keeper import (
+    BoundedWriteQueue,
+    CoalescingStateWriter,
+    HealthHistoryWriter,
+    OverflowPolicy,
+    RmfBookKeeper,
+)
+from .events import RmfEvents
+
+
+class TestCoalescingStateWriter(AppFixture):
+    def test_coalesce_skip_and_flush_on_stop(self):
+        door_name = "test_coalesce_skip_and_flush_on_stop"
+        # long interval so nothing is written until the writer is stopped
+        writer = CoalescingStateWriter(
+            ttm.DoorState, lambda x: x.door_name, {"door_time"}, 3600
+        )
+
+        async def run():
+            await writer.start()
+            writer.put(make_door_state(door_name))
+            writer.put(make_door_state(door_name, RmfDoorMode.MODE_OPEN))
+            self.assertIsNone(await ttm.DoorState.get_or_none(id_=door_name))
+            await writer.flush()
+            db_state = await ttm.DoorState.get(id_=door_name)
+            self.assertEqual(
+                RmfDoorMode.MODE_OPEN, db_state.data["current_mode"]["value"]
+            )
+
+            # only the timestamp changed
+            same = make_door_state(door_name, RmfDoorMode.MODE_OPEN)
+            same.door_time.sec = 100
+            writer.put(same)
+            writer.put(make_door_state(door_name, RmfDoorMode.MODE_CLOSED))
+            await writer.stop()
+            db_state = await ttm.DoorState.get(id_=door_name)
+            self.assertEqual(
+                RmfDoorMode.MODE_CLOSED, db_state.data["current_mode"]["value"]
+            )
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+        self.assertEqual(4, writer.stats.received)
+        self.assertEqual(1, writer.stats.skipped)
+        self.assertEqual(1, writer.stats.coalesced)
+        self.assertEqual(2, writer.stats.written)
+
+    def test_compare_with_state_being_written(self):
+        door_name = "test_compare_with_state_being_written"
+        writer = CoalescingStateWriter(
+            ttm.DoorState, lambda x: x.door_name, {"door_time"}, 3600
+        )
+
+        async def run():
+            await writer.start()
+            writer.put(make_door_state(door_name, RmfDoorMode.MODE_CLOSED))
+            await writer.flush()
+            writer.put(make_door_state(door_name, RmfDoorMode.MODE_OPEN))
+            flush = asyncio.create_task(writer.flush())
+            # let the flush start writing the open state
+            await asyncio.sleep(0)
+            # same as the written state but not as the one being written
+            writer.put(make_door_state(door_name, RmfDoorMode.MODE_CLOSED))
+            await flush
+            await writer.stop()
+            db_state = await ttm.DoorState.get(id_=door_name)
+            self.assertEqual(
+                RmfDoorMode.MODE_CLOSED, db_state.data["current_mode"]["value"]
+            )
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+        self.assertEqual(0, writer.stats.skipped)
+        self.assertEqual(3, writer.stats.written)
+
+    def test_retry_failed_flush(self):
+        door_name = "test_retry_failed_flush"
+        writer = CoalescingStateWriter(
+            ttm.DoorState, lambda x: x.door_name, {"door_time"}, 3600
+        )
+
+        async def run():
+            await writer.start()
+            writer.put(make_door_state(door_name))
+            with patch(
+                "api_server.rmf_io.book_keeper.upsert_many", side_effect=RuntimeError
+            ):
+                with self.assertRaises(RuntimeError):
+                    await writer.flush()
+            self.assertEqual(1, writer.stats.queue_depth)
+            await writer.stop()
+            self.assertIsNotNone(await ttm.DoorState.get_or_none(id_=door_name))
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+        self.assertEqual(1, writer.stats.failed)
+        self.assertEqual(1, writer.stats.written)
+
+    def test_write_through_when_interval_is_0(self):
+        door_name = "test_write_through_when_interval_is_0"
+        events = RmfEvents()
+        book_keeper = RmfBookKeeper(events)
+
+        async def run():
+            await book_keeper.start()
+            events.door_states.on_next(make_door_state(door_name))
+            events.door_states.on_next(make_door_state(door_name))
+            await book_keeper.stop()
+            self.assertIsNotNone(await ttm.DoorState.get_or_none(id_=door_name))
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+        stats = book_keeper.write_stats()["door_state"]
+        self.assertEqual(2, stats.received)
+        self.assertEqual(1, stats.written)
+
+
+class TestHealthHistoryWriter(AppFixture):
+    def test_record_transitions(self):
+        door_name = "test_record_transitions"
+
+        def health(status: HealthStatus, message: str = ""):
+            return DoorHealth(
+                id_=door_name, health_status=status, health_message=message
+            )
+
+        async def transitions():
+            query = ttm.HealthTransition.filter(device_id=door_name).order_by("id")
+            return await query.values_list(
+                "health_status", "health_message", "unix_millis_start"
+            )
+
+        async def run():
+            writer = HealthHistoryWriter()
+            await writer.start()
+            writer.put("door", health(HealthStatus.HEALTHY), 1000)
+            # only the message changed
+            writer.put("door", health(HealthStatus.HEALTHY, "heartbeat"), 2000)
+            writer.put("door", health(HealthStatus.DEAD, "heartbeat failed"), 3000)
+            await writer.stop()
+            self.assertEqual(1, writer.stats.skipped)
+            self.assertEqual(2, writer.stats.written)
+
+            # the last status is loaded again after a restart
+            writer = HealthHistoryWriter()
+            await writer.start()
+            writer.put("door", health(HealthStatus.DEAD), 4000)
+            writer.put("door", health(HealthStatus.HEALTHY), 5000)
+            await writer.stop()
+            self.assertEqual(1, writer.stats.skipped)
+            self.assertEqual(
+                [
+                    ("Healthy", "", 1000),
+                    ("Dead", "heartbeat failed", 3000),
+                    ("Healthy", "", 5000),
+                ],
+                await transitions(),
+            )
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+
+    def test_retry_failed_batch(self):
+        door_name = "test_retry_failed_batch"
+        bulk_create = ttm.HealthTransition.bulk_create
+        calls = []
+
+        async def fail_once(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError("test")
+            return await bulk_create(*args, **kwargs)
+
+        async def run():
+            writer = HealthHistoryWriter(retry_interval=0)
+            await writer.start()
+            with patch.object(ttm.HealthTransition, "bulk_create", fail_once):
+                writer.put(
+                    "door",
+                    DoorHealth(id_=door_name, health_status=HealthStatus.HEALTHY),
+                    1000,
+                )
+                for _ in range(100):
+                    if writer.stats.written:
+                        break
+                    await asyncio.sleep(0.01)
+            await writer.stop()
+            self.assertEqual(1, writer.stats.failed)
+            self.assertEqual(1, writer.stats.written)
+            self.assertEqual(
+                ["Healthy"],
+                await ttm.HealthTransition.filter(device_id=door_name).values_list(
+                    "health_status", flat=True
+                ),
+            )
+
+        assert self.client.portal is not None
+        self.client.portal.call(run)
+
+
+class TestBoundedWriteQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_overflow_and_drain_on_stop(self):
+        release = asyncio.Event()
+        written: List[Tuple[str, int]] = []
+
+        async def write(item: Tuple[str, int]):
+            await release.wait()
+            written.append(item)
+
+        for overflow, expected, coalesced, dropped in [
+            # the second write of "b" replaces the first one and keeps its place
+            (OverflowPolicy.coalesce, [("a", 0), ("b", 2), ("c", 0), ("d", 0)], 1, 0),
+            # "d" does not fit, the oldest queued write is dropped
+            (
+                OverflowPolicy.drop_oldest,
+                [("a", 0), ("c", 0), ("b", 2), ("d", 0)],
+                0,
+                1,
+            ),
+        ]:
+            release.clear()
+            written.clear()
+            queue = BoundedWriteQueue(
+                write,
+                lambda x: x[0],
+                workers=1,
+                max_queue_size=3,
+                overflow=overflow,
+            )
+            await queue.start()
+            queue.put(("a", 0))
+            await asyncio.sleep(0)  # taken by the worker
+            for item in [("b", 1), ("c", 0), ("b", 2), ("d", 0)]:
+                queue.put(item)
+            self.assertEqual(3, queue.stats.queue_depth)
+
+            stop = asyncio.create_task(queue.stop())
+            await asyncio.sleep(0.01)
+            self.assertFalse(stop.done())
+            release.set()
+            await stop
+            self.assertEqual(expected, written)
+            self.assertEqual(coalesced, queue.stats.coalesced)
+            self.assertEqual(dropped, queue.stats.dropped)
+            self.assertEqual(0, queue.stats.queue_depth)
+            self.assertEqual(len(expected), queue.stats.written)
+
+    async def test_errors_do_not_stop_worker(self):
+        async def write(item: int):
+            if item == 0:
+                raise ValueError("bad write")
+
+        queue = BoundedWriteQueue(
+            write,
+            lambda x: x,
+            workers=2,
+            max_queue_size=10,
+            overflow=OverflowPolicy.coalesce,
+        )
+        await queue.start()
+        for i in range(4):
+            queue.put(i)
+        await queue.stop()
+        self.assertEqual(1, queue.stats.failed)
+        self.assertEqual(3, queue.stats.written)
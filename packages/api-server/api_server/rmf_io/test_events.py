@@ -0,0 +1,34 @@
+import unittest
+from typing import List
+
+from .events import KeyedSubject
+
+
+class TestKeyedSubject(unittest.TestCase):
+    def test_by_key(self):
+        subject = KeyedSubject[str](lambda x: x.split(":")[0])
+        all_items: List[str] = []
+        a_items: List[str] = []
+        b_items: List[str] = []
+        subject.subscribe(all_items.append)
+        sub_a = subject.by_key("a").subscribe(a_items.append)
+        subject.by_key("b").subscribe(b_items.append)
+
+        subject.on_next("a:1")
+        subject.on_next("b:1")
+        subject.on_next("c:1")
+        self.assertEqual(["a:1", "b:1", "c:1"], all_items)
+        self.assertEqual(["a:1"], a_items)
+        self.assertEqual(["b:1"], b_items)
+
+        sub_a.dispose()
+        subject.on_next("a:2")
+        self.assertEqual(["a:1"], a_items)
+        self.assertNotIn("a", subject._keyed)  # pylint: disable=protected-access
+
+    def test_completed(self):
+        subject = KeyedSubject[str](lambda x: x)
+        completed = []
+        subject.by_key("a").subscribe(on_completed=lambda: completed.append(True))
+        subject.on_completed()
+        self.assertEqual([True], completed)
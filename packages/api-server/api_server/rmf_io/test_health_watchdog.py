@@ -0,0 +1,116 @@
+from typing import List
+
+from reactivex.scheduler.historicalscheduler import HistoricalScheduler
+from rmf_door_msgs.msg import DoorMode as RmfDoorMode
+
+from api_server.models import DoorHealth, FleetState, HealthStatus, RobotHealth
+from api_server.test import AppFixture, make_door_state
+
+from .events import FleetEvents, RmfEvents
+from .health_watchdog import HealthWatchdog
+
+
+class TestHealthWatchdog(AppFixture):
+    def test_door_health(self):
+        door_name = "test_door_health"
+        events = RmfEvents()
+        scheduler = HistoricalScheduler()
+        watchdog = HealthWatchdog(events, scheduler=scheduler)
+        healths: List[DoorHealth] = []
+        events.door_health.subscribe(
+            lambda x: healths.append(x) if x.id_ == door_name else None
+        )
+        assert self.client.portal is not None
+        self.client.portal.call(watchdog.start)
+
+        def statuses():
+            result = []
+            for health in healths:
+                if not result or result[-1] != health.health_status:
+                    result.append(health.health_status)
+            return result
+
+        events.door_states.on_next(make_door_state(door_name))
+        events.door_states.on_next(make_door_state(door_name, RmfDoorMode.MODE_OFFLINE))
+        self.assertEqual([HealthStatus.HEALTHY, HealthStatus.UNHEALTHY], statuses())
+        self.assertEqual("door is OFFLINE", healths[-1].health_message)
+
+        scheduler.advance_by(HealthWatchdog.LIVELINESS)
+        self.assertEqual(HealthStatus.DEAD, healths[-1].health_status)
+        self.assertEqual("heartbeat failed", healths[-1].health_message)
+
+        events.door_states.on_next(make_door_state(door_name))
+        self.assertEqual(
+            [
+                HealthStatus.HEALTHY,
+                HealthStatus.UNHEALTHY,
+                HealthStatus.DEAD,
+                HealthStatus.HEALTHY,
+            ],
+            statuses(),
+        )
+        self.client.portal.call(watchdog.stop)
+
+    def test_robot_health(self):
+        events = RmfEvents()
+        fleet_events = FleetEvents()
+        scheduler = HistoricalScheduler()
+        watchdog = HealthWatchdog(
+            events, fleet_events=fleet_events, scheduler=scheduler
+        )
+        healths: List[RobotHealth] = []
+        events.robot_health.subscribe(
+            lambda x: healths.append(x) if x.id_ == "test_fleet/robot" else None
+        )
+        assert self.client.portal is not None
+        self.client.portal.call(watchdog.start)
+
+        def send(unix_millis_time: int, **kwargs):
+            robot = {"name": "robot", "unix_millis_time": unix_millis_time, **kwargs}
+            fleet_events.fleet_states.on_next(
+                FleetState(name="test_fleet", robots={"robot": robot})
+            )
+
+        send(1, status="idle", battery=0.5)
+        self.assertEqual(HealthStatus.HEALTHY, healths[-1].health_status)
+
+        # the robot is still sent but its time is not updated
+        scheduler.advance_by(HealthWatchdog.LIVELINESS / 2)
+        send(1, status="idle", battery=0.5)
+        scheduler.advance_by(HealthWatchdog.LIVELINESS / 2 + 1)
+        self.assertEqual(HealthStatus.DEAD, healths[-1].health_status)
+        self.assertEqual("heartbeat failed", healths[-1].health_message)
+
+        send(2, status="error", battery=0.05, issues=[{"category": "stuck"}])
+        self.assertEqual(HealthStatus.UNHEALTHY, healths[-1].health_status)
+        self.assertEqual(
+            "robot is in ERROR; robot has issues: stuck; robot battery is low (5%)",
+            healths[-1].health_message,
+        )
+
+        send(3, status="working", battery=0.5)
+        self.assertEqual(HealthStatus.HEALTHY, healths[-1].health_status)
+        self.client.portal.call(watchdog.stop)
+
+    def test_device_heartbeats(self):
+        door_name = "test_device_heartbeats"
+        events = RmfEvents()
+        scheduler = HistoricalScheduler()
+        watchdog = HealthWatchdog(events, scheduler=scheduler)
+        healths: List[DoorHealth] = []
+        events.door_health.subscribe(
+            lambda x: healths.append(x) if x.id_ == door_name else None
+        )
+        assert self.client.portal is not None
+        self.client.portal.call(watchdog.start)
+
+        events.door_states.on_next(make_door_state(door_name))
+        # unchanged states are dropped by the gateway, only their heartbeat is emitted
+        for _ in range(3):
+            scheduler.advance_by(HealthWatchdog.LIVELINESS / 2)
+            events.device_heartbeats.on_next(("door", door_name))
+        self.assertNotIn(HealthStatus.DEAD, [x.health_status for x in healths])
+
+        scheduler.advance_by(HealthWatchdog.LIVELINESS + 1)
+        self.assertEqual(HealthStatus.DEAD, healths[-1].health_status)
+        self.client.portal.call(watchdog.stop)
@@ -0,0 +1,41 @@
+import unittest
+from types import SimpleNamespace
+
+from .ingress_filter import IngressFilter
+
+
+def msg(door_name: str, mode: int, time: int):
+    return SimpleNamespace(
+        door_name=door_name,
+        door_time=time,
+        current_mode=SimpleNamespace(value=mode),
+    )
+
+
+class TestIngressFilter(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.ingress = IngressFilter(
+            lambda x: x.door_name, ("current_mode",), 10, clock=lambda: self.now
+        )
+
+    def test_changed(self):
+        ingress = self.ingress
+        self.assertTrue(ingress.changed(msg("door_1", 0, 0)))
+        # only the timestamp changed
+        self.assertFalse(ingress.changed(msg("door_1", 0, 1)))
+        self.assertTrue(ingress.changed(msg("door_2", 0, 1)))
+        self.assertTrue(ingress.changed(msg("door_1", 2, 2)))
+        self.assertFalse(ingress.changed(msg("door_1", 2, 3)))
+        self.assertEqual(5, ingress.stats.received)
+        self.assertEqual(2, ingress.stats.unchanged)
+
+    def test_resend_unchanged(self):
+        self.assertTrue(self.ingress.changed(msg("door_1", 0, 0)))
+        self.now = 9
+        self.assertFalse(self.ingress.changed(msg("door_1", 0, 9)))
+        # let through again after the resend interval
+        self.now = 10
+        self.assertTrue(self.ingress.changed(msg("door_1", 0, 10)))
+        self.now = 11
+        self.assertFalse(self.ingress.changed(msg("door_1", 0, 11)))
@@ -0,0 +1,28 @@
+import unittest
+from uuid import uuid4
+
+from api_server.test.test_data import make_building_map, make_door_state
+
+from .events import RmfEvents
+from .latest_states import CachedBuildingMap, LatestStates
+
+
+class TestLatestStates(unittest.TestCase):
+    def test_stores_latest(self):
+        events = RmfEvents()
+        latest = LatestStates(events)
+        door_name = f"test_{uuid4()}"
+        first = make_door_state(door_name)
+        second = make_door_state(door_name)
+        events.door_states.on_next(first)
+        events.door_states.on_next(second)
+        self.assertIs(second, latest.door_states[door_name])
+        self.assertEqual(1, len(latest.door_states))
+
+
+class TestCachedBuildingMap(unittest.TestCase):
+    def test_name_indexes(self):
+        cached = CachedBuildingMap(make_building_map())
+        self.assertEqual(["L1"], list(cached.levels_by_name))
+        self.assertIs(cached.doors[0], cached.doors_by_name["test_door"])
+        self.assertIs(cached.building_map.lifts[0], cached.lifts_by_name["test_lift"])
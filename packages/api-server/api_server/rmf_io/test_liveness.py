@@ -0,0 +1,81 @@
+import threading
+import time
+import unittest
+from typing import Hashable, List, Tuple
+
+from reactivex.scheduler.historicalscheduler import HistoricalScheduler
+
+from .liveness import LivenessMonitor
+
+
+class TestLivenessMonitor(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = HistoricalScheduler()
+        self.changes: List[Tuple[Hashable, bool]] = []
+        self.monitor = LivenessMonitor(
+            10,
+            lambda key, alive: self.changes.append((key, alive)),
+            scheduler=self.scheduler,
+        )
+        self.monitor.start()
+
+    def test_dead_after_liveliness(self):
+        self.monitor.beat("a")
+        self.monitor.beat("a")
+        self.assertEqual([("a", True)], self.changes)
+
+        self.scheduler.advance_by(5)
+        self.monitor.beat("a")
+        self.scheduler.advance_by(9)
+        self.assertTrue(self.monitor.is_alive("a"))
+        # dead 10 seconds after the last beat
+        self.scheduler.advance_by(1)
+        self.assertFalse(self.monitor.is_alive("a"))
+        self.assertEqual([("a", True), ("a", False)], self.changes)
+
+        self.monitor.beat("a")
+        self.assertEqual([("a", True), ("a", False), ("a", True)], self.changes)
+
+    def test_many_entities(self):
+        for i in range(100):
+            self.monitor.beat(i)
+        for _ in range(20):
+            self.scheduler.advance_by(1)
+            # keep the even entities alive
+            for i in range(0, 100, 2):
+                self.monitor.beat(i)
+        dead = [key for key, alive in self.changes if not alive]
+        self.assertEqual(list(range(1, 100, 2)), sorted(dead))
+        self.assertEqual(100, len(self.monitor))
+
+    def test_late_ticks(self):
+        self.monitor.stop()
+        self.monitor.beat("a")
+        # the timer did not run for more than a revolution of the wheel
+        self.scheduler.advance_by(100)
+        self.monitor.beat("b")
+        self.monitor.check()
+        self.assertEqual([("a", True), ("b", True), ("a", False)], self.changes)
+        self.scheduler.advance_by(11)
+        self.monitor.check()
+        self.assertEqual(("b", False), self.changes[-1])
+
+    def test_beat_while_reporting_dead(self):
+        beats: List[threading.Thread] = []
+
+        def on_change(key: Hashable, alive: bool):
+            if not alive:
+                # a beat from another thread while the death is being reported
+                beats.append(threading.Thread(target=self.monitor.beat, args=(key,)))
+                beats[0].start()
+                time.sleep(0.05)
+            self.changes.append((key, alive))
+
+        self.monitor.stop()
+        self.monitor = LivenessMonitor(10, on_change, scheduler=self.scheduler)
+        self.monitor.start()
+        self.monitor.beat("a")
+        self.scheduler.advance_by(11)
+        beats[0].join()
+        self.assertEqual([("a", True), ("a", False), ("a", True)], self.changes)
+        self.assertTrue(self.monitor.is_alive("a"))
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import unittest
+from typing import List, Tuple
+
+from .loop_bridge import LoopBridge
+
+
+class TestLoopBridge(unittest.IsolatedAsyncioTestCase):
+    async def test_dispatch_in_batches_on_loop(self):
+        bridge = LoopBridge(asyncio.get_running_loop())
+        received: List[Tuple[int, threading.Thread]] = []
+        done = asyncio.Event()
+
+        def on_item(item: int):
+            received.append((item, threading.current_thread()))
+            if item == 999:
+                done.set()
+
+        def post_all():
+            for i in range(1000):
+                bridge.post(on_item, i)
+
+        # the loop is blocked while the items are posted, they are dispatched in one batch
+        thread = threading.Thread(target=post_all)
+        thread.start()
+        thread.join()
+        await asyncio.wait_for(done.wait(), 1)
+        self.assertEqual(list(range(1000)), [x for x, _ in received])
+        self.assertTrue(all(t is threading.main_thread() for _, t in received))
+        self.assertEqual(1000, bridge.stats.posted)
+        self.assertEqual(1, bridge.stats.batches)
+        self.assertEqual(1000, bridge.stats.max_batch_size)
+
+    async def test_errors_do_not_stop_dispatch(self):
+        bridge = LoopBridge(asyncio.get_running_loop())
+        received: List[int] = []
+
+        def on_item(item: int):
+            if item == 0:
+                raise ValueError("bad item")
+            received.append(item)
+
+        for i in range(3):
+            bridge.post(on_item, i)
+        await asyncio.sleep(0)
+        self.assertEqual([1, 2], received)
@@ -1,6 +1,6 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, cast
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel
 from tortoise.exceptions import IntegrityError
 from tortoise.transactions import in_transaction
@@ -8,8 +8,17 @@ from tortoise.transactions import in_transaction
 import api_server.models.tortoise_models as ttm
 from api_server.authenticator import user_dep
 from api_server.dependencies import pagination_query
+from api_server.fast_io import ConnectionStats, FastIO
+from api_server.gateway import rmf_gateway
 from api_server.models import Pagination, Permission, User
 from api_server.repositories.rmf import RmfRepository, rmf_repo_dep
+from api_server.rmf_io import (
+    IngressFilterStats,
+    LoopBridgeStats,
+    StateWriteStats,
+    rmf_bookkeeper,
+)
+from api_server.routes.internal import IngestionStats, ingestion_pipeline
 
 
 class PostUsers(BaseModel):
@@ -204,3 +213,47 @@ async def remove_role_permission(role: str, permission: Permission):
     )
     if perm:
         await perm.delete()
+
+
+@router.get("/stats/ingestion", response_model=IngestionStats)
+async def get_ingestion_stats():
+    """
+    Get the queue depths and backpressure counters of the internal websocket
+    """
+    return ingestion_pipeline.stats
+
+
+@router.get("/stats/connections", response_model=List[ConnectionStats])
+async def get_connection_stats(request: Request):
+    """
+    Get the outbound queue depths and the conflated and dropped counters of the
+    socket.io connections
+    """
+    return cast(FastIO, request.app).connection_stats()
+
+
+@router.get("/stats/bookkeeper", response_model=Dict[str, StateWriteStats])
+async def get_bookkeeper_stats():
+    """
+    Get the queue depths, counters and write latencies of the building map and the door,
+    lift, dispenser and ingestor states and healths
+    """
+    return rmf_bookkeeper.write_stats()
+
+
+@router.get("/stats/ros_bridge", response_model=LoopBridgeStats)
+async def get_ros_bridge_stats():
+    """
+    Get the number of ros messages handed off to the event loop and the number of
+    batches they were dispatched in
+    """
+    return rmf_gateway().bridge.stats
+
+
+@router.get("/stats/ros_ingress", response_model=Dict[str, IngressFilterStats])
+async def get_ros_ingress_stats():
+    """
+    Get the number of door, lift, dispenser and ingestor states received from ros, and
+    how many of them were dropped because they did not change
+    """
+    return {name: x.stats for name, x in rmf_gateway().ingress.items()}
@@ -1,4 +1,4 @@
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request, Response
 from reactivex import operators as rxops
 
 from api_server.fast_io import FastIORouter, SubscriptionRequest
@@ -9,17 +9,32 @@ from api_server.rmf_io import rmf_events
 router = FastIORouter(tags=["Building"])
 
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
 @router.get("", response_model=BuildingMap)
-async def get_building_map(rmf_repo: RmfRepository = Depends(rmf_repo_dep)):
+async def get_building_map(
+    request: Request, rmf_repo: RmfRepository = Depends(rmf_repo_dep)
+):
     """
     Available in socket.io
     """
-    building_map = await rmf_repo.get_bulding_map()
-    if building_map is None:
+    cached = await rmf_repo.get_cached_building_map()
+    if cached is None:
         raise HTTPException(status_code=404)
-    return building_map
+    headers = {"ETag": cached.etag}
+    if _etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.json, media_type="application/json", headers=headers)
 
 
-@router.sub("", response_model=BuildingMap)
+@router.sub("", response_model=BuildingMap, conflate=True)
 def sub_building_map(_req: SubscriptionRequest):
     return rmf_events.building_map.pipe(rxops.filter(lambda x: x is not None))
@@ -1,12 +1,21 @@
-from typing import List
+from typing import List, Optional, Tuple
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
 from reactivex import operators as rxops
 
-from api_server.dependencies import sio_user
-from api_server.fast_io import FastIORouter, SubscriptionRequest
-from api_server.models import Dispenser, DispenserHealth, DispenserState
-from api_server.repositories import RmfRepository, rmf_repo_dep
+from api_server.dependencies import between_query, sio_user
+from api_server.fast_io import FastIORouter, SubscriptionRequest, conflate_single
+from api_server.models import (
+    Dispenser,
+    DispenserHealth,
+    DispenserState,
+    HealthAvailability,
+)
+from api_server.repositories import (
+    RmfRepository,
+    query_health_availability,
+    rmf_repo_dep,
+)
 from api_server.rmf_io import rmf_events
 
 router = FastIORouter(tags=["Dispensers"])
@@ -30,10 +39,27 @@ async def get_dispenser_state(
     return dispenser_state
 
 
-@router.sub("/{guid}/state", response_model=DispenserState)
+@router.sub(
+    "/*/state",
+    response_model=List[DispenserState],
+    conflate=conflate_single(lambda x: x.guid),
+)
+async def sub_all_dispenser_states(req: SubscriptionRequest):
+    """
+    The first message is the current states of all dispensers, the following messages
+    contain one updated state.
+    """
+    user = sio_user(req)
+    states = await RmfRepository(user).get_all_dispenser_states()
+    return rmf_events.dispenser_states.pipe(
+        rxops.map(lambda x: [x]), rxops.start_with(states)
+    )
+
+
+@router.sub("/{guid}/state", response_model=DispenserState, conflate=True)
 async def sub_dispenser_state(req: SubscriptionRequest, guid: str):
     user = sio_user(req)
-    obs = rmf_events.dispenser_states.pipe(rxops.filter(lambda x: x.guid == guid))
+    obs = rmf_events.dispenser_states.by_key(guid)
     dispenser_state = await get_dispenser_state(guid, RmfRepository(user))
     if dispenser_state:
         return obs.pipe(rxops.start_with(dispenser_state))
@@ -53,11 +79,40 @@ async def get_dispenser_health(
     return dispenser_health
 
 
-@router.sub("/{guid}/health", response_model=DispenserHealth)
+@router.sub(
+    "/*/health",
+    response_model=List[DispenserHealth],
+    conflate=conflate_single(lambda x: x.id_),
+)
+async def sub_all_dispenser_health(req: SubscriptionRequest):
+    """
+    The first message is the current health of all dispensers, the following messages
+    contain one updated health.
+    """
+    user = sio_user(req)
+    health = await RmfRepository(user).get_all_dispenser_health()
+    return rmf_events.dispenser_health.pipe(
+        rxops.map(lambda x: [x]), rxops.start_with(health)
+    )
+
+
+@router.sub("/{guid}/health", response_model=DispenserHealth, conflate=True)
 async def sub_dispenser_health(req: SubscriptionRequest, guid: str):
     user = sio_user(req)
-    obs = rmf_events.dispenser_health.pipe(rxops.filter(lambda x: x.id_ == guid))
+    obs = rmf_events.dispenser_health.by_key(guid)
     health = await get_dispenser_health(guid, RmfRepository(user))
     if health:
         return obs.pipe(rxops.start_with(health))
     return obs
+
+
+@router.get("/availability", response_model=List[HealthAvailability])
+async def get_dispensers_availability(
+    between: Tuple[int, int] = Depends(between_query),
+    guid: Optional[str] = Query(None, description="only query this dispenser"),
+):
+    """
+    Availability, downtime and mean time between failures of each dispenser in a period,
+    computed from the history of dispenser health transitions.
+    """
+    return await query_health_availability("dispenser", between, guid)
@@ -1,13 +1,23 @@
-from typing import List
+from typing import List, Optional, Tuple
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
 from reactivex import operators as rxops
 
-from api_server.dependencies import sio_user
-from api_server.fast_io import FastIORouter, SubscriptionRequest
+from api_server.dependencies import between_query, sio_user
+from api_server.fast_io import FastIORouter, SubscriptionRequest, conflate_single
 from api_server.gateway import rmf_gateway
-from api_server.models import Door, DoorHealth, DoorRequest, DoorState
-from api_server.repositories import RmfRepository, rmf_repo_dep
+from api_server.models import (
+    Door,
+    DoorHealth,
+    DoorRequest,
+    DoorState,
+    HealthAvailability,
+)
+from api_server.repositories import (
+    RmfRepository,
+    query_health_availability,
+    rmf_repo_dep,
+)
 from api_server.rmf_io import rmf_events
 
 router = FastIORouter(tags=["Doors"])
@@ -31,10 +41,27 @@ async def get_door_state(
     return door_state
 
 
-@router.sub("/{door_name}/state", response_model=DoorState)
+@router.sub(
+    "/*/state",
+    response_model=List[DoorState],
+    conflate=conflate_single(lambda x: x.door_name),
+)
+async def sub_all_door_states(req: SubscriptionRequest):
+    """
+    The first message is the current states of all doors, the following messages
+    contain one updated state.
+    """
+    user = sio_user(req)
+    states = await RmfRepository(user).get_all_door_states()
+    return rmf_events.door_states.pipe(
+        rxops.map(lambda x: [x]), rxops.start_with(states)
+    )
+
+
+@router.sub("/{door_name}/state", response_model=DoorState, conflate=True)
 async def sub_door_state(req: SubscriptionRequest, door_name: str):
     user = sio_user(req)
-    obs = rmf_events.door_states.pipe(rxops.filter(lambda x: x.door_name == door_name))
+    obs = rmf_events.door_states.by_key(door_name)
     door_state = await get_door_state(door_name, RmfRepository(user))
     if door_state:
         return obs.pipe(rxops.start_with(door_state))
@@ -54,19 +81,51 @@ async def get_door_health(
     return door_health
 
 
-@router.sub("/{door_name}/health", response_model=DoorHealth)
+@router.sub(
+    "/*/health",
+    response_model=List[DoorHealth],
+    conflate=conflate_single(lambda x: x.id_),
+)
+async def sub_all_door_health(req: SubscriptionRequest):
+    """
+    The first message is the current health of all doors, the following messages
+    contain one updated health.
+    """
+    user = sio_user(req)
+    health = await RmfRepository(user).get_all_door_health()
+    return rmf_events.door_health.pipe(
+        rxops.map(lambda x: [x]), rxops.start_with(health)
+    )
+
+
+@router.sub("/{door_name}/health", response_model=DoorHealth, conflate=True)
 async def sub_door_health(req: SubscriptionRequest, door_name: str):
     user = sio_user(req)
-    obs = rmf_events.door_health.pipe(rxops.filter(lambda x: x.id_ == door_name))
+    obs = rmf_events.door_health.by_key(door_name)
     health = await get_door_health(door_name, RmfRepository(user))
     if health:
         return obs.pipe(rxops.start_with(health))
     return obs
 
 
+@router.get("/availability", response_model=List[HealthAvailability])
+async def get_doors_availability(
+    between: Tuple[int, int] = Depends(between_query),
+    door_name: Optional[str] = Query(None, description="only query this door"),
+):
+    """
+    Availability, downtime and mean time between failures of each door in a period,
+    computed from the history of door health transitions.
+    """
+    return await query_health_availability("door", between, door_name)
+
+
 @router.post("/{door_name}/request")
-def post_door_request(
+async def post_door_request(
     door_name: str,
     door_request: DoorRequest,
+    rmf_repo: RmfRepository = Depends(rmf_repo_dep),
 ):
+    if await rmf_repo.get_door(door_name) is None:
+        raise HTTPException(status_code=404)
     rmf_gateway().request_door(door_name, door_request.mode)
@@ -1,12 +1,17 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
 from reactivex import operators as rxops
 
 from api_server.dependencies import between_query, sio_user
-from api_server.fast_io import FastIORouter, SubscriptionRequest
-from api_server.models import FleetLog, FleetState
-from api_server.repositories import FleetRepository, fleet_repo_dep
+from api_server.fast_io import FastIORouter, SubscriptionRequest, conflate_single
+from api_server.models import FleetLog, FleetState, HealthAvailability
+from api_server.repositories import (
+    FleetRepository,
+    fleet_repo_dep,
+    query_health_availability,
+)
+from api_server.response import NDJSONResponse, RawJSONResponse, json_array
 from api_server.rmf_io import fleet_events
 
 router = FastIORouter(tags=["Fleets"])
@@ -16,7 +21,34 @@ router = FastIORouter(tags=["Fleets"])
 async def get_fleets(
     repo: FleetRepository = Depends(fleet_repo_dep),
 ):
-    return await repo.get_all_fleets()
+    return RawJSONResponse(json_array(await repo.get_all_fleets_raw()))
+
+
+@router.get("/export/logs", response_class=NDJSONResponse)
+async def export_fleet_logs(
+    repo: FleetRepository = Depends(fleet_repo_dep),
+    between: Tuple[int, int] = Depends(between_query),
+    gzip: bool = Query(False, description="compress the response with gzip"),
+):
+    """
+    Streams the log entries of all fleets in a period as newline delimited json, each
+    entry has the `fleet` and `robot` it belongs to.
+    """
+    return NDJSONResponse(repo.export_fleet_logs(between), gzip=gzip)
+
+
+@router.get("/robots/availability", response_model=List[HealthAvailability])
+async def get_robots_availability(
+    between: Tuple[int, int] = Depends(between_query),
+    robot: Optional[str] = Query(
+        None, description='only query this robot, as "<fleet>/<robot>"'
+    ),
+):
+    """
+    Availability, downtime and mean time between failures of each robot in a period,
+    computed from the history of robot health transitions.
+    """
+    return await query_health_availability("robot", between, robot)
 
 
 @router.get("/{name}/state", response_model=FleetState)
@@ -24,17 +56,34 @@ async def get_fleet_state(name: str, repo: FleetRepository = Depends(fleet_repo_
     """
     Available in socket.io
     """
-    fleet_state = await repo.get_fleet_state(name)
+    fleet_state = await repo.get_fleet_state_raw(name)
     if fleet_state is None:
         raise HTTPException(status_code=404)
-    return fleet_state
+    return RawJSONResponse(fleet_state)
+
+
+@router.sub(
+    "/*/state",
+    response_model=List[FleetState],
+    conflate=conflate_single(lambda x: x.name),
+)
+async def sub_all_fleet_states(req: SubscriptionRequest):
+    """
+    The first message is the current states of all fleets, the following messages
+    contain one updated state.
+    """
+    user = sio_user(req)
+    fleet_states = await FleetRepository(user).get_all_fleets()
+    return fleet_events.fleet_states.pipe(
+        rxops.map(lambda x: [x]), rxops.start_with(fleet_states)
+    )
 
 
-@router.sub("/{name}/state", response_model=FleetState)
+@router.sub("/{name}/state", response_model=FleetState, conflate=True)
 async def sub_fleet_state(req: SubscriptionRequest, name: str):
     user = sio_user(req)
     repo = FleetRepository(user)
-    obs = fleet_events.fleet_states.pipe(rxops.filter(lambda x: x.name == name))
+    obs = fleet_events.fleet_states.by_key(name)
     fleet_state = await repo.get_fleet_state(name)
     if fleet_state:
         return obs.pipe(rxops.start_with(fleet_state))
@@ -58,4 +107,4 @@ async def get_fleet_log(
 
 @router.sub("/{name}/log", response_model=FleetLog)
 async def sub_fleet_log(_req: SubscriptionRequest, name: str):
-    return fleet_events.fleet_logs.pipe(rxops.filter(lambda x: x.name == name))
+    return fleet_events.fleet_logs.by_key(name)
@@ -1,12 +1,21 @@
-from typing import List
+from typing import List, Optional, Tuple
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
 from reactivex import operators as rxops
 
-from api_server.dependencies import sio_user
-from api_server.fast_io import FastIORouter, SubscriptionRequest
-from api_server.models import Ingestor, IngestorHealth, IngestorState
-from api_server.repositories import RmfRepository, rmf_repo_dep
+from api_server.dependencies import between_query, sio_user
+from api_server.fast_io import FastIORouter, SubscriptionRequest, conflate_single
+from api_server.models import (
+    HealthAvailability,
+    Ingestor,
+    IngestorHealth,
+    IngestorState,
+)
+from api_server.repositories import (
+    RmfRepository,
+    query_health_availability,
+    rmf_repo_dep,
+)
 from api_server.rmf_io import rmf_events
 
 router = FastIORouter(tags=["Ingestors"])
@@ -30,10 +39,27 @@ async def get_ingestor_state(
     return ingestor_state
 
 
-@router.sub("/{guid}/state", response_model=IngestorState)
+@router.sub(
+    "/*/state",
+    response_model=List[IngestorState],
+    conflate=conflate_single(lambda x: x.guid),
+)
+async def sub_all_ingestor_states(req: SubscriptionRequest):
+    """
+    The first message is the current states of all ingestors, the following messages
+    contain one updated state.
+    """
+    user = sio_user(req)
+    states = await RmfRepository(user).get_all_ingestor_states()
+    return rmf_events.ingestor_states.pipe(
+        rxops.map(lambda x: [x]), rxops.start_with(states)
+    )
+
+
+@router.sub("/{guid}/state", response_model=IngestorState, conflate=True)
 async def sub_ingestor_state(req: SubscriptionRequest, guid: str):
     user = sio_user(req)
-    obs = rmf_events.ingestor_states.pipe(rxops.filter(lambda x: x.guid == guid))
+    obs = rmf_events.ingestor_states.by_key(guid)
     ingestor_state = await get_ingestor_state(guid, RmfRepository(user))
     if ingestor_state:
         return obs.pipe(rxops.start_with(ingestor_state))
@@ -53,11 +79,40 @@ async def get_ingestor_health(
     return ingestor_health
 
 
-@router.sub("/{guid}/health", response_model=IngestorHealth)
+@router.sub(
+    "/*/health",
+    response_model=List[IngestorHealth],
+    conflate=conflate_single(lambda x: x.id_),
+)
+async def sub_all_ingestor_health(req: SubscriptionRequest):
+    """
+    The first message is the current health of all ingestors, the following messages
+    contain one updated health.
+    """
+    user = sio_user(req)
+    health = await RmfRepository(user).get_all_ingestor_health()
+    return rmf_events.ingestor_health.pipe(
+        rxops.map(lambda x: [x]), rxops.start_with(health)
+    )
+
+
+@router.sub("/{guid}/health", response_model=IngestorHealth, conflate=True)
 async def sub_ingestor_health(req: SubscriptionRequest, guid: str):
     user = sio_user(req)
-    obs = rmf_events.ingestor_health.pipe(rxops.filter(lambda x: x.id_ == guid))
+    obs = rmf_events.ingestor_health.by_key(guid)
     health = await get_ingestor_health(guid, RmfRepository(user))
     if health:
         return obs.pipe(rxops.start_with(health))
     return obs
+
+
+@router.get("/availability", response_model=List[HealthAvailability])
+async def get_ingestors_availability(
+    between: Tuple[int, int] = Depends(between_query),
+    guid: Optional[str] = Query(None, description="only query this ingestor"),
+):
+    """
+    Availability, downtime and mean time between failures of each ingestor in a period,
+    computed from the history of ingestor health transitions.
+    """
+    return await query_health_availability("ingestor", between, guid)
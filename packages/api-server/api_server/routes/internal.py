@@ -1,16 +1,30 @@
 # NOTE: This will eventually replace `gateway.py``
-from typing import Any, Dict
+import asyncio
+import json
+import json.decoder
+import logging
+import re
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, TypeVar
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
 
 from api_server import models as mdl
+from api_server.app_config import app_config
 from api_server.logger import logger as base_logger
-from api_server.repositories import AlertRepository, FleetRepository, TaskRepository
+from api_server.repositories import (
+    AlertRepository,
+    FleetRepository,
+    TaskRepository,
+    fleet_state_write_behind,
+)
 from api_server.rmf_io import alert_events, fleet_events, task_events
 
 router = APIRouter(tags=["_internal"])
 logger = base_logger.getChild("RmfGatewayApp")
 user: mdl.User = mdl.User(username="__rmf_internal__", is_admin=True)
+trusted_source = app_config.internal_trusted_source
 task_repo = TaskRepository(user)
 alert_repo = AlertRepository(user, task_repo)
 
@@ -41,6 +55,50 @@ def task_log_has_error(task_log: mdl.TaskEventLog) -> bool:
     return False
 
 
+_json_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+def decode_trusted_msg(raw: str) -> Dict[str, Any]:
+    """
+    Decodes a message from a trusted source. Every value in the message is parsed only once,
+    the json text of the "data" field is also kept in the "raw_data" field so it can be
+    stored without serializing it again.
+    """
+
+    def skip_whitespace(idx: int) -> int:
+        return _whitespace.match(raw, idx).end()  # type: ignore
+
+    def expect(idx: int, char: str) -> int:
+        if raw[idx : idx + 1] != char:
+            raise ValueError(f"expected '{char}' at position {idx}")
+        return idx + 1
+
+    msg: Dict[str, Any] = {}
+    idx = skip_whitespace(expect(skip_whitespace(0), "{"))
+    if raw[idx : idx + 1] == "}":
+        return msg
+    while True:
+        key, idx = json.decoder.scanstring(raw, expect(idx, '"'))
+        start = skip_whitespace(expect(skip_whitespace(idx), ":"))
+        msg[key], idx = _json_decoder.raw_decode(raw, start)
+        if key == "data":
+            msg["raw_data"] = raw[start:idx]
+        idx = skip_whitespace(idx)
+        if raw[idx : idx + 1] == "}":
+            return msg
+        idx = skip_whitespace(expect(idx, ","))
+
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def parse_data(msg: Dict[str, Any], model: Type[ModelT]) -> ModelT:
+    if trusted_source:
+        return mdl.construct_model(model, msg["data"])
+    return model(**msg["data"])
+
+
 async def process_msg(msg: Dict[str, Any], fleet_repo: FleetRepository) -> None:
     if "type" not in msg:
         logger.warn(msg)
@@ -51,10 +109,11 @@ async def process_msg(msg: Dict[str, Any], fleet_repo: FleetRepository) -> None:
         logger.warn("error processing message, 'type' must be a string")
         return
     logger.debug(msg)
+    raw_data: Optional[str] = msg.get("raw_data") if trusted_source else None
 
     if payload_type == "task_state_update":
-        task_state = mdl.TaskState(**msg["data"])
-        await task_repo.save_task_state(task_state)
+        task_state = parse_data(msg, mdl.TaskState)
+        await task_repo.save_task_state(task_state, raw_data)
         task_events.task_states.on_next(task_state)
 
         if task_state.status == mdl.Status.completed:
@@ -63,7 +122,7 @@ async def process_msg(msg: Dict[str, Any], fleet_repo: FleetRepository) -> None:
                 alert_events.alerts.on_next(alert)
 
     elif payload_type == "task_log_update":
-        task_log = mdl.TaskEventLog(**msg["data"])
+        task_log = parse_data(msg, mdl.TaskEventLog)
         await task_repo.save_task_log(task_log)
         task_events.task_event_logs.on_next(task_log)
 
@@ -73,23 +132,157 @@ async def process_msg(msg: Dict[str, Any], fleet_repo: FleetRepository) -> None:
                 alert_events.alerts.on_next(alert)
 
     elif payload_type == "fleet_state_update":
-        fleet_state = mdl.FleetState(**msg["data"])
-        await fleet_repo.save_fleet_state(fleet_state)
+        fleet_state = parse_data(msg, mdl.FleetState)
         fleet_events.fleet_states.on_next(fleet_state)
+        await fleet_state_write_behind.put(fleet_state, raw_data)
 
     elif payload_type == "fleet_log_update":
-        fleet_log = mdl.FleetLog(**msg["data"])
+        fleet_log = parse_data(msg, mdl.FleetLog)
         await fleet_repo.save_fleet_log(fleet_log)
         fleet_events.fleet_logs.on_next(fleet_log)
 
 
+def msg_key(msg: Dict[str, Any]) -> str:
+    """
+    Returns the key which the processing order of a message must be kept in, the task id
+    for task updates and the fleet name for fleet updates.
+    """
+    data = msg.get("data")
+    if not isinstance(data, dict):
+        return ""
+    payload_type = msg.get("type")
+    if payload_type == "task_state_update":
+        booking = data.get("booking")
+        return str(booking.get("id")) if isinstance(booking, dict) else ""
+    if payload_type == "task_log_update":
+        return str(data.get("task_id"))
+    return str(data.get("name"))
+
+
+class IngestionStats(BaseModel):
+    workers: int
+    max_queue_size: int
+    queue_depths: List[int]
+    received: int
+    processed: int
+    failed: int
+    blocked: int
+
+
+class IngestionPipeline:
+    """
+    Decouples receiving messages from processing them. Messages are sharded to a fixed
+    number of workers by `msg_key`, so messages with the same key are processed in the order
+    they are received while messages of different keys are processed concurrently.
+
+    Each worker has a bounded queue, when it is full, `put` waits for space, which in turn
+    stops the websocket from being read and applies backpressure to the sender.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[Dict[str, Any]], Awaitable[None]],
+        *,
+        workers: int,
+        max_queue_size: int,
+        pipeline_logger: Optional[logging.Logger] = None,
+    ):
+        self.process = process
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.logger = pipeline_logger or logging.getLogger(self.__class__.__name__)
+        self._queues: List[asyncio.Queue] = []
+        self._worker_tasks: List[asyncio.Task] = []
+        self._received = 0
+        self._processed = 0
+        self._failed = 0
+        self._blocked = 0
+
+    @property
+    def stats(self) -> IngestionStats:
+        return IngestionStats(
+            workers=self.workers,
+            max_queue_size=self.max_queue_size,
+            queue_depths=[q.qsize() for q in self._queues],
+            received=self._received,
+            processed=self._processed,
+            failed=self._failed,
+            blocked=self._blocked,
+        )
+
+    async def put(self, msg: Dict[str, Any]) -> None:
+        self._received += 1
+        if not self._queues:
+            await self._process(msg)
+            return
+        queue = self._queues[hash(msg_key(msg)) % len(self._queues)]
+        if queue.full():
+            self._blocked += 1
+            self.logger.debug("ingestion queue is full, waiting for space")
+        await queue.put(msg)
+
+    async def start(self) -> None:
+        if self.workers <= 0 or self._queues:
+            return
+        self._queues = [
+            asyncio.Queue(maxsize=self.max_queue_size) for _ in range(self.workers)
+        ]
+        self._worker_tasks = [asyncio.create_task(self._spin(q)) for q in self._queues]
+
+    async def stop(self) -> None:
+        """
+        Waits for all queued messages to be processed and stops the workers.
+        """
+        queues = self._queues
+        # new messages are processed inline from now on
+        self._queues = []
+        for q in queues:
+            await q.join()
+        for t in self._worker_tasks:
+            t.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def _process(self, msg: Dict[str, Any]) -> None:
+        try:
+            await self.process(msg)
+            self._processed += 1
+        except Exception as e:  # pylint: disable=broad-except
+            self._failed += 1
+            self.logger.error(f"failed to process message: {type(e).__name__}:{e}")
+
+    async def _spin(self, queue: asyncio.Queue) -> None:
+        while True:
+            msg = await queue.get()
+            try:
+                await self._process(msg)
+            finally:
+                queue.task_done()
+
+
+ingestion_pipeline = IngestionPipeline(
+    partial(process_msg, fleet_repo=FleetRepository(user)),
+    workers=app_config.internal_ingestion_workers,
+    max_queue_size=app_config.internal_ingestion_queue_size,
+    pipeline_logger=logger.getChild("IngestionPipeline"),
+)
+
+
 @router.websocket("")
 async def rmf_gateway(websocket: WebSocket):
     await websocket.accept()
-    fleet_repo = FleetRepository(user)
     try:
         while True:
-            msg: Dict[str, Any] = await websocket.receive_json()
-            await process_msg(msg, fleet_repo)
+            msg: Dict[str, Any]
+            if trusted_source:
+                raw = await websocket.receive_text()
+                try:
+                    msg = decode_trusted_msg(raw)
+                except ValueError as e:
+                    logger.warning(f"Ignoring message, invalid json: {e}")
+                    continue
+            else:
+                msg = await websocket.receive_json()
+            await ingestion_pipeline.put(msg)
     except WebSocketDisconnect:
         pass
@@ -1,13 +1,23 @@
-from typing import List
+from typing import List, Optional, Tuple
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
 from reactivex import operators as rxops
 
-from api_server.dependencies import sio_user
-from api_server.fast_io import FastIORouter, SubscriptionRequest
+from api_server.dependencies import between_query, sio_user
+from api_server.fast_io import FastIORouter, SubscriptionRequest, conflate_single
 from api_server.gateway import rmf_gateway
-from api_server.models import Lift, LiftHealth, LiftRequest, LiftState
-from api_server.repositories import RmfRepository, rmf_repo_dep
+from api_server.models import (
+    HealthAvailability,
+    Lift,
+    LiftHealth,
+    LiftRequest,
+    LiftState,
+)
+from api_server.repositories import (
+    RmfRepository,
+    query_health_availability,
+    rmf_repo_dep,
+)
 from api_server.rmf_io import rmf_events
 
 router = FastIORouter(tags=["Lifts"])
@@ -31,10 +41,27 @@ async def get_lift_state(
     return lift_state
 
 
-@router.sub("/{lift_name}/state", response_model=LiftState)
+@router.sub(
+    "/*/state",
+    response_model=List[LiftState],
+    conflate=conflate_single(lambda x: x.lift_name),
+)
+async def sub_all_lift_states(req: SubscriptionRequest):
+    """
+    The first message is the current states of all lifts, the following messages
+    contain one updated state.
+    """
+    user = sio_user(req)
+    states = await RmfRepository(user).get_all_lift_states()
+    return rmf_events.lift_states.pipe(
+        rxops.map(lambda x: [x]), rxops.start_with(states)
+    )
+
+
+@router.sub("/{lift_name}/state", response_model=LiftState, conflate=True)
 async def sub_lift_state(req: SubscriptionRequest, lift_name: str):
     user = sio_user(req)
-    obs = rmf_events.lift_states.pipe(rxops.filter(lambda x: x.lift_name == lift_name))
+    obs = rmf_events.lift_states.by_key(lift_name)
     lift_state = await get_lift_state(lift_name, RmfRepository(user))
     if lift_state:
         return obs.pipe(rxops.start_with(lift_state))
@@ -54,21 +81,53 @@ async def get_lift_health(
     return lift_health
 
 
-@router.sub("/{lift_name}/health", response_model=LiftHealth)
+@router.sub(
+    "/*/health",
+    response_model=List[LiftHealth],
+    conflate=conflate_single(lambda x: x.id_),
+)
+async def sub_all_lift_health(req: SubscriptionRequest):
+    """
+    The first message is the current health of all lifts, the following messages
+    contain one updated health.
+    """
+    user = sio_user(req)
+    health = await RmfRepository(user).get_all_lift_health()
+    return rmf_events.lift_health.pipe(
+        rxops.map(lambda x: [x]), rxops.start_with(health)
+    )
+
+
+@router.sub("/{lift_name}/health", response_model=LiftHealth, conflate=True)
 async def sub_lift_health(req: SubscriptionRequest, lift_name: str):
     user = sio_user(req)
-    obs = rmf_events.lift_health.pipe(rxops.filter(lambda x: x.id_ == lift_name))
+    obs = rmf_events.lift_health.by_key(lift_name)
     health = await get_lift_health(lift_name, RmfRepository(user))
     if health:
         return obs.pipe(rxops.start_with(health))
     return obs
 
 
+@router.get("/availability", response_model=List[HealthAvailability])
+async def get_lifts_availability(
+    between: Tuple[int, int] = Depends(between_query),
+    lift_name: Optional[str] = Query(None, description="only query this lift"),
+):
+    """
+    Availability, downtime and mean time between failures of each lift in a period,
+    computed from the history of lift health transitions.
+    """
+    return await query_health_availability("lift", between, lift_name)
+
+
 @router.post("/{lift_name}/request")
-def _post_lift_request(
+async def _post_lift_request(
     lift_name: str,
     lift_request: LiftRequest,
+    rmf_repo: RmfRepository = Depends(rmf_repo_dep),
 ):
+    if await rmf_repo.get_lift(lift_name) is None:
+        raise HTTPException(status_code=404)
     rmf_gateway().request_lift(
         lift_name,
         lift_request.destination,
@@ -4,16 +4,17 @@ from typing import Optional
 
 import schedule
 import tortoise.transactions
-from fastapi import Depends, HTTPException, Query
+from fastapi import Depends, HTTPException, Query, Response
 from pydantic import BaseModel
 from tortoise.expressions import Q
 
 from api_server.authenticator import user_dep
-from api_server.dependencies import pagination_query
+from api_server.dependencies import cursor_pagination_query
 from api_server.fast_io import FastIORouter
 from api_server.logger import logger
 from api_server.models import DispatchTaskRequest, Pagination, TaskRequest, User
 from api_server.models import tortoise_models as ttm
+from api_server.query import KeysetPagination
 from api_server.repositories import TaskRepository, task_repo_dep
 
 from .tasks import post_dispatch_task
@@ -102,24 +103,30 @@ async def post_scheduled_task(
 
 @router.get("", response_model=ttm.ScheduledTaskPydanticList)
 async def get_scheduled_tasks(
+    response: Response,
     start_before: datetime = Query(
         description="Only return scheduled tasks that start before given timestamp"
     ),
     until_after: datetime = Query(
         description="Only return scheduled tasks that stop after given timestamp"
     ),
-    pagination: Pagination = Depends(pagination_query),
+    pagination: Pagination = Depends(cursor_pagination_query),
 ):
-    q = (
-        ttm.ScheduledTask.filter(
-            Q(schedules__start_from__lte=start_before)
-            | Q(schedules__start_from__isnull=True),
-            Q(schedules__until__gte=until_after) | Q(schedules__until__isnull=True),
-        )
-        .distinct()
-        .limit(pagination.limit)
-        .offset(pagination.offset)
-    )
+    q = ttm.ScheduledTask.filter(
+        Q(schedules__start_from__lte=start_before)
+        | Q(schedules__start_from__isnull=True),
+        Q(schedules__until__gte=until_after) | Q(schedules__until__isnull=True),
+    ).distinct()
+    if pagination.cursor is not None:
+        # only the primary key is indexed
+        keyset = KeysetPagination(ttm.ScheduledTask, pagination, (), tiebreaker="id")
+        result = await ttm.ScheduledTaskPydanticList.from_queryset(keyset.apply(q))
+        next_cursor = keyset.next_cursor([(x.id,) for x in result.__root__])
+        if next_cursor is not None:
+            response.headers["Next-Cursor"] = next_cursor
+        return result
+
+    q = q.limit(pagination.limit).offset(pagination.offset)
     if pagination.order_by:
         q.order_by(*pagination.order_by.split(","))
     return await ttm.ScheduledTaskPydanticList.from_queryset(q)
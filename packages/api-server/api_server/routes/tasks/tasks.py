@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional, Tuple, cast
+from typing import Any, Dict, List, Optional, Tuple, cast
 
 from fastapi import Body, Depends, HTTPException, Path, Query
 from reactivex import operators as rxops
@@ -7,15 +7,16 @@ from reactivex import operators as rxops
 from api_server import models as mdl
 from api_server.dependencies import (
     between_query,
+    cursor_pagination_query,
     finish_time_between_query,
-    pagination_query,
     sio_user,
     start_time_between_query,
 )
 from api_server.fast_io import FastIORouter, SubscriptionRequest
 from api_server.models.tortoise_models import TaskState as DbTaskState
-from api_server.repositories import TaskRepository, task_repo_dep
-from api_server.response import RawJSONResponse
+from api_server.repositories import TaskRepository, query_task_stats, task_repo_dep
+from api_server.repositories.task_stats import GROUP_BY_FIELDS
+from api_server.response import NDJSONResponse, RawJSONResponse, json_array
 from api_server.rmf_io import task_events, tasks_service
 
 router = FastIORouter(tags=["Tasks"])
@@ -32,9 +33,7 @@ async def get_task_request(
     return result
 
 
-@router.get("", response_model=List[mdl.TaskState])
-async def query_task_states(
-    task_repo: TaskRepository = Depends(task_repo_dep),
+def task_state_filters(
     task_id: Optional[str] = Query(
         None, description="comma separated list of task ids"
     ),
@@ -51,8 +50,7 @@ async def query_task_states(
         finish_time_between_query
     ),
     status: Optional[str] = Query(None, description="comma separated list of statuses"),
-    pagination: mdl.Pagination = Depends(pagination_query),
-):
+) -> Dict[str, Any]:
     filters = {}
     if task_id is not None:
         filters["id___in"] = task_id.split(",")
@@ -73,8 +71,69 @@ async def query_task_states(
             if status_string not in valid_values:
                 continue
             filters["status__in"].append(mdl.Status(status_string))
+    return filters
+
+
+@router.get("", response_model=List[mdl.TaskState])
+async def query_task_states(
+    task_repo: TaskRepository = Depends(task_repo_dep),
+    filters: Dict[str, Any] = Depends(task_state_filters),
+    pagination: mdl.Pagination = Depends(cursor_pagination_query),
+):
+    task_states, next_cursor = await task_repo.query_task_states_raw(
+        DbTaskState.filter(**filters), pagination
+    )
+    headers = {"Next-Cursor": next_cursor} if next_cursor is not None else None
+    return RawJSONResponse(json_array(task_states), headers=headers)
+
+
+@router.get("/export", response_class=NDJSONResponse)
+async def export_task_states(
+    task_repo: TaskRepository = Depends(task_repo_dep),
+    filters: Dict[str, Any] = Depends(task_state_filters),
+    gzip: bool = Query(False, description="compress the response with gzip"),
+):
+    """
+    Streams all the task states matching the filters as newline delimited json.
+    """
+    return NDJSONResponse(
+        task_repo.export_task_states(DbTaskState.filter(**filters)), gzip=gzip
+    )
 
-    return await task_repo.query_task_states(DbTaskState.filter(**filters), pagination)
+
+@router.get("/export/logs", response_class=NDJSONResponse)
+async def export_task_logs(
+    task_repo: TaskRepository = Depends(task_repo_dep),
+    between: Tuple[int, int] = Depends(between_query),
+    gzip: bool = Query(False, description="compress the response with gzip"),
+):
+    """
+    Streams the log entries of all tasks in a period as newline delimited json, each
+    entry has the `task_id`, `phase` and `event` it belongs to.
+    """
+    return NDJSONResponse(task_repo.export_task_logs(between), gzip=gzip)
+
+
+@router.get("/stats", response_model=List[mdl.TaskStats])
+async def get_task_stats(
+    period: mdl.TaskStatsPeriod = Query(
+        mdl.TaskStatsPeriod.hour, description="size of the time buckets"
+    ),
+    between: Tuple[int, int] = Depends(between_query),
+    group_by: Optional[str] = Query(
+        None,
+        description=f"comma separated list of fields to group by in addition to the time bucket, any of {', '.join(GROUP_BY_FIELDS)}",
+    ),
+):
+    """
+    Number of tasks and their durations per time bucket, computed from rollups which are
+    updated as task states are saved.
+    """
+    fields = group_by.split(",") if group_by else []
+    for field in fields:
+        if field not in GROUP_BY_FIELDS:
+            raise HTTPException(422, f"cannot group by '{field}'")
+    return await query_task_stats(period, between, fields)
 
 
 @router.get("/{task_id}/state", response_model=mdl.TaskState)
@@ -85,18 +144,18 @@ async def get_task_state(
     """
     Available in socket.io
     """
-    result = await task_repo.get_task_state(task_id)
+    result = await task_repo.get_task_state_raw(task_id)
     if result is None:
         raise HTTPException(status_code=404)
-    return result
+    return RawJSONResponse(result)
 
 
-@router.sub("/{task_id}/state", response_model=mdl.TaskState)
+@router.sub("/{task_id}/state", response_model=mdl.TaskState, conflate=True)
 async def sub_task_state(req: SubscriptionRequest, task_id: str):
     user = sio_user(req)
     task_repo = TaskRepository(user)
-    obs = task_events.task_states.pipe(rxops.filter(lambda x: x.booking.id == task_id))
-    current_state = await get_task_state(task_repo, task_id)
+    obs = task_events.task_states.by_key(task_id)
+    current_state = await task_repo.get_task_state(task_id)
     if current_state:
         return obs.pipe(rxops.start_with(current_state))
     return obs
@@ -120,9 +179,7 @@ async def get_task_log(
 
 @router.sub("/{task_id}/log", response_model=mdl.TaskEventLog)
 async def sub_task_log(_req: SubscriptionRequest, task_id: str):
-    return task_events.task_event_logs.pipe(
-        rxops.filter(lambda x: x.task_id == task_id)
-    )
+    return task_events.task_event_logs.by_key(task_id)
 
 
 @router.post("/activity_discovery", response_model=mdl.ActivityDiscovery)
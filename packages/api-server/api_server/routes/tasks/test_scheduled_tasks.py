@@ -157,3 +157,35 @@ class TestScheduledTasksRoute(AppFixture):
         self.assertEqual(200, resp.status_code, resp.json())
         tasks = {x["id"]: x for x in resp.json()}
         self.assertIn(task["id"], tasks)
+
+    def test_get_scheduled_tasks_cursor(self):
+        scheduled_task = {
+            "task_request": {
+                "category": "test",
+                "description": "test",
+            },
+            "schedules": [
+                {
+                    "period": "day",
+                }
+            ],
+        }
+        for _ in range(3):
+            resp = self.client.post("/scheduled_tasks", json=scheduled_task)
+            self.assertEqual(201, resp.status_code)
+
+        url = "/scheduled_tasks?start_before=0&until_after=0&limit=2&order_by=-id"
+        resp = self.client.get(f"{url}&cursor=")
+        self.assertEqual(200, resp.status_code, resp.json())
+        task_ids = [x["id"] for x in resp.json()]
+        while "Next-Cursor" in resp.headers:
+            resp = self.client.get(f"{url}&cursor={resp.headers['Next-Cursor']}")
+            self.assertEqual(200, resp.status_code, resp.json())
+            task_ids.extend(x["id"] for x in resp.json())
+        self.assertGreaterEqual(len(task_ids), 3)
+        self.assertEqual(sorted(task_ids, reverse=True), task_ids)
+
+        resp = self.client.get(
+            "/scheduled_tasks?start_before=0&until_after=0&order_by=last_ran&cursor="
+        )
+        self.assertEqual(422, resp.status_code)
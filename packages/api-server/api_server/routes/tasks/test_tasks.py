@@ -1,9 +1,11 @@
 import asyncio
+import json
 from typing import cast
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 from uuid import uuid4
 
 from api_server import models as mdl
+from api_server.app_config import app_config
 from api_server.models import TaskEventLog, TaskState
 from api_server.repositories import TaskRepository
 from api_server.rmf_io import task_events, tasks_service
@@ -39,6 +41,113 @@ class TestTasksRoute(AppFixture):
         self.assertEqual(1, len(results))
         self.assertEqual(self.task_states[0].booking.id, results[0]["booking"]["id"])
 
+    def test_query_task_states_returns_stored_json(self):
+        task_id = self.task_states[0].booking.id
+        resp = self.client.get(f"/tasks?task_id={task_id}")
+        self.assertEqual("application/json", resp.headers["content-type"])
+        self.assertEqual([json.loads(self.task_states[0].json())], resp.json())
+        resp = self.client.get(f"/tasks/{task_id}/state")
+        self.assertEqual(json.loads(self.task_states[0].json()), resp.json())
+
+        resp = self.client.get("/tasks/not_exist/state")
+        self.assertEqual(404, resp.status_code)
+        resp = self.client.get("/tasks?order_by=not_a_field")
+        self.assertEqual(422, resp.status_code)
+
+    def test_query_task_states_cursor(self):
+        task_ids = [f"test_query_task_states_cursor_{i}" for i in range(5)]
+        repo = TaskRepository(self.admin_user)
+        for i, task_id in enumerate(task_ids):
+            task_state = make_task_state(task_id)
+            # two tasks share each request time so the tiebreaker is needed
+            task_state.booking.unix_millis_request_time = 1000 * (i // 2 + 1)
+            self.client.portal.call(repo.save_task_state, task_state)
+
+        ids = ",".join(task_ids)
+        url = f"/tasks?task_id={ids}&limit=2&order_by=-unix_millis_request_time"
+        resp = self.client.get(f"{url}&cursor=")
+        self.assertEqual(200, resp.status_code)
+        pages = [[x["booking"]["id"] for x in resp.json()]]
+        while "Next-Cursor" in resp.headers:
+            resp = self.client.get(f"{url}&cursor={resp.headers['Next-Cursor']}")
+            self.assertEqual(200, resp.status_code)
+            pages.append([x["booking"]["id"] for x in resp.json()])
+        self.assertEqual(
+            [[task_ids[4], task_ids[3]], [task_ids[2], task_ids[1]], [task_ids[0]]],
+            pages,
+        )
+
+        resp = self.client.get(f"/tasks?task_id={ids}&limit=3&cursor=")
+        first_page = [x["booking"]["id"] for x in resp.json()]
+        self.assertEqual(task_ids[:3], first_page)
+        resp = self.client.get(
+            f"/tasks?task_id={ids}&limit=3&cursor={resp.headers['Next-Cursor']}"
+        )
+        self.assertEqual(task_ids[3:], [x["booking"]["id"] for x in resp.json()])
+        self.assertNotIn("Next-Cursor", resp.headers)
+
+    def test_query_task_states_cursor_errors(self):
+        resp = self.client.get("/tasks?order_by=category&cursor=")
+        self.assertEqual(422, resp.status_code)
+        resp = self.client.get(
+            "/tasks?order_by=unix_millis_start_time,unix_millis_finish_time&cursor="
+        )
+        self.assertEqual(422, resp.status_code)
+        resp = self.client.get("/tasks?cursor=not_a_cursor")
+        self.assertEqual(422, resp.status_code)
+        resp = self.client.get("/tasks?offset=10&cursor=")
+        self.assertEqual(422, resp.status_code)
+
+        resp = self.client.get("/tasks?limit=1&cursor=")
+        cursor = resp.headers["Next-Cursor"]
+        resp = self.client.get(f"/tasks?order_by=-id_&cursor={cursor}")
+        self.assertEqual(422, resp.status_code)
+
+    def test_export_task_states(self):
+        task_id = self.task_states[0].booking.id
+        resp = self.client.get(f"/tasks/export?task_id={task_id}")
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("application/x-ndjson", resp.headers["content-type"])
+        lines = resp.text.splitlines()
+        self.assertEqual(
+            [json.loads(self.task_states[0].json())], list(map(json.loads, lines))
+        )
+
+        resp = self.client.get("/tasks/export?gzip=true")
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("gzip", resp.headers["content-encoding"])
+        task_ids = [json.loads(x)["booking"]["id"] for x in resp.text.splitlines()]
+        self.assertIn(task_id, task_ids)
+
+    def test_export_task_logs(self):
+        task_log = self.task_logs[0]
+        resp = self.client.get("/tasks/export/logs?between=0,9999999999999&gzip=true")
+        self.assertEqual(200, resp.status_code)
+        entries = [json.loads(x) for x in resp.text.splitlines()]
+        entries = [x for x in entries if x["task_id"] == task_log.task_id]
+
+        expected = [(None, None, x.seq) for x in task_log.log or []]
+        for phase_id, phase in (task_log.phases or {}).items():
+            expected.extend((phase_id, None, x.seq) for x in phase.log or [])
+            for event_id, event_log in (phase.events or {}).items():
+                expected.extend((phase_id, event_id, x.seq) for x in event_log)
+        self.assertEqual(
+            sorted(expected, key=str),
+            sorted(((x["phase"], x["event"], x["seq"]) for x in entries), key=str),
+        )
+        self.assertEqual(
+            {
+                "task_id",
+                "phase",
+                "event",
+                "seq",
+                "unix_millis_time",
+                "tier",
+                "text",
+            },
+            set(entries[0]),
+        )
+
     def test_sub_task_state(self):
         task_id = self.task_states[0].booking.id
         gen = self.subscribe_sio(f"/tasks/{task_id}/state")
@@ -114,6 +223,90 @@ class TestTasksRoute(AppFixture):
         # Better to do this after this gets merged into main so we don't make
         # more architecture changes.
 
+    def test_get_task_log_denormalized(self):
+        task_log = make_task_log(task_id=f"test_{uuid4()}")
+        repo = TaskRepository(self.admin_user)
+        self.client.portal.call(repo.save_task_log, task_log)
+        nested = self.client.get(f"/tasks/{task_log.task_id}/log?between=0,1").json()
+        with patch.object(app_config, "denormalized_task_logs", True):
+            self.client.portal.call(repo.save_task_log, task_log)
+            # saving the same entries again does not duplicate them
+            self.client.portal.call(repo.save_task_log, task_log)
+            resp = self.client.get(
+                f"/tasks/{task_log.task_id}/log?between=0,9999999999999"
+            )
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual(json.loads(task_log.json()), resp.json())
+
+            # phases and events without entries in the period are still returned
+            resp = self.client.get(f"/tasks/{task_log.task_id}/log?between=0,1")
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual(nested, resp.json())
+            self.assertEqual([], resp.json()["phases"]["2"]["events"]["1"])
+            resp = self.client.get("/tasks/not_exist/log?between=0,1")
+            self.assertEqual(404, resp.status_code)
+
+    def test_acknowledge_denormalized_task_completion(self):
+        task_id = f"test_{uuid4()}"
+        task_state = make_task_state(task_id)
+        entry = mdl.LogEntry(seq=0, tier=mdl.Tier.info, unix_millis_time=1000, text="a")
+        earlier = entry.copy(update={"unix_millis_time": 500})
+        # phase 2 starts logging before phase 1, phase 3 has no entries
+        task_log = TaskEventLog(
+            task_id=task_id,
+            phases={
+                "1": mdl.Phases(log=[entry], events={"1": [entry]}),
+                "2": mdl.Phases(log=[earlier], events={}),
+                "3": mdl.Phases(log=[], events={"1": []}),
+            },
+        )
+        repo = TaskRepository(self.admin_user)
+
+        async def run():
+            await repo.save_task_state(task_state)
+            await repo.save_task_log(task_log)
+            await repo.save_log_acknowledged_task_completion(task_id, "test_user", 2000)
+            return (
+                await repo.get_task_log(task_id, (0, 9999)),
+                await repo.get_task_state(task_id),
+            )
+
+        with patch.object(app_config, "denormalized_task_logs", True):
+            saved_log, saved_state = self.client.portal.call(run)
+        self.assertEqual(["1", "2", "3", "4"], list(saved_log.phases))
+        self.assertEqual({"1": []}, saved_log.phases["3"].events)
+        self.assertEqual("Drop Off", saved_state.phases["2"].category.__root__)
+        self.assertEqual("Task completed", saved_state.phases["4"].category.__root__)
+
+    def test_save_overlapping_task_log(self):
+        task_id = f"test_{uuid4()}"
+        repo = TaskRepository(self.admin_user)
+
+        def make_log(seq: int, text: str) -> mdl.LogEntry:
+            return mdl.LogEntry(
+                seq=seq, tier=mdl.Tier.info, unix_millis_time=1000 + seq, text=text
+            )
+
+        async def run():
+            await repo.save_task_log(
+                TaskEventLog(task_id=task_id, log=[make_log(0, "a"), make_log(1, "b")])
+            )
+            # another writer saved seq 1 after it was checked
+            with patch.object(
+                TaskRepository, "_existing_log_keys", AsyncMock(return_value=set())
+            ):
+                await repo.save_task_log(
+                    TaskEventLog(
+                        task_id=task_id, log=[make_log(1, "c"), make_log(2, "d")]
+                    )
+                )
+            return await repo.get_task_log(task_id, (0, 9999))
+
+        task_log = self.client.portal.call(run)
+        self.assertEqual(
+            [(0, "a"), (1, "b"), (2, "d")], [(x.seq, x.text) for x in task_log.log]
+        )
+
     def test_sub_task_log(self):
         task_id = self.task_logs[0].task_id
         gen = self.subscribe_sio(f"/tasks/{task_id}/log")
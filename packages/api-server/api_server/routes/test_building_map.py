@@ -13,3 +13,22 @@ class TestBuildingMapRoute(AppFixture):
         self.assertEqual(200, resp.status_code)
         result_map = resp.json()
         self.assertEqual(building_map.name, result_map["name"])
+
+    def test_building_map_etag(self):
+        building_map = make_building_map()
+        rmf_events.building_map.on_next(building_map)
+
+        resp = self.client.get("/building_map")
+        self.assertEqual(200, resp.status_code)
+        etag = resp.headers["etag"]
+
+        resp = self.client.get("/building_map", headers={"If-None-Match": etag})
+        self.assertEqual(304, resp.status_code)
+        self.assertEqual(b"", resp.content)
+
+        building_map.name = "new_map"
+        rmf_events.building_map.on_next(building_map)
+        resp = self.client.get("/building_map", headers={"If-None-Match": etag})
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("new_map", resp.json()["name"])
+        self.assertNotEqual(etag, resp.headers["etag"])
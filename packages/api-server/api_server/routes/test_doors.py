@@ -1,10 +1,12 @@
 import asyncio
-from typing import cast
+from typing import List, cast
 from uuid import uuid4
 
 from rmf_door_msgs.msg import DoorMode as RmfDoorMode
 
 from api_server.models import DoorState
+from api_server.models import tortoise_models as ttm
+from api_server.rmf_io import rmf_events
 from api_server.test import AppFixture, make_building_map, make_door_state
 
 
@@ -37,8 +39,44 @@ class TestDoorsRoute(AppFixture):
         msg = next(self.subscribe_sio(f"/doors/{self.door_states[0].door_name}/state"))
         self.assertEqual(self.door_states[0].door_name, cast(DoorState, msg).door_name)
 
+    def test_sub_all_door_states(self):
+        door_state = make_door_state(f"test_{uuid4()}")
+        rmf_events.door_states.on_next(door_state)
+        gen = self.subscribe_sio("/doors/*/state")
+        snapshot = cast(List[DoorState], next(gen))
+        self.assertIn(door_state.door_name, [x.door_name for x in snapshot])
+
+        door_state = make_door_state(f"test_{uuid4()}")
+        rmf_events.door_states.on_next(door_state)
+        msg = cast(List[DoorState], next(gen))
+        self.assertEqual([door_state.door_name], [x.door_name for x in msg])
+
     def test_post_door_request(self):
         resp = self.client.post(
             "/doors/test_door/request", json={"mode": RmfDoorMode.MODE_OPEN}
         )
         self.assertEqual(resp.status_code, 200)
+        resp = self.client.post(
+            "/doors/not_exist/request", json={"mode": RmfDoorMode.MODE_OPEN}
+        )
+        self.assertEqual(resp.status_code, 404)
+
+    def test_get_doors_availability(self):
+        door_name = self.door_states[0].door_name
+        asyncio.run(
+            ttm.HealthTransition.create(
+                device_type="door",
+                device_id=door_name,
+                health_status="Healthy",
+                unix_millis_start=1000,
+            )
+        )
+        resp = self.client.get(
+            f"/doors/availability?between=0,2000&door_name={door_name}"
+        )
+        self.assertEqual(200, resp.status_code)
+        result = resp.json()
+        self.assertEqual(1, len(result))
+        self.assertEqual(door_name, result[0]["id_"])
+        self.assertEqual(1000, result[0]["uptime_millis"])
+        self.assertEqual(1, result[0]["availability"])
@@ -1,6 +1,14 @@
+import json
 from typing import cast
 
-from api_server.models import FleetLog, FleetLogUpdate, FleetState, FleetStateUpdate
+from api_server.models import (
+    FleetLog,
+    FleetLogUpdate,
+    FleetState,
+    FleetStateUpdate,
+    Tier,
+)
+from api_server.models import tortoise_models as ttm
 from api_server.test import AppFixture, make_fleet_log, make_fleet_state
 
 
@@ -45,3 +53,52 @@ class TestFleetsRoute(AppFixture):
         resp = self.client.get(f"/fleets/{fleet_log.name}/log")
         self.assertEqual(200, resp.status_code)
         self.assertEqual(fleet_log.name, resp.json()["name"])
+
+    def test_export_fleet_logs(self):
+        fleet_name = make_fleet_log().name
+
+        async def create_logs():
+            db_fleet_log = await ttm.FleetLog.create(name=fleet_name)
+            await ttm.FleetLogLog.create(
+                fleet=db_fleet_log,
+                seq=0,
+                unix_millis_time=1000,
+                tier=Tier.info,
+                text="fleet",
+            )
+            db_robot = await ttm.FleetLogRobots.create(fleet=db_fleet_log, name="robot")
+            await ttm.FleetLogRobotsLog.create(
+                robot=db_robot,
+                seq=0,
+                unix_millis_time=1001,
+                tier=Tier.warning,
+                text="robot",
+            )
+
+        assert self.client.portal is not None
+        self.client.portal.call(create_logs)
+
+        resp = self.client.get("/fleets/export/logs?between=0,2000")
+        self.assertEqual(200, resp.status_code)
+        entries = [json.loads(x) for x in resp.text.splitlines()]
+        self.assertEqual(
+            [
+                {
+                    "fleet": fleet_name,
+                    "robot": None,
+                    "seq": 0,
+                    "unix_millis_time": 1000,
+                    "tier": "info",
+                    "text": "fleet",
+                },
+                {
+                    "fleet": fleet_name,
+                    "robot": "robot",
+                    "seq": 0,
+                    "unix_millis_time": 1001,
+                    "tier": "warning",
+                    "text": "robot",
+                },
+            ],
+            [x for x in entries if x["fleet"] == fleet_name],
+        )
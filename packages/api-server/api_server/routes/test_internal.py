@@ -0,0 +1,119 @@
+import asyncio
+import json
+import unittest
+from typing import Any, Dict, List
+
+from api_server import models as mdl
+from api_server.test.test_data import make_task_state
+
+from .internal import IngestionPipeline, decode_trusted_msg, msg_key
+
+
+def make_msg(fleet: str, seq: int) -> Dict[str, Any]:
+    return {"type": "fleet_state_update", "data": {"name": fleet, "seq": seq}}
+
+
+class TestIngestionPipeline(unittest.IsolatedAsyncioTestCase):
+    def test_msg_key(self):
+        self.assertEqual(
+            "task_1",
+            msg_key(
+                {"type": "task_state_update", "data": {"booking": {"id": "task_1"}}}
+            ),
+        )
+        self.assertEqual(
+            "task_1",
+            msg_key({"type": "task_log_update", "data": {"task_id": "task_1"}}),
+        )
+        self.assertEqual("fleet_1", msg_key(make_msg("fleet_1", 0)))
+        self.assertEqual("", msg_key({"type": "fleet_state_update"}))
+
+    async def test_keeps_order_per_key(self):
+        processed: List[Dict[str, Any]] = []
+        slow_started = asyncio.Event()
+        release_slow = asyncio.Event()
+
+        async def process(msg: Dict[str, Any]):
+            if msg["data"]["name"] == "slow" and msg["data"]["seq"] == 0:
+                slow_started.set()
+                await release_slow.wait()
+            processed.append(msg)
+
+        pipeline = IngestionPipeline(process, workers=4, max_queue_size=10)
+        await pipeline.start()
+        await pipeline.put(make_msg("slow", 0))
+        await pipeline.put(make_msg("slow", 1))
+        await slow_started.wait()
+
+        # messages of other keys are not blocked by the slow one, unless they happen to
+        # be sharded to the same worker.
+        other = next(
+            f"fast_{i}" for i in range(100) if hash(f"fast_{i}") % 4 != hash("slow") % 4
+        )
+        await pipeline.put(make_msg(other, 0))
+        for _ in range(10):
+            if processed:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual([make_msg(other, 0)], processed)
+
+        release_slow.set()
+        await pipeline.stop()
+        slow = [m["data"]["seq"] for m in processed if m["data"]["name"] == "slow"]
+        self.assertEqual([0, 1], slow)
+        self.assertEqual(3, pipeline.stats.processed)
+
+    async def test_backpressure(self):
+        release = asyncio.Event()
+
+        async def process(_msg: Dict[str, Any]):
+            await release.wait()
+
+        pipeline = IngestionPipeline(process, workers=1, max_queue_size=1)
+        await pipeline.start()
+        await pipeline.put(make_msg("a", 0))  # taken by the worker
+        await asyncio.sleep(0)
+        await pipeline.put(make_msg("a", 1))  # fills the queue
+        blocked_put = asyncio.create_task(pipeline.put(make_msg("a", 2)))
+        await asyncio.sleep(0.01)
+        self.assertFalse(blocked_put.done())
+        self.assertEqual(1, pipeline.stats.blocked)
+        self.assertEqual([1], pipeline.stats.queue_depths)
+
+        release.set()
+        await blocked_put
+        await pipeline.stop()
+        self.assertEqual(3, pipeline.stats.processed)
+
+    async def test_errors_do_not_stop_worker(self):
+        async def process(msg: Dict[str, Any]):
+            if msg["data"]["seq"] == 0:
+                raise ValueError("bad message")
+
+        pipeline = IngestionPipeline(process, workers=1, max_queue_size=10)
+        await pipeline.start()
+        await pipeline.put(make_msg("a", 0))
+        await pipeline.put(make_msg("a", 1))
+        await pipeline.stop()
+        self.assertEqual(1, pipeline.stats.failed)
+        self.assertEqual(1, pipeline.stats.processed)
+
+
+class TestTrustedDecoding(unittest.TestCase):
+    def test_decode_trusted_msg(self):
+        raw = ' { "type" : "fleet_state_update",\n"data": {"name": "fleet", "robots": {}} }'
+        msg = decode_trusted_msg(raw)
+        self.assertEqual("fleet_state_update", msg["type"])
+        self.assertEqual({"name": "fleet", "robots": {}}, msg["data"])
+        self.assertEqual('{"name": "fleet", "robots": {}}', msg["raw_data"])
+        self.assertEqual({}, decode_trusted_msg("{}"))
+        self.assertRaises(ValueError, decode_trusted_msg, '{"type": "a" "data": {}}')
+        self.assertRaises(ValueError, decode_trusted_msg, '{"data": {')
+
+    def test_construct_model(self):
+        task_state = make_task_state("test_construct_model")
+        task_state.status = mdl.Status.completed
+        constructed = mdl.construct_model(mdl.TaskState, json.loads(task_state.json()))
+        self.assertEqual("test_construct_model", constructed.booking.id)
+        self.assertEqual(mdl.Status.completed, constructed.status)
+        self.assertEqual(task_state.json(), constructed.json())
@@ -46,3 +46,12 @@ class TestLiftsRoute(AppFixture):
             },
         )
         self.assertEqual(resp.status_code, 200)
+        resp = self.client.post(
+            "/lifts/not_exist/request",
+            json={
+                "request_type": RmfLiftRequest.REQUEST_AGV_MODE,
+                "door_mode": RmfLiftRequest.DOOR_OPEN,
+                "destination": "L1",
+            },
+        )
+        self.assertEqual(resp.status_code, 404)
@@ -0,0 +1,84 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from reactivex.subject import Subject
+
+from api_server.fast_io import FastIO, FastIOPacket, FastIORouter, SubscriptionRequest
+from api_server.models import DoorState
+from api_server.test.test_data import make_door_state
+
+
+async def bench_fan_out(subscribers: int, rooms: int, events: int):
+    """
+    Returns the events/sec, packets/sec and encodes per event of emitting `events` to
+    each of `rooms` rooms at the same time, every room has the same `subscribers` sids.
+    """
+    fast_io = FastIO()
+    router = FastIORouter()
+    subjects = [Subject[DoorState]() for _ in range(rooms)]
+
+    @router.sub("/bench/{room}")
+    def sub_bench(_req: SubscriptionRequest, room: str):
+        return subjects[int(room)]
+
+    fast_io.include_router(router)
+
+    async def send_eio_packet(_eio_sid, _pkt):
+        pass
+
+    fast_io.sio.get_session = AsyncMock(return_value={})
+    for i in range(subscribers):
+        sid = await fast_io.sio.manager.connect(f"eio_{i}", "/")
+        # pylint: disable=protected-access
+        for room in range(rooms):
+            await fast_io._on_subscribe(sid, {"room": f"/bench/{room}"})
+
+    encodes = 0
+    encode = FastIOPacket.PacketData.json
+
+    def counted_encode(self, **kwargs):
+        nonlocal encodes
+        encodes += 1
+        return encode(self, **kwargs)
+
+    door_states = [
+        [make_door_state(f"bench_door_{room}") for room in range(rooms)]
+        for _ in range(events)
+    ]
+    with patch.object(fast_io.sio, "_send_eio_packet", send_eio_packet), patch.object(
+        FastIOPacket.PacketData, "json", counted_encode
+    ):
+        start = time.perf_counter()
+        for room_states in door_states:
+            for subject, door_state in zip(subjects, room_states):
+                subject.on_next(door_state)
+            while any(x.queue_depth > 0 for x in fast_io.connection_stats()):
+                await asyncio.sleep(0)
+        await asyncio.sleep(0)  # let the last sends finish
+        elapsed = time.perf_counter() - start
+
+    sent = sum(x.sent for x in fast_io.connection_stats())
+    total_events = events * rooms
+    return total_events / elapsed, sent / elapsed, encodes / total_events
+
+
+@unittest.skip("manual test")
+class TestBenchFanOut(unittest.TestCase):
+    def test_bench_fan_out(self):
+        """
+        Measures the cost of emitting events to 1 and 10 rooms updating at the same time,
+        with 1, 100 and 1000 subscribers.
+        """
+        for rooms in (1, 10):
+            for subscribers in (1, 100, 1000):
+                events_per_sec, packets_per_sec, encodes_per_event = asyncio.run(
+                    bench_fan_out(subscribers, rooms, 200 // rooms)
+                )
+                print(
+                    f"{rooms} rooms, {subscribers} subscribers: "
+                    f"{events_per_sec:.0f} events/sec, "
+                    f"{packets_per_sec:.0f} packets/sec, "
+                    f"{encodes_per_event:.1f} encodes/event"
+                )
@@ -0,0 +1,78 @@
+import time
+import unittest
+from typing import Callable, List
+
+from reactivex import Subject
+from reactivex.scheduler.historicalscheduler import HistoricalScheduler
+
+from api_server.rmf_io.liveness import LivenessMonitor
+from api_server.rmf_io.operators import heartbeat
+
+
+def watch_per_device(
+    scheduler: HistoricalScheduler, devices: int, on_change: Callable
+) -> List[Callable[[], None]]:
+    """
+    Reference implementation of the previous rx pipeline per device.
+    """
+    beats = []
+    for i in range(devices):
+        subject = Subject()
+        subject.pipe(heartbeat(10)).subscribe(
+            lambda alive, i=i: on_change(i, alive), scheduler=scheduler
+        )
+        subject.on_next(None)
+        beats.append(lambda subject=subject: subject.on_next(None))
+    return beats
+
+
+def watch_liveness(
+    scheduler: HistoricalScheduler, devices: int, on_change: Callable
+) -> List[Callable[[], None]]:
+    monitor = LivenessMonitor(10, on_change, scheduler=scheduler)
+    monitor.start()
+    beats = []
+    for i in range(devices):
+        monitor.beat(i)
+        beats.append(lambda i=i: monitor.beat(i))
+    return beats
+
+
+@unittest.skip("manual test")
+class TestBenchHealthWatchdog(unittest.TestCase):
+    def test_bench_liveness(self):
+        """
+        Compares the time to watch 10k devices which beat every second, and half of them
+        dying, with an rx pipeline per device and with a single liveness monitor.
+        """
+        devices = 10000
+        seconds = 30
+
+        def bench(watch) -> int:
+            scheduler = HistoricalScheduler()
+            changes = 0
+
+            def on_change(_key, _alive):
+                nonlocal changes
+                changes += 1
+
+            start = time.perf_counter()
+            beats = watch(scheduler, devices, on_change)
+            for second in range(seconds):
+                # half of the devices stop beating half way through
+                alive = beats if second < seconds // 2 else beats[: devices // 2]
+                for beat in alive:
+                    beat()
+                scheduler.advance_by(1)
+            duration = time.perf_counter() - start
+            print(
+                f"{watch.__name__}: {duration:.2f}s, {changes} changes, "
+                f"{len(scheduler._queue)} scheduled timers"  # pylint: disable=protected-access
+            )
+            return changes
+
+        before = bench(watch_per_device)
+        after = bench(watch_liveness)
+        # the initial alive of every device and the dead of half of them
+        self.assertEqual(devices + devices // 2, after)
+        self.assertGreaterEqual(before, after)
@@ -0,0 +1,55 @@
+import re
+import time
+import unittest
+from typing import Dict, List, Optional, Tuple
+
+from api_server.app import app
+from api_server.fast_io import SubRoute, SubscriptionData
+
+
+def match_routes_linear(
+    routes: List[SubRoute], sub_data: SubscriptionData
+) -> Optional[Tuple[Dict[str, str], SubRoute]]:
+    """
+    Reference implementation of the previous linear search.
+    """
+    for r in routes:
+        match = r.matches(sub_data.room)
+        if match:
+            return match.groupdict(), r
+    return None
+
+
+@unittest.skip("manual test")
+class TestBenchMatchRoutes(unittest.TestCase):
+    def test_bench_match_routes(self):
+        """
+        Compares the subscribes/sec of the linear and trie route matching, using all the
+        sub routes of the app.
+        """
+        # pylint: disable=protected-access
+        routes = app._sub_routes
+        rooms = [
+            SubscriptionData(room=re.sub(r"{[^}]+}", "test_name", r.path))
+            for r in routes
+        ]
+        rooms.append(SubscriptionData(room="/no/such/room"))
+        iterations = 10000
+
+        def bench(match) -> float:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                for room in rooms:
+                    match(room)
+            return iterations * len(rooms) / (time.perf_counter() - start)
+
+        for room in rooms:
+            expected = match_routes_linear(routes, room)
+            result = app._match_routes(room)
+            self.assertEqual(expected, result, room.room)
+
+        before = bench(lambda x: match_routes_linear(routes, x))
+        after = bench(app._match_routes)
+        print(
+            f"{len(routes)} routes, linear: {before:.0f} matches/sec, trie: {after:.0f} matches/sec"
+        )
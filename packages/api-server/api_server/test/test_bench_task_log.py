@@ -0,0 +1,122 @@
+import asyncio
+import sys
+import time
+import unittest
+from unittest.mock import patch
+from uuid import uuid4
+
+from tortoise.transactions import in_transaction
+
+from api_server.app_config import app_config
+from api_server.models import LogEntry, Phases, TaskEventLog, Tier
+from api_server.models import tortoise_models as ttm
+from api_server.repositories import TaskRepository
+from api_server.test.test_fixtures import AppFixture
+
+
+def make_large_task_log(
+    task_id: str, phases: int = 5, events: int = 5, logs: int = 20
+) -> TaskEventLog:
+    def entries(n: int):
+        return [
+            LogEntry(seq=i, tier=Tier.info, unix_millis_time=i, text=f"log {i}")
+            for i in range(n)
+        ]
+
+    return TaskEventLog(
+        task_id=task_id,
+        log=entries(logs),
+        phases={
+            str(p): Phases(
+                log=entries(logs),
+                events={str(e): entries(logs) for e in range(events)},
+            )
+            for p in range(phases)
+        },
+    )
+
+
+def count_rows(task_log: TaskEventLog) -> int:
+    total = len(task_log.log or [])
+    for phase in (task_log.phases or {}).values():
+        total += len(phase.log or [])
+        for logs in (phase.events or {}).values():
+            total += len(logs)
+    return total
+
+
+async def save_task_log_per_row(task_log: TaskEventLog):
+    """
+    Reference implementation of the previous one `create()` per log entry write path.
+    """
+    async with in_transaction():
+        db_task_log = (await ttm.TaskEventLog.get_or_create(task_id=task_log.task_id))[
+            0
+        ]
+        for log in task_log.log or []:
+            await ttm.TaskEventLogLog.create(task=db_task_log, **log.dict())
+        for phase_id, phase in (task_log.phases or {}).items():
+            db_phase = (
+                await ttm.TaskEventLogPhases.get_or_create(
+                    task=db_task_log, phase=phase_id
+                )
+            )[0]
+            for log in phase.log or []:
+                await ttm.TaskEventLogPhasesLog.create(phase=db_phase, **log.dict())
+            for event_id, logs in (phase.events or {}).items():
+                db_event = (
+                    await ttm.TaskEventLogPhasesEvents.get_or_create(
+                        phase=db_phase, event=event_id
+                    )
+                )[0]
+                for log in logs:
+                    await ttm.TaskEventLogPhasesEventsLog.create(
+                        event=db_event, **log.dict()
+                    )
+
+
+@unittest.skip("manual test")
+class TestBenchTaskLog(AppFixture):
+    def test_bench_save_task_log(self):
+        """
+        Compares the rows/sec of the per-row and batched task log write paths.
+        The database used is the one in the active config, to benchmark against
+        postgres, run with a config that points `db_url` to a postgres instance.
+        """
+        repo = TaskRepository(self.admin_user)
+        iterations = 20
+
+        async def bench(save) -> float:
+            total_rows = 0
+            start = time.perf_counter()
+            for _ in range(iterations):
+                task_log = make_large_task_log(f"bench_{uuid4()}")
+                total_rows += count_rows(task_log)
+                await save(task_log)
+            return total_rows / (time.perf_counter() - start)
+
+        before = asyncio.run(bench(save_task_log_per_row))
+        after = asyncio.run(bench(repo.save_task_log))
+        print(f"per-row: {before:.0f} rows/sec, batched: {after:.0f} rows/sec")
+
+    def test_bench_get_task_log(self):
+        """
+        Compares the fetches/sec of the nested and denormalized task log storage.
+        """
+        repo = TaskRepository(self.admin_user)
+        iterations = 50
+        task_log = make_large_task_log(f"bench_{uuid4()}", phases=10, events=10)
+
+        async def bench(denormalized: bool) -> float:
+            with patch.object(app_config, "denormalized_task_logs", denormalized):
+                await repo.save_task_log(task_log)
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    await repo.get_task_log(task_log.task_id, (0, sys.maxsize))
+                return iterations / (time.perf_counter() - start)
+
+        before = asyncio.run(bench(False))
+        after = asyncio.run(bench(True))
+        print(
+            f"{count_rows(task_log)} entries, nested: {before:.1f} fetches/sec, denormalized: {after:.1f} fetches/sec"
+        )
@@ -9,6 +9,7 @@ from typing import Awaitable, Callable, Optional, TypeVar, Union
 from uuid import uuid4
 
 from api_server.app import app, on_sio_connect
+from api_server.fast_io import EncodedItem
 from api_server.models import User
 from api_server.routes.admin import PostUsers
 
@@ -105,6 +106,8 @@ class AppFixture(unittest.TestCase):
                     if emit_room == "subscribe" and not msg["success"]:
                         raise Exception("Failed to subscribe")
                     if emit_room == room:
+                        if isinstance(msg, EncodedItem):
+                            msg = msg.data
                         async with condition:
                             msgs.append(msg)
                             condition.notify()
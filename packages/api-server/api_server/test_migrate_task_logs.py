@@ -0,0 +1,41 @@
+import json
+import sys
+from unittest.mock import patch
+
+from api_server.app_config import app_config
+from api_server.models import tortoise_models as ttm
+from api_server.repositories import TaskRepository
+from api_server.test import AppFixture, make_task_log
+
+from .migrate_task_logs import migrate_task_logs
+
+
+class TestMigrateTaskLogs(AppFixture):
+    def test_migrate_task_logs(self):
+        task_log = make_task_log("test_migrate_task_logs")
+        repo = TaskRepository(self.admin_user)
+
+        async def run():
+            await repo.save_task_log(task_log)
+            nested = await repo.get_task_log(task_log.task_id, (0, sys.maxsize))
+            await migrate_task_logs(chunk_size=2)
+            # running it again does not duplicate the entries
+            await migrate_task_logs(chunk_size=2)
+            with patch.object(app_config, "denormalized_task_logs", True):
+                denormalized = await repo.get_task_log(
+                    task_log.task_id, (0, sys.maxsize)
+                )
+            copied = await ttm.TaskLogEntry.filter(
+                task_id=task_log.task_id, seq__gte=0
+            ).count()
+            return nested, denormalized, copied
+
+        assert self.client.portal is not None
+        nested, denormalized, copied = self.client.portal.call(run)
+        assert nested is not None and denormalized is not None
+        self.assertEqual(json.loads(nested.json()), json.loads(denormalized.json()))
+        expected = len(task_log.log or [])
+        for phase in (task_log.phases or {}).values():
+            expected += len(phase.log or [])
+            expected += sum(len(x) for x in (phase.events or {}).values())
+        self.assertEqual(expected, copied)
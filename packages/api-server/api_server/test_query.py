@@ -0,0 +1,46 @@
+import base64
+import json
+import unittest
+
+from fastapi import HTTPException
+
+from api_server.models import tortoise_models as ttm
+from api_server.models.pagination import Pagination
+from api_server.test import AppFixture, make_fleet_state
+
+from .query import KeysetPagination, iter_values_raw
+
+
+class TestIterValuesRaw(AppFixture):
+    def test_iterates_in_chunks(self):
+        names = sorted(make_fleet_state().name for _ in range(5))
+
+        async def run():
+            for name in names:
+                await ttm.FleetState.create(name=name, data={"name": name})
+            query = ttm.FleetState.filter(name__in=names)
+            return [
+                r async for r in iter_values_raw(query, "data", pk="name", chunk_size=2)
+            ]
+
+        assert self.client.portal is not None
+        rows = self.client.portal.call(run)
+        # the json is returned as stored, without being decoded
+        self.assertEqual([{"name": x} for x in names], [json.loads(r[0]) for r in rows])
+
+
+class TestKeysetPagination(unittest.TestCase):
+    def test_invalid_cursor(self):
+        def make_cursor(data) -> str:
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        for cursor in [
+            "not_a_cursor",
+            make_cursor(["id"]),
+            make_cursor({"order_by": "id"}),
+            make_cursor({"after": ["id"]}),
+        ]:
+            pagination = Pagination(limit=10, offset=0, order_by=None, cursor=cursor)
+            with self.assertRaises(HTTPException) as cm:
+                KeysetPagination(ttm.TaskState, pagination, (), tiebreaker="id_")
+            self.assertEqual(422, cm.exception.status_code)
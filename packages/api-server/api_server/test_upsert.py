@@ -0,0 +1,117 @@
+from datetime import datetime
+from unittest.mock import patch
+
+from api_server.models import tortoise_models as ttm
+from api_server.query import values_list_raw
+from api_server.test import AppFixture
+
+from .upsert import upsert, upsert_many
+
+
+class TestUpsert(AppFixture):
+    def test_insert_and_update(self):
+        async def run():
+            await upsert(ttm.DoorState, {"id_": "test_upsert", "data": {"a": 1}})
+            await upsert(ttm.DoorState, {"id_": "test_upsert", "data": {"a": 2}})
+            return await ttm.DoorState.filter(id_="test_upsert").values_list(
+                "data", flat=True
+            )
+
+        assert self.client.portal is not None
+        self.assertEqual([{"a": 2}], self.client.portal.call(run))
+
+    def test_upsert_many(self):
+        # more rows than fit in one statement
+        names = [f"test_upsert_many_{i}" for i in range(1200)]
+
+        async def run():
+            await ttm.FleetState.create(name=names[0], data={"old": True})
+            await upsert_many(
+                ttm.FleetState,
+                [{"name": name, "data": {"name": name}} for name in names],
+                conflict=("name",),
+            )
+            return await ttm.FleetState.filter(name__in=names).values_list(
+                "name", "data"
+            )
+
+        assert self.client.portal is not None
+        rows = dict(self.client.portal.call(run))
+        self.assertEqual(len(names), len(rows))
+        self.assertEqual({"name": names[0]}, rows[names[0]])
+
+    def test_stored_like_update_or_create(self):
+        time = datetime.fromtimestamp(1000)
+
+        async def run():
+            await ttm.TaskState.update_or_create(
+                {"data": {}, "unix_millis_request_time": time},
+                id_="test_stored_like_update_or_create_0",
+            )
+            await upsert(
+                ttm.TaskState,
+                {
+                    "id_": "test_stored_like_update_or_create_1",
+                    "data": "{}",
+                    "unix_millis_request_time": time,
+                },
+            )
+            return await values_list_raw(
+                ttm.TaskState.filter(
+                    id___startswith="test_stored_like_update_or_create"
+                ).order_by("id_"),
+                "data",
+                "unix_millis_request_time",
+            )
+
+        assert self.client.portal is not None
+        rows = self.client.portal.call(run)
+        self.assertEqual(rows[0], rows[1])
+
+    def test_json_text_is_not_decoded(self):
+        data_field = ttm.FleetState._meta.fields_map["data"]  # pylint: disable=W0212
+
+        async def run():
+            with patch.object(data_field, "decoder", side_effect=AssertionError):
+                await upsert(
+                    ttm.FleetState,
+                    {"name": "test_json_text_is_not_decoded", "data": '{"a": 1}'},
+                    conflict=("name",),
+                )
+            return await ttm.FleetState.get(name="test_json_text_is_not_decoded")
+
+        assert self.client.portal is not None
+        self.assertEqual({"a": 1}, self.client.portal.call(run).data)
+
+    def test_fallback_without_on_conflict(self):
+        names = [
+            "test_fallback_without_on_conflict_0",
+            "test_fallback_without_on_conflict_1",
+        ]
+
+        async def run():
+            await ttm.FleetState.create(name=names[0], data={"old": True})
+            with patch("api_server.upsert._ON_CONFLICT_DIALECTS", ()):
+                await upsert_many(
+                    ttm.FleetState,
+                    [{"name": name, "data": '{"new": true}'} for name in names],
+                    conflict=("name",),
+                    update=False,
+                )
+                inserted = dict(
+                    await ttm.FleetState.filter(name__in=names).values_list(
+                        "name", "data"
+                    )
+                )
+                await upsert(
+                    ttm.FleetState,
+                    {"name": names[0], "data": {"new": True}},
+                    conflict=("name",),
+                )
+            updated = await ttm.FleetState.get(name=names[0])
+            return inserted, updated.data
+
+        assert self.client.portal is not None
+        inserted, updated = self.client.portal.call(run)
+        self.assertEqual({names[0]: {"old": True}, names[1]: {"new": True}}, inserted)
+        self.assertEqual({"new": True}, updated)
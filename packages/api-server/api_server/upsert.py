@@ -0,0 +1,159 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.backends.base.executor import BaseExecutor
+from tortoise.exceptions import IntegrityError
+from tortoise.fields import JSONField
+from tortoise.models import Model
+
+# sqlite before 3.32 limits a statement to 999 parameters
+_MAX_PARAMS = 999
+
+_sql_cache: Dict[Tuple[Any, ...], str] = {}
+
+# dialects which support `INSERT ... ON CONFLICT`
+_ON_CONFLICT_DIALECTS = ("sqlite", "postgres")
+
+
+def supports_on_conflict(db: BaseDBAsyncClient) -> bool:
+    """
+    Whether a database supports the sqlite and postgres `ON CONFLICT` syntax. Raw sql
+    written for them should fall back to the orm on other databases.
+    """
+    return db.capabilities.dialect in _ON_CONFLICT_DIALECTS
+
+
+def _upsert_sql(
+    executor: BaseExecutor,
+    fields: Tuple[str, ...],
+    conflict: Tuple[str, ...],
+    rows: int,
+    update: bool,
+) -> str:
+    model, db = executor.model, executor.db
+    cache_key = (model, db.capabilities.dialect, fields, conflict, rows, update)
+    sql = _sql_cache.get(cache_key)
+    if sql is not None:
+        return sql
+
+    meta = model._meta  # pylint: disable=W0212
+    projection = meta.fields_db_projection
+    columns = [projection[f] for f in fields]
+    conflict_columns = [projection[f] for f in conflict]
+    query = db.query_class.into(meta.basetable).columns(*columns)
+    for row in range(rows):
+        query = query.insert(
+            *[executor.parameter(row * len(columns) + i) for i in range(len(columns))]
+        )
+    updates = ", ".join(
+        f'"{c}"=EXCLUDED."{c}"' for c in columns if c not in conflict_columns
+    )
+    target = ", ".join(f'"{c}"' for c in conflict_columns)
+    target = f" ({target})" if target else ""
+    action = f"DO UPDATE SET {updates}" if update and updates else "DO NOTHING"
+    sql = f"{query.get_sql()} ON CONFLICT{target} {action}"
+    _sql_cache[cache_key] = sql
+    return sql
+
+
+def _converters(
+    executor: BaseExecutor, fields: Tuple[str, ...]
+) -> List[Callable[[Any], Any]]:
+    """
+    Values are converted like `Model.__init__` does before they are converted to their db
+    values, e.g. naive datetimes are made aware. Json text is trusted and stored as is,
+    `JSONField.to_db_value` would decode it only to validate it.
+    """
+    model = executor.model
+    fields_map = model._meta.fields_map  # pylint: disable=W0212
+    converters = []
+    for f in fields:
+        field = fields_map[f]
+        to_db = executor.column_map[f]
+        if isinstance(field, JSONField):
+            converters.append(
+                lambda v, to_db=to_db: v if isinstance(v, str) else to_db(v, model)
+            )
+        else:
+            converters.append(
+                lambda v, to_db=to_db, field=field: to_db(
+                    field.to_python_value(v), model
+                )
+            )
+    return converters
+
+
+async def _upsert_each(
+    model: Type[Model],
+    rows: Sequence[Dict[str, Any]],
+    conflict: Tuple[str, ...],
+    update: bool,
+) -> None:
+    for row in rows:
+        if not conflict:
+            try:
+                await model.create(**row)
+            except IntegrityError:
+                pass
+            continue
+        where = {f: row[f] for f in conflict}
+        defaults = {f: v for f, v in row.items() if f not in conflict}
+        if update:
+            await model.update_or_create(defaults, **where)
+        else:
+            await model.get_or_create(defaults, **where)
+
+
+async def upsert_many(
+    model: Type[Model],
+    rows: Sequence[Dict[str, Any]],
+    conflict: Optional[Sequence[str]] = None,
+    update: bool = True,
+) -> None:
+    """
+    Inserts rows, or updates them if they conflict with an existing row, with
+    `INSERT ... ON CONFLICT DO UPDATE` statements. Unlike `Model.update_or_create`, this
+    does not lock and select the row first. On databases other than sqlite and postgres,
+    this falls back to `Model.update_or_create` (or `Model.get_or_create`) for each row.
+
+    :param rows: The values of each row by field name, every row must have the same
+        fields and rows must not conflict with each other.
+    :param conflict: The fields of the unique constraint which identifies a row, defaults
+        to the primary key. If it is empty, rows which conflict with any unique constraint
+        are not inserted, this requires `update` to be false.
+    :param update: If false, rows which conflict with an existing row are not inserted and
+        the existing row is left as is.
+    """
+    if not rows:
+        return
+    fields = tuple(rows[0])
+    meta = model._meta  # pylint: disable=W0212
+    conflict = (meta.pk_attr,) if conflict is None else tuple(conflict)
+    if not conflict and update:
+        raise ValueError("rows without a conflict target can only be inserted")
+    db = meta.db
+    if not supports_on_conflict(db):
+        await _upsert_each(model, rows, conflict, update)
+        return
+    executor = db.executor_class(model=model, db=db)
+    converters = _converters(executor, fields)
+    batch_size = max(_MAX_PARAMS // len(fields), 1)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start : start + batch_size]
+        sql = _upsert_sql(executor, fields, conflict, len(batch), update)
+        values = [
+            convert(row[f]) for row in batch for f, convert in zip(fields, converters)
+        ]
+        await db.execute_query(sql, values)
+
+
+async def upsert(
+    model: Type[Model],
+    row: Dict[str, Any],
+    conflict: Optional[Sequence[str]] = None,
+    update: bool = True,
+) -> None:
+    """
+    Inserts a row, or updates it if it conflicts with an existing row. See `upsert_many`.
+    """
+    await upsert_many(model, [row], conflict, update)